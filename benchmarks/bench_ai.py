@@ -0,0 +1,132 @@
+"""
+Load test of the AI stage against the local LLM stub (benchmarks/llm_stub.py).
+
+Generates a synthetic tables.json, starts the stub in-process, and for each
+concurrency level splits the tables across that many concurrent
+`process-json --base-url <stub>` processes. Reports per level:
+  - LLM calls, HTTP statuses, calls per second
+  - p50/p99 stub-side request latency (injected delay + answer time)
+  - wall time and end-to-end time per table
+
+    PYTHONPATH=src python benchmarks/bench_ai.py --tables 200 --concurrency 1,2,4 --latency lognormal:200:0.5 --rate-limit 0.05
+
+Extra process-json options go after `--`, e.g. `-- --pack-tokens 0`.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from llm_stub import StubLLMServer, add_stub_arguments
+
+JUNK_ROWS = ["新建", "System Info", "更改所有人"]
+SECTION_ROWS = ["个案 (Case)", "Contact History", "备注信息"]
+
+def make_tables(count: int, rows: int, seed: int):
+    """Tables of 1..2*rows rows, with some junk rows, section headers and a duplicated column."""
+    rng = random.Random(seed)
+    tables = []
+    for t in range(count):
+        columns = ["Name", "Qty", "Price", "Note"] + (["Note_2"] if t % 3 == 0 else [])
+        table_rows = []
+        for r in range(rng.randint(1, 2 * rows)):
+            roll = rng.random()
+            if roll < 0.05:
+                row = {c: None for c in columns}
+                row["Name"] = rng.choice(JUNK_ROWS)
+            elif roll < 0.08:
+                row = {c: None for c in columns}
+                row["Name"] = rng.choice(SECTION_ROWS)
+            else:
+                row = {"Name": f"Item {t}-{r}", "Qty": rng.randint(1, 99), "Price": round(rng.uniform(1, 500), 2),
+                       "Note": rng.choice(["", "ok", "urgent", "备注"])}
+                if "Note_2" in columns:
+                    row["Note_2"] = None
+            table_rows.append(row)
+        tables.append({"table_id": f"bench-{t}", "sheet": "Bench", "columns": columns, "rows": table_rows,
+                       "meta": {"content_hash": f"bench-{seed}-{t}"}})
+    return tables
+
+def child_env():
+    env = dict(os.environ)
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (src, env.get('PYTHONPATH')) if p)
+    return env
+
+def run_level(server: StubLLMServer, tables, concurrency: int, tmp: str, extra_args):
+    shards = [tables[i::concurrency] for i in range(concurrency)]
+    commands = []
+    for i, shard in enumerate(shards):
+        if not shard:
+            continue
+        path = os.path.join(tmp, f"tables_{concurrency}_{i}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(shard, f, ensure_ascii=False)
+        commands.append([sys.executable, '-m', 'excel_table_extractor', 'process-json', path,
+                         '-o', os.path.join(tmp, f"out_{concurrency}_{i}.xlsx"),
+                         '--api-key', 'stub', '--base-url', server.url, *extra_args])
+
+    server.reset()
+    start = time.perf_counter()
+    procs = [subprocess.Popen(cmd, env=child_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) for cmd in commands]
+    failures = []
+    for proc in procs:
+        _, err = proc.communicate()
+        if proc.returncode != 0:
+            failures.append(err.decode('utf-8', 'replace').strip().splitlines()[-1:])
+    wall = time.perf_counter() - start
+    stats = server.stats()
+    stats.update({
+        'concurrency': concurrency,
+        'tables': len(tables),
+        'wall_s': round(wall, 3),
+        'ms_per_table': round(wall / len(tables) * 1000, 2) if tables else 0.0,
+        'failed_processes': len(failures),
+    })
+    return stats, failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test process-json against the local LLM stub.")
+    parser.add_argument('--tables', type=int, default=200, help="Number of synthetic tables")
+    parser.add_argument('--rows', type=int, default=20, help="Average rows per table")
+    parser.add_argument('--concurrency', default='1,2,4', help="Comma-separated numbers of concurrent process-json runs")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    add_stub_arguments(parser)
+    parser.add_argument('process_args', nargs=argparse.REMAINDER, help="Extra process-json options after --")
+    args = parser.parse_args()
+    extra_args = [a for a in args.process_args if a != '--']
+
+    tables = make_tables(args.tables, args.rows, args.seed)
+    server = StubLLMServer(('127.0.0.1', 0), args.latency, args.error_rate, args.rate_limit, args.retry_after_ms, args.seed)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    results = []
+    failed = False
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for level in (int(c) for c in args.concurrency.split(',')):
+                stats, failures = run_level(server, tables, level, tmp, extra_args)
+                results.append(stats)
+                for failure in failures:
+                    failed = True
+                    print(f"FAIL concurrency {level}: {' '.join(failure)}", file=sys.stderr)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'conc':>4} {'calls':>6} {'calls/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'wall s':>8} {'ms/table':>9}  statuses")
+        for r in results:
+            print(f"{r['concurrency']:>4} {r['calls']:>6} {r['calls_per_second']:>8.2f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                  f"{r['wall_s']:>8.2f} {r['ms_per_table']:>9.2f}  {r['statuses']}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Startup budget check for the CLI.
+
+Each subcommand is run for real on a tiny generated workbook, in a fresh
+interpreter under python -X importtime, and this measures:
+  - the cumulative import time of the modules it loads
+  - the time to first output: the first table written (extract, clean) or
+    the first line printed (help)
+  - the wall time of the full run
+It fails (exit code 1) if a budget is exceeded or a module that the command
+must not load (e.g. openai for `extract`) is in sys.modules when it exits.
+
+    PYTHONPATH=src python benchmarks/bench_startup.py [--repeat 5] [--scale 1.0]
+
+Budgets are in milliseconds and deliberately loose; --scale multiplies them
+for slow CI machines.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+# command -> (import budget ms, first output budget ms, run budget ms)
+BUDGETS = {
+    'help': (100, 250, 250),
+    'extract': (400, 1200, 1500),
+    'clean': (1200, 2500, 3000),
+}
+
+# Modules that must never be imported by a command
+FORBIDDEN = {
+    'help': ('openpyxl', 'openai', 'dotenv', 'pyarrow'),
+    'extract': ('openai', 'dotenv', 'pyarrow'),
+    'clean': ('pyarrow',),
+}
+
+# Output line that marks the first table written (or, for help, the first line)
+FIRST_OUTPUT = {
+    'help': re.compile(r'^usage:'),
+    'extract': re.compile(r'Extracted \d+ tables'),
+    'clean': re.compile(r'Table \S+: Split into'),
+}
+
+# Runs the real entry point (as python -m does) and dumps sys.modules at exit
+ENTRY_POINT = (
+    "import atexit, json, os, runpy, sys\n"
+    "atexit.register(lambda: open(os.environ['BENCH_MODULES'], 'w').write(json.dumps(sorted(sys.modules))))\n"
+    "runpy.run_module('excel_table_extractor', run_name='__main__', alter_sys=True)\n"
+)
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def make_workbook(path):
+    import openpyxl
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Data'
+    ws.append(['Name', 'Qty', 'Price'])
+    for i in range(20):
+        ws.append([f'Item {i}', i, i * 1.5])
+    wb.save(path)
+
+def child_env(modules_path):
+    env = dict(os.environ)
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (src, env.get('PYTHONPATH')) if p)
+    # Never reach a real endpoint: clean falls back to the offline path
+    env['DEEPSEEK_API_KEY'] = ''
+    env['BENCH_MODULES'] = modules_path
+    return env
+
+def profile_run(name, cli_args, tmp):
+    """
+    One run of the command: (import ms, first output ms, run ms, set of
+    top-level modules in sys.modules at exit).
+    """
+    modules_path = os.path.join(tmp, 'modules.json')
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', ENTRY_POINT, *cli_args],
+        env=child_env(modules_path), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    import_us = 0
+    first_output_ms = None
+    for line in proc.stdout:
+        m = IMPORT_LINE.match(line)
+        if m:
+            import_us += int(m.group(1))
+        elif first_output_ms is None and FIRST_OUTPUT[name].search(line):
+            first_output_ms = (time.perf_counter() - start) * 1000
+    if proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cli_args)
+    run_ms = (time.perf_counter() - start) * 1000
+    if first_output_ms is None:
+        raise RuntimeError(f"{name}: no output matched {FIRST_OUTPUT[name].pattern!r}")
+    with open(modules_path, encoding='utf-8') as f:
+        modules = {m.split('.')[0] for m in json.load(f)}
+    return import_us / 1000, first_output_ms, run_ms, modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Check CLI import time and startup budgets.")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per command; the best of each measure is reported")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply all budgets")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        xlsx = os.path.join(tmp, 'tiny.xlsx')
+        make_workbook(xlsx)
+        commands = {
+            'help': ['--help'],
+            'extract': ['extract', xlsx, '-o', os.path.join(tmp, 'out')],
+            'clean': ['clean', xlsx, '-o', os.path.join(tmp, 'report.xlsx')],
+        }
+
+        results = {}
+        failures = []
+        for name, cli_args in commands.items():
+            runs = [profile_run(name, cli_args, tmp) for _ in range(args.repeat)]
+            import_ms, first_output_ms, run_ms = (min(r[i] for r in runs) for i in range(3))
+            modules = set().union(*(r[3] for r in runs))
+            import_budget, first_output_budget, run_budget = (b * args.scale for b in BUDGETS[name])
+            leaked = sorted(m for m in FORBIDDEN[name] if m in modules)
+
+            results[name] = {'import_ms': round(import_ms, 1), 'first_output_ms': round(first_output_ms, 1),
+                             'run_ms': round(run_ms, 1), 'import_budget_ms': import_budget,
+                             'first_output_budget_ms': first_output_budget, 'run_budget_ms': run_budget,
+                             'forbidden_imports': leaked}
+            if import_ms > import_budget:
+                failures.append(f"{name}: imports took {import_ms:.0f}ms (budget {import_budget:.0f}ms)")
+            if first_output_ms > first_output_budget:
+                failures.append(f"{name}: first output after {first_output_ms:.0f}ms (budget {first_output_budget:.0f}ms)")
+            if run_ms > run_budget:
+                failures.append(f"{name}: run took {run_ms:.0f}ms (budget {run_budget:.0f}ms)")
+            if leaked:
+                failures.append(f"{name}: imports {', '.join(leaked)}")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, r in results.items():
+            print(f"{name:8} imports {r['import_ms']:7.1f}ms / {r['import_budget_ms']:.0f}   "
+                  f"first output {r['first_output_ms']:7.1f}ms / {r['first_output_budget_ms']:.0f}   "
+                  f"run {r['run_ms']:7.1f}ms / {r['run_budget_ms']:.0f}")
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
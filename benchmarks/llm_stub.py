@@ -0,0 +1,254 @@
+"""
+Local OpenAI-compatible chat-completions stub for load-testing the AI stage.
+
+Serves POST /v1/chat/completions with deterministic answers derived from the
+prompt (the offline rule dictionaries applied to the encoded rows, and
+"X" / "X_2" column pairs as merges), after an injected latency. A share of
+requests can fail with 500 or 429 to exercise the client's retries.
+
+    PYTHONPATH=src python benchmarks/llm_stub.py --port 8000 --latency lognormal:300:0.5 --rate-limit 0.05
+    python -m excel_table_extractor process-json tables.json -o out.xlsx --api-key stub --base-url http://127.0.0.1:8000/v1
+
+GET /stats returns request counts and latency percentiles; POST /reset clears them.
+
+Latency specs (milliseconds): fixed:MS, uniform:LO:HI, exp:MEAN, lognormal:MEDIAN:SIGMA.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+from excel_table_extractor.ai.rules import OfflineRules
+
+ROW_LINE = re.compile(r'^(\d+)((?:\t.*)?)$', re.MULTILINE)
+COLUMNS_LINE = re.compile(r'^row((?:\t.*)?)$', re.MULTILINE)
+DICTIONARY_LINE = re.compile(r'^(~\d+)\t(.*)$', re.MULTILINE)
+TABLE_HEADER = re.compile(r'^### Table (T\d+)$', re.MULTILINE)
+DUPLICATE_SUFFIX = re.compile(r'^(.*)_\d+$')
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Sampler of latencies in seconds for a spec such as 'lognormal:200:0.5'."""
+    kind, *params = spec.split(':')
+    try:
+        values = [float(p) for p in params]
+        if kind == 'fixed':
+            ms, = values
+            return lambda rng: ms / 1000
+        if kind == 'uniform':
+            lo, hi = values
+            return lambda rng: rng.uniform(lo, hi) / 1000
+        if kind == 'exp':
+            mean, = values
+            return lambda rng: rng.expovariate(1 / mean) / 1000 if mean > 0 else 0.0
+        if kind == 'lognormal':
+            median, sigma = values
+            return lambda rng: rng.lognormvariate(math.log(median), sigma) / 1000
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency spec '{spec}'")
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+class StubAnswers:
+    """Deterministic row actions and merges for a prompt built by AIProcessor."""
+    def __init__(self, rules: Optional[OfflineRules] = None):
+        rules = rules or OfflineRules()
+        self.junk = tuple(rules.junk_phrases)
+        self.junk_cells = frozenset(rules.junk_cells)
+        self.sections = tuple(rules.section_phrases)
+        self.suffixes = tuple(rules.section_suffixes)
+
+    def answer(self, prompt: str) -> Dict[str, Any]:
+        headers = list(TABLE_HEADER.finditer(prompt))
+        if not headers:
+            return self._table(prompt)
+        tables = {}
+        for i, m in enumerate(headers):
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(prompt)
+            tables[m.group(1)] = self._table(prompt[m.end():end])
+        return {'tables': tables}
+
+    def _table(self, text: str) -> Dict[str, Any]:
+        """Answer for one table in AIProcessor's tab-separated row format."""
+        dictionary = {m.group(1): m.group(2) for m in DICTIONARY_LINE.finditer(text)}
+
+        def decode(field: str) -> str:
+            if field.startswith('~~'):
+                return field[1:]
+            return dictionary.get(field, field)
+
+        header = COLUMNS_LINE.search(text)
+        columns = [decode(f) for f in header.group(1).split('\t')[1:]] if header else []
+        actions = []
+        for m in ROW_LINE.finditer(text):
+            row_id = int(m.group(1))
+            cells = [decode(f) for f in m.group(2).split('\t')[1:] if f]
+            count = len(cells)
+            values = ' | '.join(cells)
+            if count == 0 or any(j in values for j in self.junk) or (cells and all(c in self.junk_cells for c in cells)):
+                actions.append({'row_id': row_id, 'type': 'delete', 'reason': 'Stub: junk'})
+            elif count == 1 and (any(s in values for s in self.sections) or values.endswith(self.suffixes)):
+                actions.append({'row_id': row_id, 'type': 'split', 'new_table_name': values[:40], 'reason': 'Stub: section'})
+        result: Dict[str, Any] = {'actions': actions}
+        if 'Data Profile' in text:
+            merges = []
+            for col in columns:
+                m = DUPLICATE_SUFFIX.match(col)
+                if m and m.group(1) in columns:
+                    merges.append({'keep': m.group(1), 'drop': col, 'reason': 'Stub: duplicate name'})
+            result['merge_columns'] = merges
+        return result
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: str = 'fixed:0', error_rate: float = 0.0, rate_limit: float = 0.0,
+                 retry_after_ms: int = 50, seed: int = 0):
+        super().__init__(address, _StubHandler)
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after_ms = retry_after_ms
+        self.answers = StubAnswers()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset(self):
+        with self._lock:
+            self._started = time.perf_counter()
+            self._latencies: List[float] = []
+            self._statuses: Dict[int, int] = {}
+            self._prompt_tokens = 0
+
+    def draw(self):
+        """(injected delay in seconds, status to return) for one request."""
+        with self._lock:
+            delay = self.sample_latency(self._rng)
+            roll = self._rng.random()
+        if roll < self.rate_limit:
+            return delay, 429
+        if roll < self.rate_limit + self.error_rate:
+            return delay, 500
+        return delay, 200
+
+    def record(self, status: int, seconds: float, prompt_tokens: int):
+        with self._lock:
+            self._statuses[status] = self._statuses.get(status, 0) + 1
+            self._latencies.append(seconds)
+            self._prompt_tokens += prompt_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = time.perf_counter() - self._started
+            calls = len(self._latencies)
+            return {
+                'calls': calls,
+                'statuses': {str(k): v for k, v in sorted(self._statuses.items())},
+                'calls_per_second': round(calls / elapsed, 2) if elapsed > 0 else 0.0,
+                'p50_ms': round(percentile(self._latencies, 50) * 1000, 1),
+                'p99_ms': round(percentile(self._latencies, 99) * 1000, 1),
+                'prompt_tokens': self._prompt_tokens,
+            }
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: StubLLMServer
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self._send(200, self.server.stats())
+        else:
+            self._send(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if self.path.rstrip('/') == '/reset':
+            self.server.reset()
+            self._send(200, {'status': 'ok'})
+            return
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send(404, {'error': {'message': 'not found'}})
+            return
+        try:
+            request = json.loads(body or b'{}')
+            prompt = request['messages'][-1]['content']
+        except (ValueError, KeyError, IndexError, TypeError):
+            self._send(400, {'error': {'message': 'invalid request', 'type': 'invalid_request_error'}})
+            return
+
+        delay, status = self.server.draw()
+        time.sleep(delay)
+        # Same rough estimate as AIProcessor._estimate_tokens, over every message
+        prompt_tokens = sum(len(str(m.get('content', '')).encode('utf-8')) // 3 + 1 for m in request['messages'])
+        if status == 429:
+            self._send(429, {'error': {'message': 'Rate limit reached', 'type': 'rate_limit_error'}},
+                       {'retry-after-ms': str(self.server.retry_after_ms)})
+        elif status == 500:
+            self._send(500, {'error': {'message': 'Injected server error', 'type': 'server_error'}})
+        else:
+            content = json.dumps(self.server.answers.answer(prompt), ensure_ascii=False)
+            completion_tokens = len(content.encode('utf-8')) // 3 + 1
+            self._send(200, {
+                'id': f"stub-{time.time_ns()}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model', 'stub'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                          'total_tokens': prompt_tokens + completion_tokens},
+            })
+        self.server.record(status, time.perf_counter() - start, prompt_tokens)
+
+    def _send(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency', default='lognormal:200:0.5', help="Latency distribution in ms (fixed:MS, uniform:LO:HI, exp:MEAN, lognormal:MEDIAN:SIGMA)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Share of requests answered with HTTP 429")
+    parser.add_argument('--retry-after-ms', type=int, default=50, help="retry-after-ms header sent with 429s")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for latency and error draws")
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible chat-completions stub for load tests.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    server = StubLLMServer((args.host, args.port), args.latency, args.error_rate, args.rate_limit, args.retry_after_ms, args.seed)
+    print(f"Stub LLM listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
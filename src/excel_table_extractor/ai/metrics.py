@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Optional
+
+@dataclass
+class CallMetrics:
+    """One chat completion: what it covered and what it cost."""
+    # Tables in the request (several for a packed request) and rows summarized
+    table_ids: List[Optional[str]]
+    rows: int
+    packed: bool = False
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Prompt tokens the provider served from its prompt cache (the shared system prompt)
+    cached_prompt_tokens: int = 0
+    # True when the API returned no usage and the tokens are AIProcessor estimates
+    estimated: bool = False
+    latency_ms: float = 0.0
+    retries: int = 0
+    # A duplicate request was sent because this one ran past the hedge delay
+    hedged: bool = False
+    # Served from the processor's response cache: no request, no tokens
+    cached: bool = False
+    error: Optional[str] = None
+
+class AIMetrics:
+    """
+    Per-call token/latency records of one refinement run, rolled up per table
+    and for the run. Prices are per 1M tokens.
+
+    A packed request's tokens are split between its tables in proportion to
+    their estimated prompt tokens; its latency and retries count in full for
+    every table in it, since each of them waited for the whole request.
+    """
+    def __init__(self, price_in: float = 0.0, price_out: float = 0.0):
+        self.price_in = price_in
+        self.price_out = price_out
+        self.logger = logging.getLogger("ai_metrics")
+        self.calls: List[CallMetrics] = []
+        self._tables: Dict[Optional[str], Dict[str, Any]] = {}
+
+    def _table(self, table_id: Optional[str]) -> Dict[str, Any]:
+        entry = self._tables.get(table_id)
+        if entry is None:
+            entry = self._tables[table_id] = {
+                'table_id': table_id, 'rows': 0, 'source': None, 'calls': 0, 'cache_hits': 0, 'errors': 0,
+                'retries': 0, 'fallback_rows': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'latency_ms': 0.0,
+            }
+        return entry
+
+    def record_call(self, call: CallMetrics, weights: Optional[List[int]] = None):
+        self.calls.append(call)
+        weights = weights or [1] * len(call.table_ids)
+        total = sum(weights) or 1
+        for table_id, weight in zip(call.table_ids, weights):
+            entry = self._table(table_id)
+            entry['calls'] += 1
+            entry['cache_hits'] += call.cached
+            entry['errors'] += call.error is not None
+            entry['retries'] += call.retries
+            entry['prompt_tokens'] += round(call.prompt_tokens * weight / total)
+            entry['completion_tokens'] += round(call.completion_tokens * weight / total)
+            entry['latency_ms'] += call.latency_ms
+
+    def record_table(self, table_id: Optional[str], rows: int, source: str, fallback_rows: int = 0):
+        """
+        A finished table and what decided its rows: 'llm', 'rules' or 'state'
+        (reused). fallback_rows of an 'llm' table went to the offline cleaner.
+        """
+        entry = self._table(table_id)
+        entry['rows'] = rows
+        entry['source'] = source
+        entry['fallback_rows'] = fallback_rows
+
+    def tables(self) -> List[Dict[str, Any]]:
+        return [{**entry, 'latency_ms': round(entry['latency_ms'], 1), 'cost': self._cost(entry['prompt_tokens'], entry['completion_tokens'])}
+                for entry in self._tables.values()]
+
+    def summary(self) -> Dict[str, Any]:
+        sent = [c for c in self.calls if not c.cached]
+        latencies = sorted(c.latency_ms for c in sent)
+        prompt_tokens = sum(c.prompt_tokens for c in self.calls)
+        completion_tokens = sum(c.completion_tokens for c in self.calls)
+        sources = [entry['source'] for entry in self._tables.values()]
+        return {
+            'tables': len(self._tables),
+            'rows': sum(entry['rows'] for entry in self._tables.values()),
+            'llm_tables': sources.count('llm'),
+            'rule_tables': sources.count('rules'),
+            'reused_tables': sources.count('state'),
+            'calls': len(sent),
+            'packed_calls': sum(c.packed for c in sent),
+            'cache_hits': len(self.calls) - len(sent),
+            'errors': sum(c.error is not None for c in sent),
+            'retries': sum(c.retries for c in sent),
+            'hedged_calls': sum(c.hedged for c in sent),
+            'fallback_rows': sum(entry['fallback_rows'] for entry in self._tables.values()),
+            'estimated_usage_calls': sum(c.estimated for c in sent),
+            'prompt_tokens': prompt_tokens,
+            'cached_prompt_tokens': sum(c.cached_prompt_tokens for c in self.calls),
+            'completion_tokens': completion_tokens,
+            'cost': self._cost(prompt_tokens, completion_tokens),
+            'avg_rows_per_call': round(sum(c.rows for c in sent) / len(sent), 1) if sent else 0.0,
+            'llm_seconds': round(sum(latencies) / 1000, 3),
+            'p50_latency_ms': _percentile(latencies, 50),
+            'p95_latency_ms': _percentile(latencies, 95),
+            'max_latency_ms': round(latencies[-1], 1) if latencies else 0.0,
+        }
+
+    def write(self, path: str):
+        """Summary, per-table rollups and every call as one JSON document."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': self.summary(), 'tables': self.tables(), 'calls': [asdict(c) for c in self.calls]},
+                      f, ensure_ascii=False, indent=2)
+        self.logger.info(f"Saved AI metrics for {len(self.calls)} calls to {path}")
+
+    def _cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return round(prompt_tokens / 1e6 * self.price_in + completion_tokens / 1e6 * self.price_out, 6)
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return round(ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))], 1)
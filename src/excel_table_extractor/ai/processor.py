@@ -1,9 +1,18 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Generator
 import json
 import logging
+import hashlib
+import threading
+import time
+from collections import OrderedDict, Counter, deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
 from dataclasses import dataclass
 import os
-from openai import OpenAI
+from ..core.masks import RowMask, TEXT, row_mask
+from ..core.profiles import ColumnProfiler
+from .state import RefinementState
+from .metrics import AIMetrics, CallMetrics
+from .rules import OfflineCleaner, OfflineRules
 
 @dataclass
 class RowAction:
@@ -12,254 +21,803 @@ class RowAction:
     reason: str = ""
     new_table_name: str = ""
 
+@dataclass
+class PreparedTable:
+    """A table with its prompt material computed, ready to be sent alone or packed."""
+    table: Dict[str, Any]
+    rows: List[Dict[str, Any]]
+    summaries: List[str]
+    column_profiles: str = ""
+    schema_key: Optional[str] = None
+    tokens: int = 0
+    # Normalized cells and masks, kept for the offline cleaner (also the LLM fallback)
+    cells: Optional[List[List[Optional[str]]]] = None
+    masks: Optional[List[RowMask]] = None
+    # (start, end, reason) of row ranges the offline cleaner decided because the LLM answer was missing
+    fallback: Optional[List[Tuple[int, int, str]]] = None
+    # Incremental runs: where decisions are recorded, and the stored decision if one applies
+    state: Optional[RefinementState] = None
+    reused: Optional[Tuple[List[RowAction], List[Dict[str, str]]]] = None
+    # Where this run's call and table metrics are recorded
+    metrics: Optional[AIMetrics] = None
+
 class AIProcessor:
-    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.deepseek.com/v1", model: str = "deepseek-chat"):
+    # Upper bounds (%) of the fill-rate buckets used in schema fingerprints
+    FILL_BUCKETS = (0, 10, 50, 90, 100)
+    # How tables are encoded in the user message (see _format_rows)
+    ROW_FORMAT = """Tables are given as tab-separated lines under "Rows:". The first line, starting with "row", names the columns. Every other line is one table row: its row_id, then one field per column in that order. Empty cells are empty fields; trailing empty fields are left out. A field "~N" stands for entry N of the table's Dictionary, and "~~" is a literal "~". Cells longer than the limit are cut and end with "…".
+"""
+    # Row-level instructions shared by single-table and packed prompts
+    ROW_RULES = """Identify:
+1. Junk rows ("delete"):
+   - Navigation buttons ("新建", "New", "Back", "Edit").
+   - System info lines ("System Info", "系统信息", "更改所有人", "Change Owner"). Any row containing "更改所有人" or "Change Owner" is junk.
+   - Empty separators, or rows with only 1 non-empty cell that is not a section header.
+2. Split headers ("split"), rows that start a new table section:
+   a) Exclusivity: values only in the first 1-2 columns, the rest empty.
+   b) Semantic generality: a broad category name, often ending in "Info", "Information", "List", "History", "信息", "记录", "附件".
+   c) Context shift: it breaks the pattern of the data rows; it looks like a title, not a record.
+   d) Uniformity vs noise: the same value in ALL columns (e.g. "System Info" in every cell) is a split header, but repeated navigation actions (e.g. "New") are junk.
+   Examples: "个案 (Case)", "索赔单", "资产保修记录", "备注信息", "系统信息".
+"""
+    MERGE_RULES = """3. Redundant columns, only for tables that come with a Data Profile:
+   - A duplicated column name (e.g. "排序", "排序_2") whose data is identical, or whose second column is always empty/redundant (check the Data Profile), is merged.
+   - If the data shows they are distinct (e.g. checkmarks in different rows for "显示位置" and "显示位置_2"), do NOT merge.
+"""
+    OUTPUT_FORMAT = """
+Return JSON. For one table:
+{"actions": [{"row_id": 12, "type": "delete", "reason": "Junk button: '新建'"}, {"row_id": 45, "type": "split", "new_table_name": "Claim_Records", "reason": "Section Header: '索赔单'"}],
+ "merge_columns": [{"keep": "排序", "drop": "排序_2", "reason": "Second column is 90% empty/redundant"}]}
+For several tables, each starting with a "### Table <tag>" line, return {"tables": {"T0": {"actions": [...], "merge_columns": [...]}, ...}} with an entry for every tag, even if its "actions" list is empty. Row IDs restart at 0 in every table; judge each table on its own.
+Only include rows that need "delete" or "split"; all others are kept. Include "merge_columns" (possibly empty) only for tables that come with a Data Profile.
+"""
+    # Identical for every request, so providers with prompt caching serve it
+    # from cache; the user message only carries the table data.
+    SYSTEM_PROMPT = ("You are a data cleaning assistant. Analyze the table rows. Identify sub-table headers (split points) and junk rows. "
+                     "Check for redundant columns (merged headers). Return JSON output.\n\n"
+                     + ROW_FORMAT + "\n" + ROW_RULES + MERGE_RULES + OUTPUT_FORMAT)
+    # Longest cell text sent to the LLM; longer cells are cut and end with "…"
+    CELL_CHARS = 60
+    # Cells of at least this many characters that repeat within a chunk go into its Dictionary
+    DICTIONARY_MIN_CHARS = 8
+    # Rows per request when a table is sent on its own
+    CHUNK_SIZE = 100
+    # Default estimated-token budget for the tables packed into one request
+    PACK_TOKENS = 4000
+    # Rows of tables reused from state held behind a pending pack before it is flushed
+    PACK_REUSED_ROWS = 10000
+    # Request latencies kept for the hedging percentile, and how many are
+    # needed before requests are hedged at all
+    HEDGE_WINDOW = 200
+    HEDGE_MIN_SAMPLES = 20
+    # Hedged and deadline-bound requests run on their own threads; at most this
+    # many run at once, counting abandoned ones that have not finished yet
+    REQUEST_SLOTS = 8
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.deepseek.com/v1", model: str = "deepseek-chat", cache_size: int = 256, pack_tokens: int = PACK_TOKENS,
+                 rules: Optional[OfflineRules] = None, offline: bool = False, request_timeout: Optional[float] = None,
+                 hedge_percentile: Optional[float] = None, table_deadline: Optional[float] = None):
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
         self.base_url = base_url
         self.model = model
         self.logger = logging.getLogger("ai_processor")
+        # LRU of parsed LLM responses keyed by prompt hash. It lives as long as
+        # the processor, so a long-running service reuses it across jobs.
+        self.cache_size = cache_size
+        # 0 disables packing: every table gets its own request(s)
+        self.pack_tokens = pack_tokens
+        self._response_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # LRU of merge_columns decisions keyed by schema fingerprint, so column
+        # redundancy is asked once per distinct schema, not once per chunk.
+        self._merge_cache: "OrderedDict[str, List[Dict[str, str]]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Row rules used without an LLM (see ai/rules.py)
+        self.cleaner = OfflineCleaner(rules)
+        # Tail-latency control, all in seconds / percent, None to disable:
+        # the HTTP timeout of each request (the SDK retries timeouts), the
+        # percentile of recent latencies after which a duplicate request is
+        # sent (the first answer wins), and the time budget of one table's
+        # chunks, after which its remaining rows go to the offline cleaner.
+        self.request_timeout = request_timeout
+        self.hedge_percentile = hedge_percentile
+        self.table_deadline = table_deadline
+        self._latencies: "deque[float]" = deque(maxlen=self.HEDGE_WINDOW)
+        self._request_slots = threading.BoundedSemaphore(self.REQUEST_SLOTS)
         
-        if self.api_key:
+        if offline:
+             self.client = None
+             self.logger.info("Offline mode: rows are cleaned by the rule engine.")
+        elif self.api_key:
+             # Imported lazily: the SDK is slow to import and not needed offline
+             from openai import OpenAI
              self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
         else:
              self.client = None
-             self.logger.warning("No API Key provided. AI features will be simulated.")
+             self.logger.warning("No API Key provided. Rows are cleaned by the offline rule engine.")
 
-    def process_table(self, table_data: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    @property
+    def decision_source(self) -> str:
+        """What produces the row/merge decisions; incremental state is only reused for the same source."""
+        return self.model if self.client else self.cleaner.source
+
+    def process_table(self, table_data: Dict[str, Any], state: Optional[RefinementState] = None,
+                      metrics: Optional[AIMetrics] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
         """
         Returns: (processed_tables_list, audit_log_list)
         A single input table might be split into multiple tables.
+        With a RefinementState, decisions stored for the same table content are
+        re-applied instead of recomputed, and every decision is recorded.
+        With AIMetrics, every LLM call and finished table is recorded there.
+        """
+        prepared = self._prepare(table_data, state, metrics)
+        if prepared is None:
+            return [table_data], []
+        return self._process_prepared(prepared)
+
+    def process_tables(self, tables: Iterable[Dict[str, Any]], state: Optional[RefinementState] = None,
+                       metrics: Optional[AIMetrics] = None) -> Generator[Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]], None, None]:
+        """
+        process_table over a stream of tables, yielding (table, processed_tables, audit_log)
+        in input order. With an LLM client and pack_tokens > 0, runs of small tables
+        are packed into one request of at most pack_tokens estimated tokens.
+        Tables reused from state are yielded at once, or held behind a pending
+        pack to keep the order, which is flushed early once they hold more than
+        PACK_REUSED_ROWS rows.
+        """
+        if not self.client or self.pack_tokens <= 0:
+            for table in tables:
+                yield (table, *self.process_table(table, state, metrics))
+            return
+
+        pack: List[PreparedTable] = []
+        pack_tokens = 0
+        reused_rows = 0
+        for table in tables:
+            prepared = self._prepare(table, state, metrics)
+            if prepared is not None and prepared.reused is not None:
+                if not pack:
+                    yield (table, *self._process_prepared(prepared))
+                    continue
+                pack.append(prepared)
+                reused_rows += len(prepared.rows)
+                if reused_rows > self.PACK_REUSED_ROWS:
+                    yield from self._flush_pack(pack)
+                    pack, pack_tokens, reused_rows = [], 0, 0
+                continue
+            if prepared is None or len(prepared.rows) > self.CHUNK_SIZE or prepared.tokens > self.pack_tokens:
+                # Empty or too big to pack: flush the pending pack first to keep the order
+                yield from self._flush_pack(pack)
+                pack, pack_tokens, reused_rows = [], 0, 0
+                if prepared is None:
+                    yield table, [table], []
+                else:
+                    yield (table, *self._process_prepared(prepared))
+                continue
+            if pack and pack_tokens + prepared.tokens > self.pack_tokens:
+                yield from self._flush_pack(pack)
+                pack, pack_tokens, reused_rows = [], 0, 0
+            pack.append(prepared)
+            pack_tokens += prepared.tokens
+        yield from self._flush_pack(pack)
+
+    def _prepare(self, table_data: Dict[str, Any], state: Optional[RefinementState] = None,
+                 metrics: Optional[AIMetrics] = None) -> Optional[PreparedTable]:
+        """
+        Row summaries, column profiles and schema fingerprint when an LLM is used,
+        normalized cells for the offline cleaner otherwise. None if the table has no rows.
+        A table with a decision in state skips all of this.
         """
         rows = table_data.get('rows', [])
         if not rows:
-            return [table_data], []
+            return None
+        if state is not None:
+            stored = state.lookup(table_data)
+            if stored is not None:
+                actions = self._fill_keep([RowAction(*a) for a in stored[0]], len(rows))
+                return PreparedTable(table_data, rows, [], state=state, reused=(actions, stored[1]), metrics=metrics)
+
+        columns = table_data.get('columns') or list(rows[0].keys())
+        cells, masks = self._normalize_cells(rows, columns)
+        if not self.client:
+            # The offline cleaner works on the cells directly; no prompt material needed
+            return PreparedTable(table_data, rows, [], state=state, cells=cells, masks=masks, metrics=metrics)
 
         # 1. Generate Summaries for AI
-        row_summaries = self._generate_row_summaries(rows)
-        column_profiles = self._generate_column_profiles(rows, table_data.get('columns', []))
-        
+        prepared = PreparedTable(table_data, rows, self._generate_row_summaries(cells), state=state,
+                                 cells=cells, masks=masks, metrics=metrics)
+        stats = self._column_stats(table_data, cells, columns)
+        prepared.column_profiles = self._format_column_profiles(columns, stats, len(cells))
+        prepared.schema_key = self._schema_fingerprint(columns, stats, len(cells))
+        prepared.tokens = self._estimate_tokens(prepared.column_profiles) + sum(self._estimate_tokens(s) for s in prepared.summaries)
+        return prepared
+
+    def _process_prepared(self, prepared: PreparedTable) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
         # 2. Call AI
+        if prepared.reused is not None:
+            return self._finalize(prepared, *prepared.reused)
         if self.client:
-            actions, merge_instructions = self._call_llm(row_summaries, column_profiles, table_data.get('columns', []))
+            actions, merge_instructions = self._call_llm(prepared)
         else:
-            actions = self._heuristic_fallback(row_summaries)
+            decisions = self.cleaner.classify(prepared.cells, prepared.masks)
+            actions = self._fill_keep([RowAction(*d) for d in decisions], len(prepared.rows))
             merge_instructions = []
-        
-        # 3. Apply Actions (Split/Delete)
-        processed_tables, audit_log = self._apply_actions(table_data, rows, actions)
-        
-        # 4. Apply Column Merging (if any)
-        if merge_instructions:
-            processed_tables = self._apply_merge_columns(processed_tables, merge_instructions)
-            # Log merge actions
-            for m in merge_instructions:
-                audit_log.append({
-                    "original_table_id": table_data.get('table_id'),
-                    "row_index": -1, # Global action
-                    "action": "merge_column",
-                    "reason": m.get('reason'),
-                    "content": f"Drop '{m.get('drop')}' keep '{m.get('keep')}'"
-                })
-        
-        return processed_tables, audit_log
+        return self._finalize(prepared, actions, merge_instructions)
 
-    def _apply_merge_columns(self, tables: List[Dict[str, Any]], merge_instructions: List[Dict[str, str]]) -> List[Dict[str, Any]]:
-        # Identify columns to drop
-        cols_to_drop = {m.get('drop') for m in merge_instructions if m.get('drop')}
-        
-        for table in tables:
-            columns = table.get('columns', [])
-            # Filter columns
-            new_columns = [c for c in columns if c not in cols_to_drop]
-            
-            # Filter rows
-            new_rows = []
-            for row in table.get('rows', []):
-                new_row = {k: v for k, v in row.items() if k not in cols_to_drop}
-                new_rows.append(new_row)
-            
-            table['columns'] = new_columns
-            table['rows'] = new_rows
-            
-        return tables
+    def _finalize(self, prepared: PreparedTable, actions: List[RowAction], merge_instructions: List[Dict[str, str]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        fallback = prepared.fallback or []
+        # A partial fallback is not recorded, so the next incremental run asks the LLM again
+        if prepared.state is not None and not fallback:
+            prepared.state.record(
+                prepared.table,
+                [[a.row_index, a.action, a.reason, a.new_table_name] for a in actions if a.action != "keep"],
+                merge_instructions,
+                reused=prepared.reused is not None,
+            )
+        if prepared.metrics is not None:
+            source = "state" if prepared.reused is not None else "llm" if self.client else "rules"
+            prepared.metrics.record_table(prepared.table.get('table_id'), len(prepared.rows), source,
+                                          fallback_rows=sum(end - start for start, end, _ in fallback))
+        # 3. Apply Actions (Split/Delete) and Column Merging in one pass
+        tables, audit_log = self._apply_actions(prepared.table, prepared.rows, actions, merge_instructions)
+        for start, end, reason in fallback:
+            audit_log.append({
+                "original_table_id": prepared.table.get('table_id'),
+                "row_index": start,
+                "action": "fallback",
+                "reason": f"{reason}: rows {start}-{end - 1} cleaned by the offline rule engine",
+                "content": ""
+            })
+        return tables, audit_log
+
+    def _normalize_cells(self, rows: List[Dict[str, Any]], columns: List[str]) -> Tuple[List[List[Optional[str]]], List[RowMask]]:
+        """
+        Stripped text of every cell (None if empty) plus the row's occupancy/type
+        mask, computed once per table and shared by summaries and profiles.
+        Only occupied text cells are stripped, and repeated strings go through an
+        intern cache so each distinct value is stripped once.
+        """
+        cache: Dict[str, str] = {}
+        all_cells = []
+        masks = []
+        for row in rows:
+            values = [row.get(col) for col in columns]
+            mask = row_mask(values)
+            occupancy, types = mask
+            cells = [None] * len(values)
+            for i, v in enumerate(values):
+                if not (occupancy >> i) & 1:
+                    continue
+                if types[i] == TEXT:
+                    text = cache.get(v)
+                    if text is None:
+                        text = cache[v] = v.strip()
+                    cells[i] = text
+                else:
+                    cells[i] = str(v).strip()
+            all_cells.append(cells)
+            masks.append(mask)
+        return all_cells, masks
 
-    def _generate_row_summaries(self, rows: List[Dict[str, Any]]) -> List[str]:
+    def _generate_row_summaries(self, cells: List[List[Optional[str]]]) -> List[str]:
+        """
+        One tab-separated line per row: the row id, then every column's cell
+        text (see _encode_cell), with trailing empty fields dropped.
+        """
+        cache: Dict[str, str] = {}
         summaries = []
-        for i, row in enumerate(rows):
-            # Create a compact string representation
-            # Collect all non-empty values
-            values = [str(v).strip() for v in row.values() if v is not None and str(v).strip()]
-            non_empty_count = len(values)
-            
-            # Join values with separator, limit total length to avoid token explosion
-            content = " | ".join(values)
-            if len(content) > 200:
-                content = content[:200] + "..."
-            
-            summary = f"ID:{i} | Count:{non_empty_count} | Values: {content}"
-            summaries.append(summary)
+        for i, row in enumerate(cells):
+            fields = [str(i)]
+            for v in row:
+                if v is None:
+                    fields.append("")
+                    continue
+                field = cache.get(v)
+                if field is None:
+                    field = cache[v] = self._encode_cell(v)
+                fields.append(field)
+            while len(fields) > 1 and not fields[-1]:
+                fields.pop()
+            summaries.append("\t".join(fields))
         return summaries
 
-    def _generate_column_profiles(self, rows: List[Dict[str, Any]], columns: List[str]) -> str:
-        profiles = []
-        total_rows = len(rows)
+    @classmethod
+    def _encode_cell(cls, text: str) -> str:
+        """Cell text as a single field: no tabs or newlines, a leading '~' doubled, cut to CELL_CHARS."""
+        if "\t" in text or "\n" in text or "\r" in text:
+            text = " ".join(text.split())
+        if len(text) > cls.CELL_CHARS:
+            text = text[:cls.CELL_CHARS - 1] + "…"
+        if text.startswith("~"):
+            text = "~" + text
+        return text
+
+    def _format_rows(self, summaries: List[str], columns: List[str]) -> str:
+        """
+        The Dictionary and Rows sections of one chunk. Long cells that occur
+        more than once in the chunk are listed once in the Dictionary and
+        replaced by their ~N code in the rows.
+        """
+        counts = Counter(field for line in summaries for field in line.split("\t")[1:] if len(field) >= self.DICTIONARY_MIN_CHARS)
+        # Codes in order of first occurrence
+        codes = {}
+        for value, count in counts.items():
+            if count > 1:
+                codes[value] = f"~{len(codes)}"
+        lines = []
+        if codes:
+            lines.append("Dictionary:")
+            lines.extend(f"{code}\t{value}" for value, code in codes.items())
+        lines.append("Rows:")
+        lines.append("\t".join(["row", *(self._encode_cell(str(c)) for c in columns)]))
+        for line in summaries:
+            if codes:
+                fields = line.split("\t")
+                line = "\t".join([fields[0], *(codes.get(f, f) for f in fields[1:])])
+            lines.append(line)
+        return "\n".join(lines)
+
+    def _column_stats(self, table_data: Dict[str, Any], cells: List[List[Optional[str]]], columns: List[str]) -> List[Dict[str, Any]]:
+        """
+        Per-column profile (filled, distinct, exact, top; see core/profiles.py).
+        The extractor stores one in meta.column_profile while building the rows;
+        it is used when it still matches the table, otherwise one is built here.
+        """
+        stored = (table_data.get('meta') or {}).get('column_profile')
+        if isinstance(stored, dict) and stored.get('rows') == len(cells) and len(stored.get('columns') or ()) == len(columns):
+            return stored['columns']
+        profiler = ColumnProfiler(len(columns))
+        for row in cells:
+            profiler.add(row)
+        return profiler.to_dict()['columns']
+
+    def _format_column_profiles(self, columns: List[str], stats: List[Dict[str, Any]], total_rows: int) -> str:
         if total_rows == 0:
             return "No data rows."
-            
-        for col in columns:
-            values = [str(r.get(col, "")).strip() for r in rows if r.get(col) is not None and str(r.get(col, "")).strip()]
-            non_empty_count = len(values)
-            unique_count = len(set(values))
-            
+
+        profiles = []
+        for col, stat in zip(columns, stats):
             # Sample values (top 3 most common)
-            from collections import Counter
-            common = Counter(values).most_common(3)
-            samples = [f"{k}({v})" for k, v in common]
+            samples = [f"{k}({v})" for k, v in stat['top']]
             
-            fill_rate = (non_empty_count / total_rows) * 100
+            fill_rate = (stat['filled'] / total_rows) * 100
+            # Estimated once a column has too many distinct values to count
+            unique = stat['distinct'] if stat.get('exact', True) else f"~{stat['distinct']}"
             
-            profile = f"Column '{col}': {fill_rate:.1f}% filled, {unique_count} unique. Samples: {samples}"
+            profile = f"Column '{col}': {fill_rate:.1f}% filled, {unique} unique. Samples: {samples}"
             profiles.append(profile)
             
         return "\n".join(profiles)
 
-    def _call_llm(self, summaries: List[str], column_profiles: str, columns: List[str]) -> Tuple[List[RowAction], List[Dict[str, str]]]:
+    def _schema_fingerprint(self, columns: List[str], stats: List[Dict[str, Any]], total_rows: int) -> str:
+        """
+        Hash of the column list plus the coarse shape of each column's profile
+        (fill-rate bucket, and whether it is empty, constant or varied).
+        Tables with the same fingerprint get the same merge_columns decision.
+        """
+        shape = []
+        for col, stat in zip(columns, stats):
+            fill_rate = stat['filled'] / total_rows * 100 if total_rows else 0
+            fill_bucket = next(i for i, bound in enumerate(self.FILL_BUCKETS) if fill_rate <= bound)
+            shape.append((str(col).strip(), fill_bucket, min(stat['distinct'], 2)))
+        return hashlib.sha256(json.dumps([self.model, shape], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        # ~1 token per CJK character (3 UTF-8 bytes) or per 3-4 ASCII characters
+        return len(text.encode('utf-8')) // 3 + 1
+
+    def _flush_pack(self, pack: List[PreparedTable]) -> Generator[Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]], None, None]:
+        fresh = [p for p in pack if p.reused is None]
+        if len(fresh) > 1:
+            self.logger.info(f"Packing {len(fresh)} tables into one request")
+            results = iter(self._call_llm_packed(fresh))
+        else:
+            results = None
+        for prepared in pack:
+            result = next(results) if results is not None and prepared.reused is None else None
+            if result is None:
+                # Reused, not packed, or missing from the packed response: handled on its own
+                yield (prepared.table, *self._process_prepared(prepared))
+            else:
+                yield (prepared.table, *self._finalize(prepared, *result))
+
+    def _call_llm_packed(self, pack: List[PreparedTable]) -> List[Optional[Tuple[List[RowAction], List[Dict[str, str]]]]]:
+        """
+        One request for several tables, each tagged T0, T1, ... so the response can
+        be split back per table. Returns (actions, merge_instructions) per table,
+        or None for tables the response does not cover.
+        """
+        tags = [f"T{i}" for i in range(len(pack))]
+        # Ask for merge_columns once per unseen schema; tables sharing a schema
+        # with an earlier table of the pack reuse that table's decision.
+        ask_merge = []
+        asked = set()
+        for prepared in pack:
+            ask = self._cached_merge_decision(prepared.schema_key) is None and prepared.schema_key not in asked
+            if ask:
+                asked.add(prepared.schema_key)
+            ask_merge.append(ask)
+
+        prompt = self._build_packed_prompt(pack, tags, ask_merge)
+        call = CallMetrics([p.table.get('table_id') for p in pack], sum(len(p.summaries) for p in pack), packed=True)
+        deadline = time.perf_counter() + self.table_deadline if self.table_deadline else None
+        try:
+            result = self._complete_json(prompt, call, deadline)
+        except TimeoutError as e:
+            # Retrying the tables one by one would blow the deadline again
+            self.logger.error(f"Packed LLM Call failed: {e}")
+            return [(self._fill_keep(self._fallback(p, 0, len(p.summaries), "Table deadline exceeded"), len(p.summaries)),
+                     self._cached_merge_decision(p.schema_key) or []) for p in pack]
+        except Exception as e:
+            self.logger.error(f"Packed LLM Call failed: {e}")
+            return [None] * len(pack)
+        finally:
+            if pack[0].metrics is not None:
+                pack[0].metrics.record_call(call, [p.tokens for p in pack])
+
+        entries = result.get('tables')
+        if not isinstance(entries, dict):
+            return [None] * len(pack)
+
+        results = []
+        for prepared, tag, ask in zip(pack, tags, ask_merge):
+            entry = entries.get(tag)
+            if not isinstance(entry, dict):
+                results.append(None)
+                continue
+            try:
+                actions = self._fill_keep(self._parse_actions(entry.get('actions') or []), len(prepared.summaries))
+            except Exception as e:
+                self.logger.error(f"Invalid actions for packed table {tag}: {e}")
+                results.append(None)
+                continue
+            if ask:
+                merge_instructions = self._unique_merges(entry.get('merge_columns') or [])
+                self._store_merge_decision(prepared.schema_key, merge_instructions)
+            else:
+                merge_instructions = self._cached_merge_decision(prepared.schema_key) or []
+            results.append((actions, merge_instructions))
+        return results
+
+    def _call_llm(self, prepared: PreparedTable) -> Tuple[List[RowAction], List[Dict[str, str]]]:
         # Chunking to avoid context limits
-        chunk_size = 100
+        chunk_size = self.CHUNK_SIZE
+        summaries = prepared.summaries
+        columns = prepared.table.get('columns', [])
         actions = []
-        merge_instructions = []
+        deadline = time.perf_counter() + self.table_deadline if self.table_deadline else None
         
-        # Only process first chunk for column merging logic?
-        # Column redundancy should be visible in the first chunk.
-        # But we process all chunks for row actions.
+        # Column redundancy is decided once per schema: by the merge cache if
+        # this schema was seen before, otherwise by the first successful chunk.
+        # Every other chunk is asked for row actions only.
+        merge_instructions = self._cached_merge_decision(prepared.schema_key)
         
         for i in range(0, len(summaries), chunk_size):
             chunk = summaries[i:i+chunk_size]
-            # Include profiles only in the first chunk prompt to save tokens?
-            # Or always include? It's useful context. Profiles shouldn't be too huge.
-            prompt = self._build_prompt(chunk, column_profiles, columns)
+            if deadline is not None and time.perf_counter() >= deadline:
+                self.logger.warning(f"Table deadline of {self.table_deadline}s exceeded; rows {i}+ use the offline rule engine")
+                actions.extend(self._fallback(prepared, i, len(summaries), "Table deadline exceeded"))
+                break
+            ask_merge = merge_instructions is None
+            prompt = self._build_prompt(chunk, prepared.column_profiles, columns, ask_merge)
+            call = CallMetrics([prepared.table.get('table_id')], len(chunk))
             
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "You are a data cleaning assistant. Analyze the table rows. Identify sub-table headers (split points) and junk rows. Check for redundant columns (merged headers). Return JSON output."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                content = response.choices[0].message.content
-                result = json.loads(content)
+                result = self._complete_json(prompt, call, deadline)
                 
                 # Parse row actions
-                for item in result.get('actions', []):
-                    row_id = int(item.get('row_id'))
-                    action_type = item.get('type')
-                    
-                    if action_type == 'delete':
-                        actions.append(RowAction(row_id, "delete", item.get('reason', 'AI Decision')))
-                    elif action_type == 'split':
-                        actions.append(RowAction(row_id, "split_header", item.get('reason', 'AI Split'), item.get('new_table_name', 'SubTable')))
+                actions.extend(self._parse_actions(result.get('actions', [])))
                 
-                # Parse merge instructions (accumulate or take from first valid?)
-                # We can take unique instructions.
-                if result.get('merge_columns'):
-                    for m in result.get('merge_columns'):
-                        if m not in merge_instructions:
-                            merge_instructions.append(m)
+                if ask_merge:
+                    merge_instructions = self._unique_merges(result.get('merge_columns') or [])
+                    self._store_merge_decision(prepared.schema_key, merge_instructions)
                             
             except Exception as e:
                 self.logger.error(f"LLM Call failed: {e}")
-                pass
+                reason = "Table deadline exceeded" if isinstance(e, TimeoutError) else "LLM call failed"
+                actions.extend(self._fallback(prepared, i, i + len(chunk), reason))
+            finally:
+                if prepared.metrics is not None:
+                    prepared.metrics.record_call(call)
                 
+        return self._fill_keep(actions, len(summaries)), merge_instructions or []
+
+    def _fallback(self, prepared: PreparedTable, start: int, end: int, reason: str) -> List[RowAction]:
+        """Offline cleaner actions for rows start..end-1, flagged for the audit log."""
+        if prepared.fallback is None:
+            prepared.fallback = []
+        if prepared.fallback and prepared.fallback[-1][1] == start and prepared.fallback[-1][2] == reason:
+            prepared.fallback[-1] = (prepared.fallback[-1][0], end, reason)
+        else:
+            prepared.fallback.append((start, end, reason))
+        decisions = self.cleaner.classify(prepared.cells[start:end], prepared.masks[start:end])
+        return [RowAction(start + d[0], *d[1:]) for d in decisions]
+
+    @staticmethod
+    def _parse_actions(items: List[Dict[str, Any]]) -> List[RowAction]:
+        """RowActions for the 'delete' and 'split' entries of an LLM response."""
+        actions = []
+        for item in items:
+            row_id = int(item.get('row_id'))
+            action_type = item.get('type')
+            
+            if action_type == 'delete':
+                actions.append(RowAction(row_id, "delete", item.get('reason', 'AI Decision')))
+            elif action_type == 'split':
+                actions.append(RowAction(row_id, "split_header", item.get('reason', 'AI Split'), item.get('new_table_name', 'SubTable')))
+        return actions
+
+    @staticmethod
+    def _fill_keep(actions: List[RowAction], row_count: int) -> List[RowAction]:
         # Fill in 'keep' actions for rows not mentioned
         processed_ids = {a.row_index for a in actions}
-        all_ids = set(range(len(summaries)))
+        all_ids = set(range(row_count))
         missing_ids = all_ids - processed_ids
         for mid in missing_ids:
             actions.append(RowAction(mid, "keep"))
             
         actions.sort(key=lambda x: x.row_index)
-        return actions, merge_instructions
-
-    def _build_prompt(self, summaries: List[str], column_profiles: str, columns: List[str]) -> str:
-        data_str = "\n".join(summaries)
-        return f"""
-Analyze these Excel rows. They are from a table with columns: {columns}.
-
-Data Profile (Column Statistics):
-{column_profiles}
-
-Identify:
-1. "Junk" rows: 
-   - Navigation buttons ("新建", "New", "Back", "Edit")
-   - System Info lines ("System Info", "系统信息", "更改所有人", "Change Owner")
-   - Empty separators or lines with only 1 non-empty cell that is not a section header.
-   - Any row containing "更改所有人" or "Change Owner" is definitely junk/action button.
-
-2. "Split" headers (Section Separators): 
-    - Use the following logic to identify a new table section:
-      a) **Exclusivity**: The row has values only in the first 1-2 columns, with the rest being empty.
-      b) **Semantic Generality**: The content is a broad category name (often ending in "Info", "Information", "List", "History", "信息", "记录", "附件").
-      c) **Context Shift**: The row breaks the pattern of previous data rows. It looks like a title, not a data record.
-      d) **Uniformity vs Noise**: 
-         - If a row has identical values across ALL columns (e.g., "System Info" repeated in every cell), it is likely a Section Header (Split).
-         - BUT if a row has identical values that are clearly navigation actions (e.g., "New" repeated), it is Noise (Delete).
-    - Examples of Split Headers: "个案 (Case)", "索赔单", "资产保修记录", "备注信息", "系统信息".
-
- Analyze Columns for Redundancy:
-- If a column name is duplicated (e.g. "排序", "排序_2") AND the data suggests they are identical or the second one is always empty/redundant (check Data Profile!), mark it for merging.
-- BUT if the data shows they are distinct (e.g. checkmarks in different rows for "显示位置" and "显示位置_2"), DO NOT merge.
-- Look at the "Content" in the rows below to judge redundancy.
-
-Return JSON format:
-{{
-  "actions": [
-    {{ "row_id": 12, "type": "delete", "reason": "Junk button: '新建'" }},
-    {{ "row_id": 45, "type": "split", "new_table_name": "Claim_Records", "reason": "Section Header: '索赔单'" }}
-  ],
-  "merge_columns": [
-    {{ "keep": "排序", "drop": "排序_2", "reason": "Second column is 90% empty/redundant" }}
-  ]
-}}
-Only include rows that need 'delete' or 'split'. Assume others are 'keep'.
-If no columns need merging, return empty list for "merge_columns".
-
-Rows:
-{data_str}
-"""
-
-    def _heuristic_fallback(self, summaries: List[str]) -> List[RowAction]:
-        actions = []
-        for summary in summaries:
-            parts = summary.split("|")
-            row_id_str = parts[0].split(":")[1]
-            row_id = int(row_id_str)
-            content = parts[-1].split("Content:")[1] if "Content:" in parts[-1] else ""
-            
-            if "新建" in content or "System Info" in content or "系统信息" in content:
-                 actions.append(RowAction(row_id, "delete", "Heuristic: Junk keyword"))
-            elif ("个案" in content or "索赔单" in content) and "Count:1" in summary: # Very simple heuristic
-                 name = "Case" if "个案" in content else "Claim"
-                 actions.append(RowAction(row_id, "split_header", "Heuristic: Section Header", name))
-            else:
-                 actions.append(RowAction(row_id, "keep"))
         return actions
 
-    def _apply_actions(self, original_table: Dict[str, Any], rows: List[Dict[str, Any]], actions: List[RowAction]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    @staticmethod
+    def _unique_merges(merges: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Drops repeated (keep, drop) pairs, keeping the first occurrence."""
+        seen = set()
+        unique = []
+        for m in merges:
+            if not isinstance(m, dict):
+                continue
+            key = (m.get('keep'), m.get('drop'))
+            if key not in seen:
+                seen.add(key)
+                unique.append(m)
+        return unique
+
+    def _cached_merge_decision(self, schema_key: Optional[str]) -> Optional[List[Dict[str, str]]]:
+        if schema_key is None:
+            return None
+        with self._cache_lock:
+            cached = self._merge_cache.get(schema_key)
+            if cached is not None:
+                self._merge_cache.move_to_end(schema_key)
+            return cached
+
+    def _store_merge_decision(self, schema_key: Optional[str], merges: List[Dict[str, str]]):
+        if schema_key is None or self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._merge_cache[schema_key] = merges
+            while len(self._merge_cache) > self.cache_size:
+                self._merge_cache.popitem(last=False)
+
+    def _complete_json(self, prompt: str, call: Optional[CallMetrics] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Chat completion parsed as JSON, served from the response cache when possible.
+        Tokens, latency and retries are filled into call, also when the request fails.
+        Raises TimeoutError if no answer arrived by deadline (a perf_counter() time).
+        """
+        call = call or CallMetrics([], 0)
+        key = hashlib.sha256(f"{self.model}\0{prompt}".encode('utf-8')).hexdigest()
+        with self._cache_lock:
+            cached = self._response_cache.get(key)
+            if cached is not None:
+                self._response_cache.move_to_end(key)
+                call.cached = True
+                return cached
+
+        request = dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"}
+        )
+        if self.request_timeout:
+            request['timeout'] = self.request_timeout
+        start = time.perf_counter()
+        try:
+            response, call.retries = self._send(request, call, deadline)
+        except Exception as e:
+            call.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+            call.retries = self._retry_count(getattr(e, 'request', None))
+            call.error = str(e)
+            raise
+        call.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        content = response.choices[0].message.content
+        usage = getattr(response, 'usage', None)
+        if usage is not None and usage.prompt_tokens is not None:
+            call.prompt_tokens = usage.prompt_tokens
+            call.completion_tokens = usage.completion_tokens or 0
+            # DeepSeek reports prompt_cache_hit_tokens, OpenAI prompt_tokens_details.cached_tokens
+            cache_hit = getattr(usage, 'prompt_cache_hit_tokens', None)
+            if cache_hit is None:
+                cache_hit = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None)
+            call.cached_prompt_tokens = cache_hit or 0
+        else:
+            call.prompt_tokens = self._estimate_tokens(self.SYSTEM_PROMPT) + self._estimate_tokens(prompt)
+            call.completion_tokens = self._estimate_tokens(content or "")
+            call.estimated = True
+        try:
+            result = json.loads(content)
+        except ValueError as e:
+            call.error = f"Invalid JSON: {e}"
+            raise
+
+        if self.cache_size > 0:
+            with self._cache_lock:
+                self._response_cache[key] = result
+                while len(self._response_cache) > self.cache_size:
+                    self._response_cache.popitem(last=False)
+        return result
+
+    def _send(self, request: Dict[str, Any], call: CallMetrics, deadline: Optional[float] = None) -> Tuple[Any, int]:
+        """
+        (response, retries) of the request. With hedging, a duplicate is sent
+        once the request has run past the hedge delay and a request slot is
+        free, and the first success wins. With a deadline, the wait stops there
+        and TimeoutError is raised. Requests that lose or are abandoned finish
+        on their own daemon threads, and their HTTP timeout never reaches past
+        the deadline.
+        """
+        hedge_after = self._hedge_delay()
+        if hedge_after is None and deadline is None:
+            return self._create(request)
+
+        start = time.perf_counter()
+        pending = {self._submit(request, deadline)}
+        error = None
+        while pending:
+            limits = [deadline] if deadline is not None else []
+            if hedge_after is not None:
+                limits.append(start + hedge_after)
+            timeout = max(0.0, min(limits) - time.perf_counter()) if limits else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            now = time.perf_counter()
+            if pending and deadline is not None and now >= deadline:
+                raise TimeoutError("Table deadline exceeded while waiting for the LLM")
+            if pending and hedge_after is not None and now - start >= hedge_after:
+                # One hedge at most, and only if it does not have to wait for a slot
+                hedge_after = None
+                hedge = self._submit(request, deadline, wait_for_slot=False)
+                if hedge is None:
+                    self.logger.debug("All request slots busy, not hedging")
+                else:
+                    self.logger.debug(f"Request running for {now - start:.2f}s, sending a hedged duplicate")
+                    call.hedged = True
+                    pending.add(hedge)
+        raise error
+
+    def _submit(self, request: Dict[str, Any], deadline: Optional[float] = None,
+                wait_for_slot: bool = True) -> "Optional[Future[Tuple[Any, int]]]":
+        """
+        Starts _create on a daemon thread, so a request that is abandoned never
+        holds up interpreter exit. With a deadline, the HTTP timeout is capped
+        at the time left.
+        The thread takes one of REQUEST_SLOTS until its request ends. If none is
+        free, this waits until the deadline and then raises TimeoutError, or
+        returns None at once without wait_for_slot.
+        """
+        if wait_for_slot:
+            timeout = None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+            if not self._request_slots.acquire(timeout=timeout):
+                raise TimeoutError("Table deadline exceeded while waiting for a free LLM request slot")
+        elif not self._request_slots.acquire(blocking=False):
+            return None
+        if deadline is not None:
+            remaining = max(deadline - time.perf_counter(), 0.001)
+            timeout = request.get('timeout')
+            request = dict(request, timeout=min(timeout, remaining) if timeout else remaining)
+        future: "Future[Tuple[Any, int]]" = Future()
+
+        def run():
+            try:
+                if not future.set_running_or_notify_cancel():
+                    return
+                try:
+                    future.set_result(self._create(request))
+                except BaseException as e:
+                    future.set_exception(e)
+            finally:
+                self._request_slots.release()
+
+        threading.Thread(target=run, name="llm-request", daemon=True).start()
+        return future
+
+    def _create(self, request: Dict[str, Any]) -> Tuple[Any, int]:
+        """One chat completion: (response, retries). Successful latencies feed the hedge delay."""
+        completions = self.client.chat.completions
+        start = time.perf_counter()
+        # The raw response exposes the final HTTP request, whose
+        # x-stainless-retry-count header is the SDK's own retry count.
+        raw_api = getattr(completions, 'with_raw_response', None)
+        if raw_api is not None:
+            raw = raw_api.create(**request)
+            retries = self._retry_count(raw.http_request)
+            response = raw.parse()
+        else:
+            response = completions.create(**request)
+            retries = 0
+        with self._cache_lock:
+            self._latencies.append(time.perf_counter() - start)
+        return response, retries
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds after which a request is hedged: hedge_percentile of the recent request latencies."""
+        if not self.hedge_percentile:
+            return None
+        with self._cache_lock:
+            if len(self._latencies) < self.HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_percentile / 100 * len(ordered)))]
+
+    @staticmethod
+    def _retry_count(request) -> int:
+        try:
+            return int(request.headers.get('x-stainless-retry-count') or 0)
+        except (AttributeError, TypeError, ValueError):
+            return 0
+
+    def _build_prompt(self, summaries: List[str], column_profiles: str, columns: List[str], ask_merge: bool = True) -> str:
+        """
+        User message for one chunk of one table; the instructions are in
+        SYSTEM_PROMPT. The column profile is only included when ask_merge is set.
+        """
+        profile = f"Data Profile (Column Statistics):\n{column_profiles}\n" if ask_merge else ""
+        return f"{profile}{self._format_rows(summaries, columns)}\n"
+
+    def _build_packed_prompt(self, pack: List[PreparedTable], tags: List[str], ask_merge: List[bool]) -> str:
+        """
+        User message for several small tables, one "### Table <tag>" section
+        each. Row IDs restart at 0 in every table; the Data Profile is only
+        included for tables in ask_merge.
+        """
+        sections = []
+        for prepared, tag, ask in zip(pack, tags, ask_merge):
+            profile = f"Data Profile (Column Statistics):\n{prepared.column_profiles}\n" if ask else ""
+            sections.append(f"### Table {tag}\n{profile}{self._format_rows(prepared.summaries, prepared.table.get('columns', []))}")
+        return "\n\n".join(sections) + "\n"
+
+    def _apply_actions(self, original_table: Dict[str, Any], rows: List[Dict[str, Any]], actions: List[RowAction],
+                       merge_instructions: Optional[List[Dict[str, str]]] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Applies deletes, splits and column drops in a single pass over the rows.
+        Row dicts are never copied or modified: subtables reuse the kept input
+        dicts, and dropped columns are only left out of the subtables' column
+        list, which is what every writer emits rows through.
+        """
         result_tables = []
         audit_log = []
         
-        current_rows = []
-        current_name = original_table.get('sheet', 'Sheet1')
         current_base_id = original_table.get('table_id')
+        current_name = original_table.get('sheet', 'Sheet1')
         
-        actions_map = {a.row_index: a for a in actions}
+        # Shared by every subtable; only rows, sheet and table_id differ
+        base = {k: v for k, v in original_table.items() if k != 'rows'}
+        cols_to_drop = {m.get('drop') for m in merge_instructions or () if m.get('drop')}
+        if cols_to_drop:
+            columns = original_table.get('columns') or (list(rows[0].keys()) if rows else [])
+            base['columns'] = [c for c in columns if c not in cols_to_drop]
+        
+        def emit(subtable_rows):
+            result_tables.append({**base, 'rows': subtable_rows, 'sheet': current_name,
+                                  'table_id': f"{current_base_id}_{len(result_tables)}"})
+        
+        # Only deletes and splits need a lookup; everything else is kept
+        actions_map = {a.row_index: a for a in actions if a.action in ("delete", "split_header")}
+        current_rows = []
         
         for i, row_data in enumerate(rows):
-            action = actions_map.get(i, RowAction(i, "keep"))
+            action = actions_map.get(i)
             
-            if action.action == "delete":
+            if action is None:
+                current_rows.append(row_data)
+            elif action.action == "delete":
                 audit_log.append({
                     "original_table_id": current_base_id,
                     "row_index": i,
@@ -267,16 +825,10 @@ Rows:
                     "action": "delete",
                     "reason": action.reason
                 })
-            elif action.action == "split_header":
-                # Finish current table
+            else:
+                # split_header: finish the current table and start a new one
                 if current_rows:
-                    new_table = original_table.copy()
-                    new_table['rows'] = current_rows
-                    new_table['sheet'] = current_name
-                    new_table['table_id'] = f"{current_base_id}_{len(result_tables)}"
-                    result_tables.append(new_table)
-                
-                # Start new
+                    emit(current_rows)
                 current_rows = []
                 current_name = f"{original_table.get('sheet')}_{action.new_table_name}"
                 
@@ -287,14 +839,18 @@ Rows:
                     "action": "split",
                     "reason": f"Start of {action.new_table_name}"
                 })
-            else:
-                current_rows.append(row_data)
                 
         if current_rows:
-            new_table = original_table.copy()
-            new_table['rows'] = current_rows
-            new_table['sheet'] = current_name
-            new_table['table_id'] = f"{current_base_id}_{len(result_tables)}"
-            result_tables.append(new_table)
+            emit(current_rows)
+        
+        # Log merge actions
+        for m in merge_instructions or ():
+            audit_log.append({
+                "original_table_id": current_base_id,
+                "row_index": -1, # Global action
+                "action": "merge_column",
+                "reason": m.get('reason'),
+                "content": f"Drop '{m.get('drop')}' keep '{m.get('keep')}'"
+            })
             
         return result_tables, audit_log
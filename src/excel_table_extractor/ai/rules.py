@@ -0,0 +1,172 @@
+"""
+Offline row cleaning: keyword dictionaries plus structural rules, no LLM.
+
+All phrase dictionaries are compiled into one Aho–Corasick automaton, so a
+cell is scanned once whatever the number of keywords. Cells are scanned once
+per distinct value (tables repeat the same labels a lot), and only text cells
+are scanned. The rules mirror the ones given to the LLM in ROW_RULES.
+"""
+import hashlib
+import json
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Optional, Tuple
+from ..core.masks import RowMask, TEXT
+
+# Match kinds
+JUNK = 'junk'
+SECTION = 'section'
+
+@dataclass
+class OfflineRules:
+    """Dictionaries of the offline cleaner; load() reads overrides from a JSON file with the same keys."""
+    # A row whose non-empty cells are all one of these is a navigation/action row
+    junk_cells: Tuple[str, ...] = ("新建", "New", "Back", "Edit", "返回", "编辑", "保存", "Save", "Cancel", "取消")
+    # A row containing any of these anywhere is system noise
+    junk_phrases: Tuple[str, ...] = ("System Info", "系统信息", "更改所有人", "Change Owner")
+    # A sparse row containing any of these is a section header
+    section_phrases: Tuple[str, ...] = ("个案", "索赔单", "资产保修记录", "备注信息")
+    # ... as is a sparse row whose text ends with one of these
+    section_suffixes: Tuple[str, ...] = ("Info", "Information", "List", "History", "信息", "记录", "附件")
+    # Sparse = values only in the first `header_columns` columns
+    header_columns: int = 2
+    # Longest text treated as a section title rather than data
+    max_header_length: int = 40
+
+    @classmethod
+    def load(cls, path: str) -> 'OfflineRules':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        unknown = set(data) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown offline rule keys: {', '.join(sorted(unknown))}")
+        return cls(**{k: tuple(v) if isinstance(v, list) else v for k, v in data.items()})
+
+    def fingerprint(self) -> str:
+        return hashlib.sha256(json.dumps(asdict(self), ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+class KeywordAutomaton:
+    """
+    Aho–Corasick automaton over a {keyword: kind} dictionary. The goto/fail
+    functions are folded into one transition dict per state, so matching costs
+    one dict lookup per character.
+    """
+    def __init__(self, keywords: Dict[str, str]):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[Tuple[Tuple[str, str], ...]] = [()]
+        for keyword, kind in keywords.items():
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = goto[state][ch] = len(goto)
+                    goto.append({})
+                    outputs.append(())
+                state = nxt
+            outputs[state] += ((keyword, kind),)
+
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            # States are visited breadth-first, so delta[fail[state]] is complete
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            outputs[state] += outputs[fail[state]]
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0)
+                queue.append(nxt)
+        self._delta = delta
+        self._outputs = outputs
+
+    def find(self, text: str) -> List[Tuple[str, str]]:
+        """(keyword, kind) of every occurrence in text, in order of their end position."""
+        delta = self._delta
+        outputs = self._outputs
+        state = 0
+        hits = []
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                hits.extend(outputs[state])
+        return hits
+
+class OfflineCleaner:
+    """Classifies rows from their normalized cells and masks (see AIProcessor._normalize_cells)."""
+    # Distinct cell texts remembered before the scan cache is reset
+    CACHE_LIMIT = 100000
+
+    def __init__(self, rules: Optional[OfflineRules] = None):
+        self.rules = rules or OfflineRules()
+        keywords = {p: SECTION for p in self.rules.section_phrases}
+        # Junk wins when a phrase is in both dictionaries
+        keywords.update({p: JUNK for p in self.rules.junk_phrases})
+        self._automaton = KeywordAutomaton(keywords)
+        self._junk_cells = frozenset(self.rules.junk_cells)
+        self._section_suffixes = tuple(self.rules.section_suffixes)
+        # text -> (first junk phrase or None, has section phrase)
+        self._cell_cache: Dict[str, Tuple[Optional[str], bool]] = {}
+
+    @property
+    def source(self) -> str:
+        return f"rules:{self.rules.fingerprint()}"
+
+    def _scan(self, text: str) -> Tuple[Optional[str], bool]:
+        result = self._cell_cache.get(text)
+        if result is None:
+            if len(self._cell_cache) >= self.CACHE_LIMIT:
+                self._cell_cache = {}
+            junk = None
+            section = False
+            for keyword, kind in self._automaton.find(text):
+                if kind == JUNK:
+                    junk = keyword
+                    break
+                section = True
+            result = self._cell_cache[text] = (junk, section)
+        return result
+
+    def classify(self, cells: List[List[Optional[str]]], masks: List[RowMask]) -> List[Tuple[int, str, str, str]]:
+        """(row_index, action, reason, new_table_name) of every row that is not a plain data row."""
+        rules = self.rules
+        width = max((len(row) for row in cells), default=0)
+        sparse_limit = 1 << rules.header_columns
+        decisions = []
+        for i, row in enumerate(cells):
+            occupancy, types = masks[i]
+            if not occupancy:
+                decisions.append((i, "delete", "Offline: empty row", ""))
+                continue
+
+            values = [v for v in row if v is not None]
+            junk = None
+            section = False
+            for v, t in zip(row, types):
+                if t == TEXT:
+                    hit, sec = self._scan(v)
+                    if hit is not None:
+                        junk = hit
+                        break
+                    section = section or sec
+            if junk is not None:
+                decisions.append((i, "delete", f"Offline: junk keyword '{junk}'", ""))
+                continue
+            if all(v in self._junk_cells for v in values):
+                decisions.append((i, "delete", "Offline: navigation row", ""))
+                continue
+
+            first = values[0]
+            uniform = width >= 2 and len(values) == width and values.count(first) == width
+            # Title-like text only in the leading columns, or repeated across every column
+            if (occupancy < sparse_limit or uniform) and types[(occupancy & -occupancy).bit_length() - 1] == TEXT:
+                title = " ".join(dict.fromkeys(values))
+                if len(title) <= rules.max_header_length and (
+                    uniform or section or title.endswith(self._section_suffixes)
+                ):
+                    decisions.append((i, "split_header", "Offline: section header", title))
+                    continue
+            if len(values) == 1 and width >= 3:
+                decisions.append((i, "delete", "Offline: single-cell row", ""))
+        return decisions
@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+from typing import List, Dict, Any, Optional, Tuple
+
+class RefinementState:
+    """
+    Refinement decisions (row actions and merge_columns) of previous runs,
+    keyed by table_id, for incremental process-json.
+
+    A table is reused when its table_id and meta.content_hash match an entry
+    that was produced by the same model; its stored decisions are re-applied
+    to the current rows instead of asking the model again. Tables without a
+    content_hash are always refined. Only the tables seen in the current run
+    are kept when the state is saved, unless the run covered a subset of the
+    tables (save(keep_unseen=True)).
+    """
+    VERSION = 1
+
+    def __init__(self, path: str, model: str):
+        self.path = path
+        self.model = model
+        self.logger = logging.getLogger("refinement_state")
+        self.reused = 0
+        self.refined = 0
+        self._previous: Dict[str, Dict[str, Any]] = {}
+        self._current: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> 'RefinementState':
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable state file {self.path}: {e}")
+            return self
+        if data.get('version') != self.VERSION or data.get('model') != self.model:
+            self.logger.info(f"State file {self.path} was written by another version or model; refining all tables.")
+            return self
+        self._previous = data.get('tables') or {}
+        return self
+
+    def lookup(self, table: Dict[str, Any]) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, str]]]]:
+        """(actions, merge_columns) stored for this exact table content, or None."""
+        key, content_hash = self._identity(table)
+        entry = self._previous.get(key) if key else None
+        if entry is None or not content_hash or entry.get('content_hash') != content_hash:
+            return None
+        return entry.get('actions') or [], entry.get('merge_columns') or []
+
+    def record(self, table: Dict[str, Any], actions: List[Dict[str, Any]], merge_columns: List[Dict[str, str]], reused: bool = False):
+        key, content_hash = self._identity(table)
+        if reused:
+            self.reused += 1
+        else:
+            self.refined += 1
+        if not key or not content_hash:
+            return
+        self._current[key] = {
+            'content_hash': content_hash,
+            'actions': actions,
+            'merge_columns': merge_columns,
+        }
+
+    def save(self, keep_unseen: bool = False):
+        """Writes the decisions of this run; with keep_unseen, previous entries of tables not recorded in it are kept too."""
+        tables = {**self._previous, **self._current} if keep_unseen else self._current
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'model': self.model, 'tables': tables}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.logger.info(f"Saved refinement state for {len(tables)} tables to {self.path}")
+
+    @staticmethod
+    def _identity(table: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        return table.get('table_id'), (table.get('meta') or {}).get('content_hash')
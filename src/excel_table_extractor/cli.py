@@ -2,17 +2,16 @@ import argparse
 import sys
 import os
 import logging
-from .core.reader import StreamReader
-from .core.detector import TableDetector
-from .core.extractor import TableExtractor
-from .core.writers import TableWriter
-from .core.excel_writer import ExcelWriter
-from .ai.processor import AIProcessor
-import json
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+
+# Command-specific modules (openpyxl via the pipeline, openai, dotenv, writers,
+# the service) are imported inside the functions that use them, so `--help`
+# stays instant and `extract` never pays for the OpenAI SDK.
+# benchmarks/bench_startup.py checks this and the startup time budget.
+
+def load_env():
+    # Load environment variables (API keys) for the commands that need them
+    from dotenv import load_dotenv
+    load_dotenv()
 
 def setup_logging(verbose=False):
     level = logging.DEBUG if verbose else logging.INFO
@@ -21,25 +20,115 @@ def setup_logging(verbose=False):
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
 
+def make_processor(args):
+    """AIProcessor from the shared --api-key/--base-url/--pack-tokens/--offline/--rules and latency options."""
+    from .ai.processor import AIProcessor
+    rules = None
+    if args.rules:
+        from .ai.rules import OfflineRules
+        rules = OfflineRules.load(args.rules)
+    return AIProcessor(api_key=args.api_key, base_url=args.base_url, pack_tokens=args.pack_tokens,
+                       rules=rules, offline=args.offline, request_timeout=args.request_timeout,
+                       hedge_percentile=args.hedge_percentile, table_deadline=args.table_deadline)
+
+def log_ai_summary(logger, summary):
+    logger.info(
+        f"AI: {summary['calls']} calls ({summary['cache_hits']} cached, {summary['retries']} retries, {summary['errors']} failed), "
+        f"{summary['hedged_calls']} hedged, {summary['fallback_rows']} rows fell back to rules, "
+        f"{summary['prompt_tokens']} prompt / {summary['completion_tokens']} completion tokens, "
+        f"p50 {summary['p50_latency_ms']:.0f} ms, p95 {summary['p95_latency_ms']:.0f} ms, cost ~{summary['cost']:.4f}"
+    )
+
+def row_window_arg(text):
+    """argparse type for --rows START:END."""
+    from .pipeline import parse_row_window
+    try:
+        return parse_row_window(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
 def main():
     parser = argparse.ArgumentParser(description="Extract structured tables from Excel files.")
     
     subparsers = parser.add_subparsers(dest="command", help="Command to run")
+
+    # Options shared by several commands, added to them through parents=[...]
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
+
+    sheet_options = argparse.ArgumentParser(add_help=False)
+    sheet_options.add_argument("--sheets", nargs='+', metavar="SHEET", help="Only process these sheets (names or glob patterns)")
+    sheet_options.add_argument("--skip-hidden", action="store_true", help="Skip hidden and very hidden sheets")
+
+    read_options = argparse.ArgumentParser(add_help=False)
+    read_options.add_argument("--rows", type=row_window_arg, metavar="START:END", help="Only scan this 1-based row window")
+    read_options.add_argument("--prefetch", type=int, default=0, metavar="N", help="Parse rows on a background thread, up to N batches ahead (0 = off)")
+    read_options.add_argument("--batch-size", type=int, default=1024, help="Rows per prefetched batch")
+    read_options.add_argument("--jobs", "-j", type=int, default=1, help="Split large sheets into row shards processed by this many processes (0 = one per CPU)")
+
+    compress_options = argparse.ArgumentParser(add_help=False)
+    compress_options.add_argument("--compress", choices=['gzip', 'zstd'], help="Compress json/csv output (for clean, the intermediate tables.json) while writing (zstd needs the zstandard package)")
+    compress_options.add_argument("--compress-level", type=int, metavar="N", help="Compression level: higher is smaller but slower (gzip 0-9, default 6; zstd 1-22, default 3)")
+
+    price_options = argparse.ArgumentParser(add_help=False)
+    price_options.add_argument("--price-in", type=float, default=0.27, help="LLM price per 1M input tokens, for the cost in the AI summary and estimates")
+    price_options.add_argument("--price-out", type=float, default=1.10, help="LLM price per 1M output tokens, for the cost in the AI summary and estimates")
+
+    # Read by make_processor
+    llm_options = argparse.ArgumentParser(add_help=False)
+    llm_options.add_argument("--api-key", help="LLM API Key")
+    llm_options.add_argument("--base-url", default="https://api.deepseek.com/v1", help="LLM Base URL")
+    llm_options.add_argument("--pack-tokens", type=int, default=4000, help="Pack small tables into shared LLM requests up to this many estimated tokens (0 disables)")
+    llm_options.add_argument("--offline", action="store_true", help="Clean rows with the offline rule engine only, even if an API key is set")
+    llm_options.add_argument("--rules", metavar="JSON", help="Keyword dictionaries for the offline rule engine (see ai/rules.py OfflineRules)")
+    llm_options.add_argument("--request-timeout", type=float, metavar="SECONDS", help="HTTP timeout of each LLM request (retried by the client)")
+    llm_options.add_argument("--hedge-percentile", type=float, metavar="P", help="Send a duplicate LLM request when one runs past this percentile of recent latencies (e.g. 95)")
+    llm_options.add_argument("--table-deadline", type=float, metavar="SECONDS", help="Time budget of one table's LLM calls; remaining rows use the offline rule engine")
+
+    report_options = argparse.ArgumentParser(add_help=False)
+    report_options.add_argument("--output", "-o", required=True, help="Output file path (.xlsx, or .db/.sqlite for SQLite)")
+    report_options.add_argument("--format", "-f", choices=['xlsx', 'sqlite'], help="Output format (default: inferred from --output extension)")
+    report_options.add_argument("--audit-log", metavar="PATH", help="Stream audit entries to this .jsonl or .csv file instead of the report")
+    report_options.add_argument("--metrics", metavar="PATH", help="Write per-call and per-table token/latency/cost metrics to this JSON file")
     
     # Extract Command
-    extract_parser = subparsers.add_parser("extract", help="Extract tables from Excel")
+    extract_parser = subparsers.add_parser("extract", help="Extract tables from Excel",
+                                           parents=[sheet_options, read_options, compress_options, common])
     extract_parser.add_argument("input_file", help="Path to input .xlsx file")
     extract_parser.add_argument("--output", "-o", default="output", help="Output directory")
-    extract_parser.add_argument("--format", "-f", choices=['json', 'csv'], default='json', help="Output format")
-    extract_parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
+    extract_parser.add_argument("--format", "-f", choices=['json', 'csv', 'parquet', 'arrow', 'sqlite', 'binary'], default='json', help="Output format (binary: random-access tables.bin for process-json)")
     
     # Process JSON Command
-    process_parser = subparsers.add_parser("process-json", help="Refine extracted JSON with AI")
-    process_parser.add_argument("input_json", help="Path to extracted tables.json")
-    process_parser.add_argument("--output", "-o", required=True, help="Output Excel file path (.xlsx)")
-    process_parser.add_argument("--api-key", help="LLM API Key")
-    process_parser.add_argument("--base-url", default="https://api.deepseek.com/v1", help="LLM Base URL")
-    process_parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
+    process_parser = subparsers.add_parser("process-json", help="Refine extracted JSON with AI",
+                                           parents=[report_options, llm_options, price_options, common])
+    process_parser.add_argument("input_json", help="Path to extracted tables.json or tables.bin (the format and gzip/zstd compression are detected automatically)")
+    process_parser.add_argument("--tables", nargs='+', metavar="TABLE_ID", help="Only refine these tables")
+    process_parser.add_argument("--incremental", metavar="STATE_FILE", help="Reuse decisions saved in STATE_FILE for unchanged tables, and update it")
+
+    # Clean Command (extract + AI refinement in one process, no intermediate file)
+    clean_parser = subparsers.add_parser("clean", help="Extract and refine in one pass, streaming tables between stages",
+                                         parents=[report_options, sheet_options, read_options, llm_options,
+                                                  compress_options, price_options, common])
+    clean_parser.add_argument("input_file", help="Path to input .xlsx file")
+    clean_parser.add_argument("--intermediate", metavar="DIR", help="Also write the raw extraction (tables.json) to this directory")
+    clean_parser.add_argument("--intermediate-format", choices=['json', 'binary'], default='json', help="Format of the intermediate extraction (tables.json or tables.bin)")
+
+    # Inspect Command (zip metadata and XML headers only)
+    inspect_parser = subparsers.add_parser("inspect", help="Show sheets, sizes and estimated extraction/LLM cost without loading the workbook",
+                                           parents=[sheet_options, price_options, common])
+    inspect_parser.add_argument("input_file", help="Path to input .xlsx file")
+    inspect_parser.add_argument("--no-merges", action="store_true", help="Do not count merged ranges (avoids inflating whole sheet parts)")
+    inspect_parser.add_argument("--jobs", "-j", type=int, default=0, help="Processes available for sharding in the estimate (0 = one per CPU)")
+    inspect_parser.add_argument("--json", action="store_true", help="Print the profile and estimates as JSON")
+
+    # Serve Command (long-running worker service)
+    serve_parser = subparsers.add_parser("serve", help="Run a local worker service that accepts extract/clean jobs",
+                                         parents=[llm_options, common])
+    serve_parser.add_argument("--host", default="127.0.0.1", help="HTTP listen address")
+    serve_parser.add_argument("--port", type=int, default=8765, help="HTTP listen port")
+    serve_parser.add_argument("--socket", help="Listen on this Unix socket path instead of TCP")
+    serve_parser.add_argument("--workers", type=int, default=2, help="Number of worker threads")
+    serve_parser.add_argument("--queue-size", type=int, default=64, help="Maximum number of queued jobs")
 
     args = parser.parse_args()
     
@@ -52,6 +141,13 @@ def main():
             parser.print_help()
             sys.exit(1)
 
+    if getattr(args, 'compress', None) and args.compress_level is not None:
+        from .utils.compression import check_level
+        try:
+            check_level(args.compress, args.compress_level)
+        except ValueError as e:
+            parser.error(str(e))
+
     setup_logging(args.verbose)
     logger = logging.getLogger("cli")
 
@@ -59,6 +155,12 @@ def main():
         run_extract(args, logger)
     elif args.command == "process-json":
         run_process_json(args, logger)
+    elif args.command == "clean":
+        run_clean(args, logger)
+    elif args.command == "inspect":
+        run_inspect(args, logger)
+    elif args.command == "serve":
+        run_serve(args, logger)
 
 def run_process_json(args, logger):
     if not os.path.exists(args.input_json):
@@ -66,25 +168,52 @@ def run_process_json(args, logger):
         sys.exit(1)
         
     try:
-        logger.info(f"Loading JSON from {args.input_json}...")
-        with open(args.input_json, 'r', encoding='utf-8') as f:
-            tables = json.load(f)
-            
-        processor = AIProcessor(api_key=args.api_key, base_url=args.base_url)
-        writer = ExcelWriter(args.output)
-        
-        final_tables = []
-        full_audit_log = []
+        from .pipeline import read_tables, refine_tables, open_report_writer, open_audit_writer
+        from .ai.metrics import AIMetrics
+        load_env()
         
-        logger.info(f"Processing {len(tables)} tables with AI...")
-        for table in tables:
-            processed_subtables, log = processor.process_table(table)
-            final_tables.extend(processed_subtables)
-            full_audit_log.extend(log)
-            logger.info(f"  Table {table.get('table_id')}: Split into {len(processed_subtables)} tables, {len(log)} audit actions.")
+        logger.info(f"Loading tables from {args.input_json}...")
+        tables = read_tables(args.input_json, args.tables)
             
-        logger.info(f"Writing {len(final_tables)} tables to {args.output}...")
-        writer.write(final_tables, full_audit_log)
+        processor = make_processor(args)
+        state = None
+        if args.incremental:
+            from .ai.state import RefinementState
+            state = RefinementState(args.incremental, processor.decision_source).load()
+        metrics = AIMetrics(args.price_in, args.price_out)
+        writer = open_report_writer(args.output, args.format)
+        audit = open_audit_writer(writer, args.audit_log)
+        
+        logger.info("Processing tables with AI...")
+        writer.begin()
+        table_count = 0
+        try:
+            if audit is not writer:
+                audit.begin()
+            try:
+                for processed_subtables, log in refine_tables(tables, processor, state, metrics):
+                    for subtable in processed_subtables:
+                        writer.write_table(subtable)
+                    audit.write_audit(log)
+                    table_count += len(processed_subtables)
+            finally:
+                if audit is not writer:
+                    audit.finish()
+
+            logger.info(f"Writing {table_count} tables to {args.output}...")
+            summary = metrics.summary()
+            writer.write_summary(summary)
+            writer.finish()
+        except BaseException:
+            writer.abort()
+            raise
+        log_ai_summary(logger, summary)
+        if args.metrics:
+            metrics.write(args.metrics)
+        if state is not None:
+            logger.info(f"Reused {state.reused} tables from {args.incremental}, refined {state.refined}.")
+            # Saved only after the report is complete; a --tables run keeps the other tables' entries
+            state.save(keep_unseen=args.tables is not None)
         logger.info("Done.")
         
     except Exception as e:
@@ -97,64 +226,100 @@ def run_extract(args, logger):
         sys.exit(1)
         
     try:
+        from .core.writers import TableWriter
+        from .pipeline import extract_tables
+        
         logger.info(f"Processing {args.input_file}...")
-        reader = StreamReader(args.input_file)
+        writer = TableWriter(args.output, args.format, compress=args.compress, compress_level=args.compress_level)
         
-        # Determine sheets to process
-        # StreamReader doesn't list sheets directly yet, but we can access internal wb if loaded, or use openpyxl
-        import openpyxl
-        wb = openpyxl.load_workbook(args.input_file, read_only=True)
-        sheet_names = wb.sheetnames
-        wb.close()
+        # Tables are written as soon as they are extracted
+        writer.write(extract_tables(args.input_file, args.sheets, args.skip_hidden, args.rows,
+                                    prefetch=args.prefetch, batch_size=args.batch_size, workers=args.jobs))
+        logger.info(f"Wrote {writer.tables_written} tables to {args.output}")
+        logger.info("Done.")
         
-        detector = TableDetector()
-        extractor = TableExtractor()
-        writer = TableWriter(args.output, args.format)
+    except Exception as e:
+        logger.error(f"Extraction failed: {e}", exc_info=True)
+        sys.exit(1)
+
+def run_clean(args, logger):
+    if not os.path.exists(args.input_file):
+        logger.error(f"Input file not found: {args.input_file}")
+        sys.exit(1)
         
-        all_extracted_tables = []
+    try:
+        from .pipeline import clean
+        load_env()
         
-        for sheet in sheet_names:
-            logger.info(f"Analyzing sheet: {sheet}")
-            
-            # 1. Detect
-            candidates = detector.detect(reader, sheet)
-            logger.info(f"  Found {len(candidates)} candidates")
-            
-            # 2. Extract
-            # Note: We should probably create a new reader or ensure reader can be reset/reused efficiently
-            # StreamReader.iter_sheet handles re-opening if wb is closed? 
-            # My implementation of StreamReader keeps _wb open. 
-            # But iter_rows in read_only mode can usually be called multiple times? 
-            # Documentation says: "If you want to iterate through the cells of a worksheet multiple times, you must use a fresh workbook object."
-            # So my StreamReader needs to close and re-open _wb for each pass if we iterate multiple times?
-            # detector.detect iterates once.
-            # extractor.extract iterates once.
-            # So we iterate the sheet TWICE.
-            # We must close and re-open.
-            
-            reader.close()
-            # StreamReader doesn't auto-reopen in my current impl if _wb is set.
-            # I should modify StreamReader to handle reset or just instantiate new one.
-            # Instantiating new one is safer.
-            
-            reader_for_extract = StreamReader(args.input_file)
-            # Use cached merged cells to avoid re-parsing
-            reader_for_extract._merged_cells_cache = reader.merged_cells
-            
-            tables = list(extractor.extract_all(reader_for_extract, candidates))
-            logger.info(f"  Extracted {len(tables)} tables")
-            
-            all_extracted_tables.extend(tables)
-            reader_for_extract.close()
-            
-        # 3. Write
-        logger.info(f"Writing {len(all_extracted_tables)} tables to {args.output}...")
-        writer.write(all_extracted_tables)
+        logger.info(f"Cleaning {args.input_file}...")
+        processor = make_processor(args)
+        stats = clean(
+            args.input_file, args.output, processor,
+            output_format=args.format,
+            intermediate_dir=args.intermediate,
+            intermediate_format=args.intermediate_format,
+            intermediate_compress=args.compress,
+            compress_level=args.compress_level,
+            sheets=args.sheets,
+            skip_hidden=args.skip_hidden,
+            row_window=args.rows,
+            audit_path=args.audit_log,
+            prefetch=args.prefetch,
+            batch_size=args.batch_size,
+            workers=args.jobs,
+            metrics_path=args.metrics,
+            price_in=args.price_in,
+            price_out=args.price_out,
+        )
+        logger.info(
+            f"Extracted {stats['extracted_tables']} tables, wrote {stats['output_tables']} tables "
+            f"and {stats['audit_entries']} audit entries to {args.output}"
+        )
+        log_ai_summary(logger, stats['ai'])
         logger.info("Done.")
         
     except Exception as e:
-        logger.error(f"Extraction failed: {e}", exc_info=True)
+        logger.error(f"Cleaning failed: {e}", exc_info=True)
+        sys.exit(1)
+
+def run_inspect(args, logger):
+    if not os.path.exists(args.input_file):
+        logger.error(f"Input file not found: {args.input_file}")
+        sys.exit(1)
+
+    try:
+        import json
+        from .core.inspector import inspect_workbook, estimate_costs
+        from .core.sharding import default_workers
+        from .pipeline import select_sheets
+        from .utils.xlsx_utils import get_sheet_list
+
+        sheet_names = select_sheets(get_sheet_list(args.input_file), args.sheets, args.skip_hidden)
+        profile = inspect_workbook(args.input_file, sheet_names, scan_merges=not args.no_merges)
+        estimate = estimate_costs(profile, args.price_in, args.price_out, args.jobs if args.jobs > 0 else default_workers())
+    except Exception as e:
+        logger.error(f"Inspection failed: {e}", exc_info=True)
         sys.exit(1)
-    finally:
-        if 'reader' in locals():
-            reader.close()
+
+    if args.json:
+        print(json.dumps({'profile': profile.to_dict(), 'estimate': estimate}, ensure_ascii=False, indent=2))
+        return
+    mb = 1 << 20
+    print(f"{profile.file_path}: {profile.file_bytes / mb:.1f} MB, {len(profile.sheets)} sheets")
+    if profile.shared_strings_bytes:
+        print(f"Shared strings: {profile.unique_shared_strings} unique / {profile.shared_strings} total, {profile.shared_strings_bytes / mb:.1f} MB")
+    print(f"{'Sheet':<24} {'State':<10} {'Dimension':<14} {'Rows':>9} {'Cols':>5} {'Merges':>7} {'XML MB':>8} {'Extract s':>9} {'Jobs':>4}")
+    for sheet, est in zip(profile.sheets, estimate['sheets']):
+        merges = '-' if sheet.merged_ranges is None else sheet.merged_ranges
+        print(f"{sheet.name[:24]:<24} {sheet.state:<10} {(sheet.dimension or '?')[:14]:<14} {est['rows']:>9} {sheet.columns:>5} "
+              f"{merges:>7} {sheet.xml_bytes / mb:>8.1f} {est['extract_seconds']:>9.1f} {est['suggested_jobs']:>4}")
+    print(f"Estimated extraction: {estimate['extract_seconds']:.1f}s with suggested --jobs, peak memory ~{estimate['peak_memory_mb']} MB")
+    print(f"Estimated LLM usage: {estimate['llm_requests']} requests, {estimate['llm_input_tokens']} input / "
+          f"{estimate['llm_output_tokens']} output tokens, cost ~{estimate['llm_cost']:.4f}")
+
+def run_serve(args, logger):
+    from .service import WorkerService, serve
+    load_env()
+    processor = make_processor(args)
+    service = WorkerService(workers=args.workers, queue_size=args.queue_size, processor=processor)
+    serve(service, host=args.host, port=args.port, socket_path=args.socket)
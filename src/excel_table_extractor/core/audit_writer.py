@@ -0,0 +1,61 @@
+import csv
+import json
+import logging
+import os
+from typing import List, Dict, Any, Iterable
+from ..utils.compression import check_level, compression_from_path, strip_compression_suffix, open_text_writer
+
+class AuditLogWriter:
+    """
+    Appends audit entries to a JSON Lines (.jsonl) or CSV (.csv) file as they
+    are produced, so the audit log never has to be held in memory.
+    Same streaming API as the report writers: begin(), write_audit(), finish().
+    A .gz or .zst suffix (audit.jsonl.gz) compresses the log as it is written.
+    """
+    COLUMNS = ["original_table_id", "row_index", "action", "reason", "content"]
+
+    def __init__(self, output_path: str, format: str = None, compress_level: int = None):
+        self.output_path = output_path
+        self.compress = compression_from_path(output_path)
+        self.compress_level = check_level(self.compress, compress_level)
+        if not format:
+            base_path = strip_compression_suffix(output_path)
+            format = 'csv' if os.path.splitext(base_path)[1].lower() == '.csv' else 'jsonl'
+        if format not in ('jsonl', 'csv'):
+            raise ValueError(f"Unsupported audit log format: {format}")
+        self.format = format
+        self.entries_written = 0
+        self.logger = logging.getLogger("audit_writer")
+        self._file = None
+        self._csv = None
+
+    def write(self, audit_log: List[Dict[str, Any]]):
+        self.begin()
+        try:
+            self.write_audit(audit_log)
+        finally:
+            self.finish()
+
+    def begin(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        self.entries_written = 0
+        self._file = open_text_writer(self.output_path, self.compress, self.compress_level, newline='')
+        if self.format == 'csv':
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(self.COLUMNS)
+
+    def write_audit(self, entries: Iterable[Dict[str, Any]]):
+        for entry in entries:
+            if self._csv is not None:
+                self._csv.writerow([entry.get(c) for c in self.COLUMNS])
+            else:
+                self._file.write(json.dumps({c: entry.get(c) for c in self.COLUMNS}, ensure_ascii=False, default=str))
+                self._file.write('\n')
+            self.entries_written += 1
+
+    def finish(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._csv = None
+            self.logger.info(f"Saved {self.entries_written} audit entries to {self.output_path}")
@@ -0,0 +1,380 @@
+"""
+Random-access binary intermediate format (`extract -f binary` -> tables.bin).
+
+Unlike tables.json, a table (or a range of its rows) can be read without
+parsing anything else: the file is memory-mapped and only the blocks that
+are asked for are decoded. Several processes can map the same file and share
+its pages.
+
+Layout (little-endian):
+
+    header   MAGIC, u16 version, u16 reserved
+    blocks   per table, one block per BLOCK_ROWS rows; per column in a block:
+               kinds   one KIND byte per row, only if the column mixes kinds
+               values  one 8-byte slot per row, 8-byte aligned (none if all None)
+    strings  u64 offsets[count + 1], then the UTF-8 bytes of every distinct string
+    toc      JSON list, one entry per table in write order: table_id, sheet, bbox,
+             columns, meta, rows, and its blocks as
+             {"offset", "rows", "columns": [[kind, kinds_offset, values_offset], ...]}
+             where kind is MIXED when the kinds array is present
+    trailer  u64 strings_offset, u64 string_count, u64 toc_offset, u64 toc_length, MAGIC
+
+Slots hold int64 values, float64 bits, dictionary ids (STR; BIGINT for ints
+beyond int64, stored as their decimal text; OTHER for values stored as their
+str(), as tables.json does), bools, and dates and times as integer
+days/microseconds.
+"""
+import datetime
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Union
+from .models import ExtractedTable
+
+MAGIC = b'XTB1'
+# 2: BIGINT kind
+VERSION = 2
+# Rows per block: the unit of random access within a table
+BLOCK_ROWS = 65536
+
+# Value kinds, one per cell
+NONE, STR, INT, FLOAT, BOOL, DATETIME, DATE, TIME, TIMEDELTA, OTHER, BIGINT = range(11)
+MIXED = 255
+
+_HEADER = struct.Struct('<4sHH')
+_TRAILER = struct.Struct('<QQQQ4s')
+_BIG_ENDIAN = sys.byteorder == 'big'
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_FLOAT_BITS = struct.Struct('<d')
+_INT_BITS = struct.Struct('<q')
+_KIND_OF = {
+    type(None): NONE, str: STR, int: INT, float: FLOAT, bool: BOOL,
+    datetime.datetime: DATETIME, datetime.date: DATE, datetime.time: TIME, datetime.timedelta: TIMEDELTA,
+}
+
+def is_binary_tables(path: str) -> bool:
+    """True if path starts with the binary tables MAGIC."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def _kind(value: Any) -> int:
+    kind = _KIND_OF.get(type(value), OTHER)
+    if kind == INT and not -(1 << 63) <= value < (1 << 63):
+        return BIGINT
+    if kind in (DATETIME, TIME) and value.tzinfo is not None:
+        return OTHER
+    return kind
+
+class BinaryTableWriter:
+    """
+    Writes tables.bin with the streaming API of the other writers:
+    begin(), write_table() per table, finish(), or abort() if the run failed.
+    """
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self._file = None
+        self._toc: List[Dict[str, Any]] = []
+        self._string_ids: Dict[str, int] = {}
+        self._strings: List[bytes] = []
+
+    def begin(self):
+        self._file = open(self.output_path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, VERSION, 0))
+        self._toc = []
+        self._string_ids = {}
+        self._strings = []
+
+    def write_table(self, table: Union[ExtractedTable, Dict[str, Any]]):
+        if isinstance(table, ExtractedTable):
+            from .writers import table_to_dict
+            table = table_to_dict(table)
+        columns = list(table.get('columns') or [])
+        rows = table.get('rows') or []
+        blocks = []
+        for start in range(0, len(rows), BLOCK_ROWS):
+            chunk = rows[start:start + BLOCK_ROWS]
+            block = {'offset': self._file.tell(), 'rows': len(chunk), 'columns': []}
+            for col in columns:
+                block['columns'].append(self._write_column([row.get(col) for row in chunk]))
+            blocks.append(block)
+        self._toc.append({
+            'table_id': table.get('table_id'),
+            'sheet': table.get('sheet'),
+            'bbox': table.get('bbox'),
+            'columns': columns,
+            'meta': table.get('meta') or {},
+            'rows': len(rows),
+            'blocks': blocks,
+        })
+
+    def finish(self):
+        if self._file is None:
+            return
+        f = self._file
+        self._align()
+        strings_offset = f.tell()
+        offsets = array('Q', [0]) * (len(self._strings) + 1)
+        position = 0
+        for i, data in enumerate(self._strings):
+            position += len(data)
+            offsets[i + 1] = position
+        self._write_array(offsets)
+        for data in self._strings:
+            f.write(data)
+        toc_offset = f.tell()
+        toc = json.dumps(self._toc, ensure_ascii=False, default=str).encode('utf-8')
+        f.write(toc)
+        f.write(_TRAILER.pack(strings_offset, len(self._strings), toc_offset, len(toc), MAGIC))
+        f.close()
+        self._file = None
+
+    def abort(self):
+        """Closes and removes the partly written file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def _string_id(self, text: str) -> int:
+        sid = self._string_ids.get(text)
+        if sid is None:
+            sid = self._string_ids[text] = len(self._strings)
+            self._strings.append(text.encode('utf-8', 'surrogatepass'))
+        return sid
+
+    def _write_column(self, values: List[Any]) -> List[Optional[int]]:
+        """Writes one column of a block; returns its [kind, kinds_offset, values_offset] TOC entry."""
+        kinds = bytes(_kind(v) for v in values)
+        uniform = kinds[0] if kinds.count(kinds[0]) == len(kinds) else MIXED
+        if uniform == NONE:
+            return [NONE, None, None]
+        kinds_offset = None
+        if uniform == MIXED:
+            kinds_offset = self._file.tell()
+            self._file.write(kinds)
+        self._align()
+        values_offset = self._file.tell()
+        if uniform == FLOAT:
+            slots = array('d', values)
+        else:
+            slots = array('q', (self._slot(k, v) for k, v in zip(kinds, values)))
+        self._write_array(slots)
+        return [uniform, kinds_offset, values_offset]
+
+    def _slot(self, kind: int, value: Any) -> int:
+        if kind == STR:
+            return self._string_id(value)
+        if kind == INT or kind == BOOL:
+            return int(value)
+        if kind == NONE:
+            return 0
+        if kind == FLOAT:
+            return _INT_BITS.unpack(_FLOAT_BITS.pack(value))[0]
+        if kind == DATETIME:
+            return (value - _EPOCH) // _MICROSECOND
+        if kind == DATE:
+            return value.toordinal()
+        if kind == TIME:
+            return ((value.hour * 60 + value.minute) * 60 + value.second) * 1_000_000 + value.microsecond
+        if kind == TIMEDELTA:
+            return value // _MICROSECOND
+        # BIGINT and OTHER
+        return self._string_id(str(value))
+
+    def _write_array(self, values: array):
+        if _BIG_ENDIAN:
+            values = array(values.typecode, values)
+            values.byteswap()
+        values.tofile(self._file)
+
+    def _align(self):
+        pad = -self._file.tell() % 8
+        if pad:
+            self._file.write(bytes(pad))
+
+class BinaryTableReader:
+    """
+    Memory-mapped reader of tables.bin. Tables come back in the tables.json
+    dict form; rows are decoded only for the tables and row ranges asked for.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is not a binary tables file")
+        try:
+            magic, version, _ = _HEADER.unpack_from(self._map, 0)
+            strings_offset, string_count, toc_offset, toc_length, end_magic = _TRAILER.unpack_from(self._map, len(self._map) - _TRAILER.size)
+        except struct.error:
+            magic = end_magic = None
+        if magic != MAGIC or end_magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a complete binary tables file")
+        if version > VERSION:
+            self.close()
+            raise ValueError(f"{path} has format version {version}; this version reads up to {VERSION}")
+        self._view = memoryview(self._map)
+        self._string_offsets = self._array('Q', strings_offset, string_count + 1)
+        self._string_base = strings_offset + 8 * (string_count + 1)
+        # Decoded lazily: only the strings of the rows read are ever decoded
+        self._strings: List[Optional[str]] = [None] * string_count
+        self.toc: List[Dict[str, Any]] = json.loads(bytes(self._view[toc_offset:toc_offset + toc_length]).decode('utf-8'))
+        self._index = {entry['table_id']: i for i, entry in enumerate(self.toc)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.toc)
+
+    def __contains__(self, table_id: str) -> bool:
+        return table_id in self._index
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_tables()
+
+    def close(self):
+        if getattr(self, '_view', None) is not None:
+            self._string_offsets = None
+            self._view.release()
+            self._view = None
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def table_ids(self) -> List[str]:
+        return [entry['table_id'] for entry in self.toc]
+
+    def iter_tables(self, table_ids: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Tables in file order, or the given ids in that order, decoded one at a time."""
+        if table_ids is None:
+            for i in range(len(self.toc)):
+                yield self._table(self.toc[i], 0, None)
+        else:
+            for table_id in table_ids:
+                yield self.table(table_id)
+
+    def table(self, table_id: str, start: int = 0, stop: Optional[int] = None) -> Dict[str, Any]:
+        """
+        The table in tables.json form, with only rows [start, stop) if given.
+        meta.column_profile describes the whole table, so it is left out of a row range.
+        """
+        if table_id not in self._index:
+            raise KeyError(table_id)
+        return self._table(self.toc[self._index[table_id]], start, stop)
+
+    def column(self, table_id: str, column: str, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        """Values of one column for rows [start, stop), without building row dicts."""
+        entry = self.toc[self._index[table_id]]
+        idx = entry['columns'].index(column)
+        values = []
+        for block, lo, hi in self._blocks(entry, start, stop):
+            values.extend(self._decode(block['columns'][idx], block['rows'], lo, hi))
+        return values
+
+    def _table(self, entry: Dict[str, Any], start: int, stop: Optional[int]) -> Dict[str, Any]:
+        columns = entry['columns']
+        rows = []
+        for block, lo, hi in self._blocks(entry, start, stop):
+            if not columns:
+                # zip() of no columns yields nothing; the block still holds hi - lo rows
+                rows.extend({} for _ in range(hi - lo))
+                continue
+            values = [self._decode(c, block['rows'], lo, hi) for c in block['columns']]
+            rows.extend(dict(zip(columns, cells)) for cells in zip(*values))
+        meta = entry['meta']
+        if (start, stop) != (0, None) and 'column_profile' in meta:
+            meta = {k: v for k, v in meta.items() if k != 'column_profile'}
+        return {
+            'table_id': entry['table_id'],
+            'sheet': entry['sheet'],
+            'bbox': entry['bbox'],
+            'columns': list(columns),
+            'rows': rows,
+            'meta': meta,
+        }
+
+    @staticmethod
+    def _blocks(entry: Dict[str, Any], start: int, stop: Optional[int]):
+        """(block, lo, hi) for the blocks overlapping rows [start, stop), lo/hi relative to the block."""
+        stop = entry['rows'] if stop is None else min(stop, entry['rows'])
+        first = 0
+        for block in entry['blocks']:
+            last = first + block['rows']
+            if last > start and first < stop:
+                yield block, max(start - first, 0), min(stop, last) - first
+            first = last
+
+    def _array(self, typecode: str, offset: int, count: int):
+        view = self._view[offset:offset + 8 * count]
+        if _BIG_ENDIAN:
+            values = array(typecode, view)
+            values.byteswap()
+            return values
+        return view.cast(typecode)
+
+    def _string(self, sid: int) -> str:
+        text = self._strings[sid]
+        if text is None:
+            offsets = self._string_offsets
+            base = self._string_base
+            text = self._strings[sid] = str(self._view[base + offsets[sid]:base + offsets[sid + 1]], 'utf-8', 'surrogatepass')
+        return text
+
+    def _decode(self, column: List[Optional[int]], rows: int, lo: int, hi: int) -> List[Any]:
+        kind, kinds_offset, values_offset = column
+        if kind == NONE:
+            return [None] * (hi - lo)
+        if kind == FLOAT:
+            return list(self._array('d', values_offset, rows)[lo:hi])
+        slots = self._array('q', values_offset, rows)[lo:hi]
+        if kind != MIXED:
+            return self._convert(kind, slots)
+        # Decoded kind by kind; most mixed columns are one kind plus None
+        kinds = bytes(self._view[kinds_offset + lo:kinds_offset + hi])
+        values = [None] * (hi - lo)
+        for kind in set(kinds) - {NONE}:
+            rows_of_kind = [i for i, k in enumerate(kinds) if k == kind]
+            for i, value in zip(rows_of_kind, self._convert(kind, [slots[i] for i in rows_of_kind])):
+                values[i] = value
+        return values
+
+    def _convert(self, kind: int, slots) -> List[Any]:
+        if kind == INT:
+            return list(slots)
+        if kind == STR or kind == OTHER:
+            strings = self._strings
+            string = self._string
+            return [strings[s] or string(s) for s in slots]
+        if kind == NONE:
+            return [None] * len(slots)
+        if kind == FLOAT:
+            return [_FLOAT_BITS.unpack(_INT_BITS.pack(s))[0] for s in slots]
+        if kind == BOOL:
+            return [bool(s) for s in slots]
+        if kind == DATETIME:
+            return [_EPOCH + s * _MICROSECOND for s in slots]
+        if kind == DATE:
+            return [datetime.date.fromordinal(s) for s in slots]
+        if kind == TIME:
+            return [datetime.time(s // 3_600_000_000, s // 60_000_000 % 60, s // 1_000_000 % 60, s % 1_000_000) for s in slots]
+        if kind == TIMEDELTA:
+            return [s * _MICROSECOND for s in slots]
+        if kind == BIGINT:
+            return [int(self._string(s)) for s in slots]
+        raise ValueError(f"Unknown value kind {kind}")
@@ -1,7 +1,8 @@
-import uuid
-from typing import List, Dict, Tuple, Any, Set
-from .models import BoundingBox, TableCandidate
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Any, Set, Optional, Iterable, Generator, Callable
+from .models import BoundingBox, TableCandidate, region_id
 from .reader import StreamReader
+from .masks import iter_segments
 
 class UnionFind:
     def __init__(self):
@@ -22,23 +23,75 @@ class UnionFind:
             return True
         return False
 
+def collapse_runs(rows: Iterable[Tuple]) -> Generator[Tuple[int, int, int], None, None]:
+    """
+    Collapses iter_sheet(..., with_masks=True) rows into runs of consecutive rows
+    with the same occupancy bitmask (= the same segment layout).
+    Yields (first_row, last_row, occupancy). Rows missing from sparse input
+    are empty and come out as occupancy-0 runs.
+    """
+    run_start = run_end = None
+    run_occupancy = 0
+    for row_idx, _, (occupancy, _) in rows:
+        if run_start is not None and row_idx > run_end + 1:
+            if run_occupancy:
+                yield run_start, run_end, run_occupancy
+                run_start, run_occupancy = run_end + 1, 0
+            run_end = row_idx - 1
+        if run_start is not None and occupancy == run_occupancy and row_idx == run_end + 1:
+            run_end = row_idx
+            continue
+        if run_start is not None:
+            yield run_start, run_end, run_occupancy
+        run_start = run_end = row_idx
+        run_occupancy = occupancy
+    if run_start is not None:
+        yield run_start, run_end, run_occupancy
+
+@dataclass
+class SheetScan:
+    """
+    Connected components found in a row range, before aggregation and filtering.
+    The boundary segments let scans of adjacent row ranges be stitched together.
+    """
+    # Every created component id (in creation order) -> stats, and its root id
+    stats: Dict[Any, Dict[str, int]] = field(default_factory=dict)
+    roots: Dict[Any, Any] = field(default_factory=dict)
+    first_row: Optional[int] = None
+    last_row: Optional[int] = None
+    # (start_col, end_col, root id) of the segments of first_row / last_row
+    first_segments: List[Tuple[int, int, Any]] = field(default_factory=list)
+    last_segments: List[Tuple[int, int, Any]] = field(default_factory=list)
+
 class TableDetector:
     def __init__(self, min_rows=2, min_cols=2):
         self.min_rows = min_rows
         self.min_cols = min_cols
 
-    def detect(self, reader: StreamReader, sheet_name: str) -> List[TableCandidate]:
+    def detect(self, reader: StreamReader, sheet_name: str, min_row: int = 1, max_row: Optional[int] = None) -> List[TableCandidate]:
+        """
+        Finds table candidates in a sheet.
+        min_row/max_row restrict the scan to a row window (1-based, inclusive).
+        """
+        scan = self.scan(reader, sheet_name, min_row, max_row)
+        return self.build_candidates(sheet_name, scan.stats, scan.roots.__getitem__)
+
+    def scan(self, reader: StreamReader, sheet_name: str, min_row: int = 1, max_row: Optional[int] = None) -> SheetScan:
+        """Connected components of non-empty segments in [min_row, max_row]."""
         uf = UnionFind()
+        first_segments = None
         # active_segments: list of (start_col, end_col, component_id)
-        active_segments: List[Tuple[int, int, str]] = []
+        active_segments: List[Tuple[int, int, Any]] = []
         
         # component_stats: id -> {'min_r':, 'max_r':, 'min_c':, 'max_c':}
         # We only store stats for "root" ids ideally, or merge them later.
         # Easier to store for all created IDs, and merge at the end.
-        stats: Dict[str, Dict[str, int]] = {}
+        stats: Dict[Any, Dict[str, int]] = {}
 
         def create_component(r, c_start, c_end):
-            cid = str(uuid.uuid4())
+            # A component is named after the segment that created it, which is
+            # unique in the sheet (also across row shards) and deterministic.
+            cid = (r, c_start)
             stats[cid] = {
                 'min_r': r, 'max_r': r,
                 'min_c': c_start, 'max_c': c_end,
@@ -52,21 +105,16 @@ class TableDetector:
             s['min_c'] = min(s['min_c'], c_start)
             s['max_c'] = max(s['max_c'], c_end)
 
-        for row_idx, row_values in reader.iter_sheet(sheet_name):
+        # Segments come straight from the reader's per-row occupancy bitmask.
+        # Rows with an identical layout are collapsed into runs: only the first
+        # row of a run is matched. Each of its segments overlaps exactly its own
+        # copy in the next row, so the rest of the run can only extend the
+        # components' max_r, which is done once per run.
+        # Sparse rows: empty rows are not read into lists at all.
+        rows = reader.iter_sheet(sheet_name, min_row=min_row, max_row=max_row, string_ids=True, with_masks=True, sparse=True)
+        for row_idx, run_end, occupancy in collapse_runs(rows):
             # 1. Identify segments in current row
-            current_segments = [] # (start, end)
-            start = None
-            for col_idx, val in enumerate(row_values, start=1):
-                is_empty = val is None or (isinstance(val, str) and not val.strip())
-                if not is_empty:
-                    if start is None:
-                        start = col_idx
-                else:
-                    if start is not None:
-                        current_segments.append((start, col_idx - 1))
-                        start = None
-            if start is not None:
-                current_segments.append((start, len(row_values)))
+            current_segments = iter_segments(occupancy) # (start, end)
 
             # 2. Match with active segments
             new_active_segments = []
@@ -100,11 +148,27 @@ class TableDetector:
                     new_active_segments.append((curr_start, curr_end, root_id))
             
             active_segments = new_active_segments
+            if first_segments is None:
+                first_row, first_segments = row_idx, list(active_segments)
+            last_row = run_end
+            
+            if run_end > row_idx:
+                for _, _, cid in active_segments:
+                    stats[uf.find(cid)]['max_r'] = run_end
+
+        scan = SheetScan(stats, {cid: uf.find(cid) for cid in stats})
+        if first_segments is not None:
+            scan.first_row, scan.last_row = first_row, last_row
+            scan.first_segments = [(a, b, uf.find(cid)) for a, b, cid in first_segments]
+            scan.last_segments = [(a, b, uf.find(cid)) for a, b, cid in active_segments]
+        return scan
 
+    def build_candidates(self, sheet_name: str, stats: Dict[Any, Dict[str, int]], find: Callable[[Any], Any]) -> List[TableCandidate]:
+        """Merges component stats by root (find) and keeps components of at least min_rows x min_cols."""
         # 3. Aggregation
         final_components = {}
         for cid, s in stats.items():
-            root = uf.find(cid)
+            root = find(cid)
             if root not in final_components:
                 final_components[root] = s.copy()
             else:
@@ -117,13 +181,23 @@ class TableDetector:
 
         # 4. Filter and Create Candidates
         candidates = []
+        used_ids = set()
         for cid, s in final_components.items():
             bbox = BoundingBox(s['min_r'], s['min_c'], s['max_r'], s['max_c'])
             
             # Basic filtering
             if bbox.height >= self.min_rows and bbox.width >= self.min_cols:
+                # Ids depend only on sheet and bbox, so they are stable across runs
+                # (and independent of which component ended up as the union root).
+                candidate_id = region_id(sheet_name, bbox)
+                count = 2
+                while candidate_id in used_ids:
+                    # Two separate components with the same bbox
+                    candidate_id = f"{region_id(sheet_name, bbox)}_{count}"
+                    count += 1
+                used_ids.add(candidate_id)
                 candidates.append(TableCandidate(
-                    id=cid,
+                    id=candidate_id,
                     sheet_name=sheet_name,
                     bbox=bbox,
                     confidence=1.0,
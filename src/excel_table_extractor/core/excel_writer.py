@@ -8,48 +8,85 @@ class ExcelWriter:
     def __init__(self, output_path: str):
         self.output_path = output_path
         self.logger = logging.getLogger("excel_writer")
+        self._wb = None
+        self._ws_audit = None
+        self._ws_summary = None
 
     def write(self, tables: List[Dict[str, Any]], audit_log: List[Dict[str, Any]]):
-        wb = openpyxl.Workbook()
+        self.begin()
+        for table in tables:
+            self.write_table(table)
+        self.write_audit(audit_log)
+        self.finish()
+
+    # Streaming API: begin(), then write_table()/write_audit()/write_summary() in any order, then finish(),
+    # or abort() if the run failed.
+
+    def begin(self):
+        self._wb = openpyxl.Workbook()
+        self._ws_audit = None
+        self._ws_summary = None
+        self._table_count = 0
         
         # Remove default sheet
-        if "Sheet" in wb.sheetnames:
-            del wb["Sheet"]
-            
-        # Write tables
-        for i, table in enumerate(tables):
-            sheet_name = table.get('sheet', f"Table_{i}")
-            # Sanitize sheet name (limit 31 chars, no special chars)
-            sheet_name = self._sanitize_sheet_name(sheet_name)[:31]
-            
-            # If exists, append suffix
-            count = 1
-            original_name = sheet_name
-            while sheet_name in wb.sheetnames:
-                sheet_name = f"{original_name[:28]}_{count}"
-                count += 1
-                
-            ws = wb.create_sheet(sheet_name)
-            self._write_table_to_sheet(ws, table)
+        if "Sheet" in self._wb.sheetnames:
+            del self._wb["Sheet"]
+
+    def write_table(self, table: Dict[str, Any]):
+        wb = self._wb
+        sheet_name = table.get('sheet', f"Table_{self._table_count}")
+        self._table_count += 1
+        # Sanitize sheet name (limit 31 chars, no special chars)
+        sheet_name = self._sanitize_sheet_name(sheet_name)[:31]
+        
+        # If exists, append suffix
+        count = 1
+        original_name = sheet_name
+        while sheet_name in wb.sheetnames:
+            sheet_name = f"{original_name[:28]}_{count}"
+            count += 1
             
-        # Write Audit Log
-        if audit_log:
-            ws_audit = wb.create_sheet("Audit_Log")
+        ws = wb.create_sheet(sheet_name)
+        self._write_table_to_sheet(ws, table)
+
+    def write_audit(self, entries: List[Dict[str, Any]]):
+        if not entries:
+            return
+        if self._ws_audit is None:
+            self._ws_audit = self._wb.create_sheet("Audit_Log")
             headers = ["original_table_id", "row_index", "action", "reason", "content"]
-            ws_audit.append(headers)
-            for entry in audit_log:
-                ws_audit.append([
-                    entry.get("original_table_id"),
-                    entry.get("row_index"),
-                    entry.get("action"),
-                    entry.get("reason"),
-                    entry.get("content")
-                ])
+            self._ws_audit.append(headers)
+        for entry in entries:
+            self._ws_audit.append([
+                entry.get("original_table_id"),
+                entry.get("row_index"),
+                entry.get("action"),
+                entry.get("reason"),
+                entry.get("content")
+            ])
+
+    def write_summary(self, summary: Dict[str, Any]):
+        """Run-level AI metrics as an AI_Summary sheet of (metric, value) rows."""
+        if self._ws_summary is None:
+            self._ws_summary = self._wb.create_sheet("AI_Summary")
+        else:
+            self._ws_summary.delete_rows(1, self._ws_summary.max_row)
+        self._ws_summary.append(["metric", "value"])
+        for key, value in summary.items():
+            self._ws_summary.append([key, value])
+
+    def finish(self):
+        wb = self._wb
+        # Keep the Audit_Log and then the AI_Summary as the last sheets
+        for ws in (self._ws_audit, self._ws_summary):
+            if ws is not None:
+                wb.move_sheet(ws, offset=len(wb.sheetnames) - 1 - wb.index(ws))
                 
         # Save
         # Ensure directory exists
         os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
         wb.save(self.output_path)
+        self._wb = None
         self.logger.info(f"Saved Excel report to {self.output_path}")
 
     def _write_table_to_sheet(self, ws, table: Dict[str, Any]):
@@ -76,3 +113,9 @@ class ExcelWriter:
         for char in invalid_chars:
             name = name.replace(char, '_')
         return name
+
+    def abort(self):
+        """Discards the workbook of a failed run; nothing is saved."""
+        self._wb = None
+        self._ws_audit = None
+        self._ws_summary = None
@@ -1,12 +1,19 @@
 from typing import List, Dict, Any, Generator, Optional, Tuple
 from collections import Counter
+import hashlib
 import re
 from .models import TableCandidate, ExtractedTable, BoundingBox
 from .reader import StreamReader
+from .strings import SharedStringStore, EMPTY_STORE
+from .masks import RowMask, TEXT, row_mask, slice_mask
+from .profiles import ColumnProfiler
 
 class TableExtractor:
     def __init__(self, header_search_depth=5):
         self.header_search_depth = header_search_depth
+        # Shared-string table of the sheet being processed; cells carry StringIds
+        # until row dicts are built.
+        self._strings: SharedStringStore = EMPTY_STORE
 
     def extract_all(self, reader: StreamReader, candidates: List[TableCandidate]) -> Generator[ExtractedTable, None, None]:
         if not candidates:
@@ -26,12 +33,15 @@ class TableExtractor:
     def _process_sheet(self, reader: StreamReader, sheet_name: str, candidates: List[TableCandidate]):
         # Buffers for each candidate: id -> list of rows
         buffers: Dict[str, List[List[Any]]] = {c.id: [] for c in candidates}
+        # Matching occupancy/type masks from the reader: id -> list of RowMask
+        mask_buffers: Dict[str, List[RowMask]] = {c.id: [] for c in candidates}
         # Active set management
         # Map row_idx to candidates that start/end? 
         # Simpler: just check range for each row. 
         # Optimization: maintain active list.
         
         candidates_by_id = {c.id: c for c in candidates}
+        min_row_needed = min(c.bbox.min_row for c in candidates)
         max_row_needed = max(c.bbox.max_row for c in candidates)
         
         # We need to know which candidates are interested in current row
@@ -39,29 +49,36 @@ class TableExtractor:
         # Actually, iterating candidates for each row is fine if N is small.
         # If N is large (thousands), use interval tree. Assuming small N (<100).
         
-        for row_idx, row_values in reader.iter_sheet(sheet_name):
+        self._strings = reader.shared_strings
+        
+        # Sparse rows: each candidate's slice is built from the filled cells
+        # only. Rows are read in order, so a row missing from the sheet is an
+        # empty row of every candidate it falls in.
+        next_row = min_row_needed
+        for row_idx, cells, mask in reader.iter_sheet(sheet_name, min_row=min_row_needed, max_row=max_row_needed, string_ids=True, with_masks=True, sparse=True):
             if row_idx > max_row_needed:
                 break
+            for empty_idx in range(next_row, row_idx):
+                for c in candidates:
+                    if c.bbox.min_row <= empty_idx <= c.bbox.max_row:
+                        buffers[c.id].append([None] * c.bbox.width)
+                        mask_buffers[c.id].append((0, bytes(c.bbox.width)))
+            next_row = row_idx + 1
                 
             for c in candidates:
                 if c.bbox.min_row <= row_idx <= c.bbox.max_row:
-                    # Extract slice
-                    # row_values is 0-based list, but col indices are 1-based
-                    # Slice: min_col-1 : max_col
-                    # Ensure row has enough columns
+                    # Extract slice: cols are 1-based, the slice is 0-based
                     slice_start = c.bbox.min_col - 1
-                    slice_end = c.bbox.max_col
-                    
-                    row_len = len(row_values)
-                    if slice_start >= row_len:
-                        row_slice = [None] * c.bbox.width
-                    else:
-                        row_slice = row_values[slice_start:slice_end]
-                        # Pad if short
-                        if len(row_slice) < c.bbox.width:
-                            row_slice.extend([None] * (c.bbox.width - len(row_slice)))
+                    min_col, max_col = c.bbox.min_col, c.bbox.max_col
+                    row_slice = [None] * c.bbox.width
+                    for col, value in cells:
+                        if col > max_col:
+                            break
+                        if col >= min_col:
+                            row_slice[col - min_col] = value
                             
                     buffers[c.id].append(row_slice)
+                    mask_buffers[c.id].append(slice_mask(mask, slice_start, c.bbox.width))
 
         # Process buffers
         for c in candidates:
@@ -69,39 +86,53 @@ class TableExtractor:
             if not data_rows:
                 continue
                 
-            extracted = self._process_table_data(c, data_rows)
+            extracted = self._process_table_data(c, data_rows, mask_buffers[c.id])
             if extracted:
                 yield extracted
 
-    def _process_table_data(self, candidate: TableCandidate, raw_rows: List[List[Any]]) -> Optional[ExtractedTable]:
+    def _process_table_data(self, candidate: TableCandidate, raw_rows: List[List[Any]], raw_masks: Optional[List[RowMask]] = None) -> Optional[ExtractedTable]:
         if not raw_rows:
             return None
+        if raw_masks is None:
+            raw_masks = [row_mask(row, self._strings) for row in raw_rows]
             
         # 1. Detect Header
-        header_idx, columns = self._detect_header(raw_rows)
+        header_idx, columns = self._detect_header(raw_rows, raw_masks)
         
         # 2. Extract Data
         data_start_idx = header_idx + 1
         data_rows = raw_rows[data_start_idx:]
         
         # 2.5 Prune Empty Columns
-        columns, data_rows = self._prune_empty_columns(columns, data_rows)
-        
-        # 3. Build Row Dicts
+        columns, data_rows = self._prune_empty_columns(columns, data_rows, raw_masks[data_start_idx:])
+        
+        # 3. Build Row Dicts (shared strings are materialized here)
+        text = self._strings.text
+        # Content hash over the columns and the materialized values
+        digest = hashlib.sha256(repr(columns).encode('utf-8'))
+        # Column profiles for the AI stage, fed in the same pass
+        profiler = ColumnProfiler(len(columns))
         structured_rows = []
         for row in data_rows:
             row_dict = {}
             for i, col_name in enumerate(columns):
                 val = row[i] if i < len(row) else None
-                row_dict[col_name] = val
+                row_dict[col_name] = text(val)
+            digest.update(repr(tuple(row_dict.values())).encode('utf-8'))
+            profiler.add_values(row, self._strings)
             structured_rows.append(row_dict)
+        content_hash = digest.hexdigest()
             
         # 4. Meta
         meta = candidate.meta.copy()
         meta['header_row_relative_index'] = header_idx
+        meta['content_hash'] = content_hash
+        meta['column_profile'] = profiler.to_dict()
         
         return ExtractedTable(
-            table_id=candidate.id,
+            # Region (sheet + bbox) plus content: the same table gets the same id on
+            # every run, and the id changes when its content does.
+            table_id=f"{candidate.id}-{content_hash[:8]}",
             sheet_name=candidate.sheet_name,
             bbox=candidate.bbox,
             columns=columns,
@@ -109,19 +140,16 @@ class TableExtractor:
             meta=meta
         )
 
-    def _prune_empty_columns(self, columns: List[str], data_rows: List[List[Any]]) -> Tuple[List[str], List[List[Any]]]:
+    def _prune_empty_columns(self, columns: List[str], data_rows: List[List[Any]], data_masks: List[RowMask]) -> Tuple[List[str], List[List[Any]]]:
         if not columns or not data_rows:
             return columns, data_rows
             
         num_cols = len(columns)
-        # Check each column for non-empty values
-        is_empty_col = [True] * num_cols
-        
-        for row in data_rows:
-            for i in range(min(len(row), num_cols)):
-                val = row[i]
-                if val is not None and str(val).strip():
-                    is_empty_col[i] = False
+        # Check each column for non-empty values: OR of the row occupancy masks
+        column_occupancy = 0
+        for occupancy, _ in data_masks:
+            column_occupancy |= occupancy
+        is_empty_col = [not (column_occupancy >> i) & 1 for i in range(num_cols)]
         
         # Keep columns that are not empty OR have a meaningful name (not Column_X)
         # User request: "不用再column代替了，没有就是没有" -> Delete Column_X if empty.
@@ -158,7 +186,7 @@ class TableExtractor:
             
         return new_columns, new_data_rows
 
-    def _detect_header(self, rows: List[List[Any]]) -> Tuple[int, List[str]]:
+    def _detect_header(self, rows: List[List[Any]], masks: List[RowMask]) -> Tuple[int, List[str]]:
         """
         Returns (header_row_index, list_of_column_names)
         header_row_index is relative to the start of rows.
@@ -170,7 +198,7 @@ class TableExtractor:
         
         for i in range(limit):
             row = rows[i]
-            score = self._score_header(row)
+            score = self._score_header(row, masks[i])
             if score > best_score:
                 best_score = score
                 best_idx = i
@@ -180,20 +208,16 @@ class TableExtractor:
         columns = self._normalize_columns(raw_header)
         return best_idx, columns
 
-    def _score_header(self, row: List[Any]) -> float:
+    def _score_header(self, row: List[Any], mask: RowMask) -> float:
         if not row:
             return 0.0
         
-        non_empty = 0
-        strings = 0
-        unique_vals = set()
-        
-        for cell in row:
-            if cell is not None and str(cell).strip():
-                non_empty += 1
-                if isinstance(cell, str):
-                    strings += 1
-                unique_vals.add(str(cell).strip())
+        occupancy, types = mask
+        non_empty = occupancy.bit_count()
+        strings = types.count(TEXT)
+        # Integer key for shared strings, stripped text otherwise
+        key = self._strings.key
+        unique_vals = {key(cell) for i, cell in enumerate(row) if (occupancy >> i) & 1}
                 
         if not non_empty:
             return 0.0
@@ -209,12 +233,13 @@ class TableExtractor:
     def _normalize_columns(self, row: List[Any]) -> List[str]:
         cols = []
         seen = Counter()
+        store = self._strings
         
         for i, val in enumerate(row):
-            if val is None or (isinstance(val, str) and not val.strip()):
+            if store.is_blank(val):
                 col_name = f"Column_{i+1}"
             else:
-                col_name = str(val).strip()
+                col_name = store.stripped_text(val)
                 
             # Deduplicate
             if seen[col_name] > 0:
@@ -0,0 +1,219 @@
+"""
+Workbook inspection without loading it.
+
+Only zip metadata and small XML headers are read: the sheet list and
+visibility from xl/workbook.xml, each sheet's <dimension>, the <sst> counts
+of the shared-string table, and the compressed/uncompressed part sizes.
+Merge counts need the end of each sheet part, so that part is inflated and
+byte-scanned for <mergeCells>; nothing is parsed as XML.
+
+From these, estimate_costs() predicts extraction time, peak memory and LLM
+token usage. The constants below were calibrated on one core against the
+extract pipeline and AIProcessor prompts; treat the results as sizing
+guidance, not guarantees.
+"""
+import math
+import os
+import re
+import zipfile
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional, Tuple
+from openpyxl.utils.cell import range_boundaries
+from ..utils.xlsx_utils import XlsxMergeParser
+from .sharding import MIN_SHARD_ROWS, plan_shards
+
+# Worksheet XML parsed per second by detection + extraction in one process
+PARSE_BYTES_PER_SECOND = 1_000_000
+# Interpreter + openpyxl resident memory, and memory per byte of the largest
+# sheet's XML (its biggest table is materialized) and of the shared strings
+MEMORY_BASE_MB = 30
+MEMORY_PER_SHEET_BYTE = 14
+MEMORY_PER_SST_BYTE = 3
+# Without shared strings, values are inline: this share of the sheet XML is text
+INLINE_VALUE_SHARE = 0.17
+# Markup bytes of a shared-string cell (<c r="B12" t="s"><v>12</v></c>) and of an <si> entry
+CELL_MARKUP_BYTES = 30
+SST_ENTRY_MARKUP_BYTES = 16
+# Row lines sent to the LLM: row id, tabs and newline, then the cell text,
+# each cell capped at AIProcessor.CELL_CHARS
+ROW_PREFIX_BYTES = 16
+CELL_VALUE_LIMIT = 60
+# Rows per request (AIProcessor.CHUNK_SIZE) and prompt tokens around them
+# (the system prompt, the column header and the occasional Data Profile)
+ROWS_PER_REQUEST = 100
+PROMPT_OVERHEAD_TOKENS = 940
+# Output tokens per request and per row that gets an action (~3% of rows)
+OUTPUT_TOKENS_PER_REQUEST = 20
+OUTPUT_TOKENS_PER_ACTION = 25
+ACTION_ROW_SHARE = 0.03
+
+HEADER_LIMIT = 1 << 20
+_DIMENSION = re.compile(rb'<(?:\w+:)?dimension\s[^>]*?ref\s*=\s*["\']([^"\']+)["\']')
+_SHEET_DATA = re.compile(rb'<(?:\w+:)?sheetData\b')
+_MERGE_CELLS = re.compile(rb'<(?:\w+:)?mergeCells\b([^>]*)>')
+_MERGE_CELL = re.compile(rb'<(?:\w+:)?mergeCell\s')
+_COUNT_ATTR = re.compile(rb'\bcount\s*=\s*["\'](\d+)["\']')
+_SST = re.compile(rb'<(?:\w+:)?sst\b([^>]*)>')
+_UNIQUE_COUNT_ATTR = re.compile(rb'\buniqueCount\s*=\s*["\'](\d+)["\']')
+
+@dataclass
+class SheetProfile:
+    name: str
+    state: str
+    part: str
+    compressed_bytes: int = 0
+    xml_bytes: int = 0
+    dimension: Optional[str] = None
+    rows: int = 0
+    columns: int = 0
+    merged_ranges: Optional[int] = None
+
+@dataclass
+class WorkbookProfile:
+    file_path: str
+    file_bytes: int
+    sheets: List[SheetProfile] = field(default_factory=list)
+    shared_strings: int = 0
+    unique_shared_strings: int = 0
+    shared_strings_bytes: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def _read_header(z: zipfile.ZipFile, part: str, scan_merges: bool) -> Tuple[Optional[str], Optional[int]]:
+    """(<dimension> ref, merged range count or None) of a worksheet part."""
+    dimension = None
+    merges = None
+    with z.open(part) as f:
+        head = b''
+        while len(head) < HEADER_LIMIT:
+            chunk = f.read(1 << 16)
+            if not chunk:
+                break
+            head += chunk
+            if _SHEET_DATA.search(head):
+                break
+        m = _DIMENSION.search(head)
+        if m:
+            dimension = m.group(1).decode('ascii', 'replace')
+        if not scan_merges:
+            return dimension, None
+
+        # <mergeCells> follows <sheetData>: inflate the rest and scan bytes only
+        merges = 0
+        tail = head
+        counting = False
+        while True:
+            if not counting:
+                m = _MERGE_CELLS.search(tail)
+                if m:
+                    count = _COUNT_ATTR.search(m.group(1))
+                    if count:
+                        return dimension, int(count.group(1))
+                    counting = True
+                    tail = tail[m.end():]
+            if counting:
+                # No count attribute: count the <mergeCell> elements
+                cut = max(0, len(tail) - 16)
+                merges += len(_MERGE_CELL.findall(tail, 0, cut))
+                tail = tail[cut:]
+            else:
+                tail = tail[-64:]
+            chunk = f.read(1 << 20)
+            if not chunk:
+                if counting:
+                    merges += len(_MERGE_CELL.findall(tail))
+                return dimension, merges
+            tail += chunk
+
+def _read_sst_header(z: zipfile.ZipFile, part: str) -> Tuple[int, int]:
+    with z.open(part) as f:
+        head = f.read(4096)
+    m = _SST.search(head)
+    if not m:
+        return 0, 0
+    count = _COUNT_ATTR.search(m.group(1))
+    unique = _UNIQUE_COUNT_ATTR.search(m.group(1))
+    unique_count = int(unique.group(1)) if unique else 0
+    return int(count.group(1)) if count else unique_count, unique_count
+
+def inspect_workbook(file_path: str, sheet_names: Optional[List[str]] = None, scan_merges: bool = True) -> WorkbookProfile:
+    """Profile of the workbook (or the given sheets) from zip metadata and XML headers."""
+    parser = XlsxMergeParser(file_path)
+    profile = WorkbookProfile(file_path, os.path.getsize(file_path))
+    with zipfile.ZipFile(file_path, 'r') as z:
+        infos = {info.filename: info for info in z.infolist()}
+        for name, part in parser.sheet_paths(z).items():
+            if sheet_names is not None and name not in sheet_names:
+                continue
+            sheet = SheetProfile(name, parser.sheet_states.get(name, 'visible'), part)
+            info = infos.get(part)
+            if info is not None:
+                sheet.compressed_bytes = info.compress_size
+                sheet.xml_bytes = info.file_size
+                sheet.dimension, sheet.merged_ranges = _read_header(z, part, scan_merges)
+            if sheet.dimension:
+                try:
+                    min_col, min_row, max_col, max_row = range_boundaries(sheet.dimension)
+                    sheet.rows = max_row - min_row + 1
+                    sheet.columns = max_col - min_col + 1
+                except (ValueError, TypeError):
+                    pass
+            profile.sheets.append(sheet)
+
+        sst = infos.get('xl/sharedStrings.xml')
+        if sst is not None:
+            profile.shared_strings_bytes = sst.file_size
+            profile.shared_strings, profile.unique_shared_strings = _read_sst_header(z, sst.filename)
+    return profile
+
+def estimate_costs(profile: WorkbookProfile, price_in: float = 0.0, price_out: float = 0.0, cpus: int = 1) -> Dict[str, Any]:
+    """
+    Estimated extraction time, peak memory, LLM tokens and cost (prices in
+    currency per 1M tokens), plus a suggested --jobs value per sheet.
+    """
+    avg_string = None
+    if profile.unique_shared_strings:
+        avg_string = max(1.0, profile.shared_strings_bytes / profile.unique_shared_strings - SST_ENTRY_MARKUP_BYTES)
+
+    sheets = []
+    input_tokens = output_tokens = requests = 0
+    total_seconds = 0.0
+    for sheet in profile.sheets:
+        rows = sheet.rows
+        if rows <= 1 and sheet.xml_bytes > HEADER_LIMIT:
+            # Missing or stale <dimension>: assume ~150 bytes of XML per row
+            rows = sheet.xml_bytes // 150
+        bytes_per_row = sheet.xml_bytes / rows if rows else 0
+        if avg_string is None:
+            value_bytes = bytes_per_row * INLINE_VALUE_SHARE
+        else:
+            value_bytes = bytes_per_row / CELL_MARKUP_BYTES * (avg_string + 3)
+        row_tokens = (ROW_PREFIX_BYTES + min(value_bytes, max(1, sheet.columns) * CELL_VALUE_LIMIT)) / 3 + 1
+        sheet_requests = math.ceil(rows / ROWS_PER_REQUEST)
+        requests += sheet_requests
+        input_tokens += int(rows * row_tokens) + sheet_requests * PROMPT_OVERHEAD_TOKENS
+        output_tokens += int(sheet_requests * OUTPUT_TOKENS_PER_REQUEST + rows * ACTION_ROW_SHARE * OUTPUT_TOKENS_PER_ACTION)
+
+        seconds = sheet.xml_bytes / PARSE_BYTES_PER_SECOND
+        jobs = len(plan_shards(1, rows, max(1, cpus))) if rows else 1
+        total_seconds += seconds / jobs
+        sheets.append({
+            'name': sheet.name,
+            'rows': rows,
+            'extract_seconds': round(seconds, 1),
+            'suggested_jobs': jobs,
+            'shard': rows >= 2 * MIN_SHARD_ROWS,
+        })
+
+    largest = max((s.xml_bytes for s in profile.sheets), default=0)
+    memory_mb = MEMORY_BASE_MB + (largest * MEMORY_PER_SHEET_BYTE + profile.shared_strings_bytes * MEMORY_PER_SST_BYTE) / (1 << 20)
+    return {
+        'sheets': sheets,
+        'extract_seconds': round(total_seconds, 1),
+        'peak_memory_mb': round(memory_mb),
+        'llm_requests': requests,
+        'llm_input_tokens': input_tokens,
+        'llm_output_tokens': output_tokens,
+        'llm_cost': round(input_tokens / 1e6 * price_in + output_tokens / 1e6 * price_out, 4),
+    }
@@ -0,0 +1,90 @@
+import datetime
+from typing import Iterable, List, Any, Tuple, Optional
+from .strings import StringId, SharedStringStore
+
+# Per-cell type codes stored in RowMask.types (one byte per cell)
+EMPTY = 0
+TEXT = 1
+NUMBER = 2
+BOOL = 3
+DATE = 4
+OTHER = 5
+
+# (occupancy, types): bit i of occupancy is set when cell i is non-empty,
+# types[i] is the type code of cell i.
+RowMask = Tuple[int, bytes]
+
+# A row as (col, value) pairs of its non-empty cells, col 1-based and ascending
+SparseRow = List[Tuple[int, Any]]
+
+def row_mask(row: List[Any], store: Optional[SharedStringStore] = None) -> RowMask:
+    """
+    Computes the occupancy bitmask and type codes of a row.
+    A cell is empty if it is None or a string that strips to ''.
+    """
+    return sparse_row_mask(enumerate(row, 1), store, len(row))
+
+def sparse_row_mask(cells: Iterable[Tuple[int, Any]], store: Optional[SharedStringStore] = None, width: Optional[int] = None) -> RowMask:
+    """
+    row_mask() of a row given as ascending (col, value) pairs; types covers
+    `width` cells (default: up to the last pair).
+    """
+    if width is None:
+        width = cells[-1][0] if cells else 0
+    blank = store.blank if store is not None else None
+    occupancy = 0
+    types = bytearray(width)
+    for col, v in cells:
+        if v is None:
+            continue
+        i = col - 1
+        t = type(v)
+        if t is StringId:
+            if blank[v]:
+                continue
+            code = TEXT
+        elif t is str:
+            if not v.strip():
+                continue
+            code = TEXT
+        elif t is bool:
+            code = BOOL
+        elif t is int or t is float:
+            code = NUMBER
+        elif isinstance(v, str):
+            if not v.strip():
+                continue
+            code = TEXT
+        elif isinstance(v, (datetime.date, datetime.time, datetime.timedelta)):
+            code = DATE
+        elif isinstance(v, (int, float)):
+            code = NUMBER
+        else:
+            code = OTHER
+        occupancy |= 1 << i
+        types[i] = code
+    return occupancy, bytes(types)
+
+def slice_mask(mask: RowMask, start: int, width: int) -> RowMask:
+    """Mask of cells [start, start + width) (0-based), padded with empties."""
+    occupancy, types = mask
+    sliced = types[start:start + width]
+    if len(sliced) < width:
+        sliced += bytes(width - len(sliced))
+    return (occupancy >> start) & ((1 << width) - 1), sliced
+
+def iter_segments(occupancy: int) -> List[Tuple[int, int]]:
+    """Contiguous runs of set bits as 1-based inclusive (start, end) columns."""
+    segments = []
+    offset = 0
+    while occupancy:
+        # Skip the empty cells before the next run
+        skip = (occupancy & -occupancy).bit_length() - 1
+        occupancy >>= skip
+        offset += skip
+        # Length of the run of set bits = number of trailing ones
+        run = ((occupancy + 1) & ~occupancy).bit_length() - 1
+        segments.append((offset + 1, offset + run))
+        occupancy >>= run
+        offset += run
+    return segments
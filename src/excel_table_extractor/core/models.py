@@ -1,3 +1,4 @@
+import hashlib
 from dataclasses import dataclass, field
 from typing import List, Optional, Any, Dict
 
@@ -36,3 +37,8 @@ class ExtractedTable:
     columns: List[str]
     rows: List[Dict[str, Any]]
     meta: Dict[str, Any] = field(default_factory=dict)
+
+def region_id(sheet_name: str, bbox: BoundingBox) -> str:
+    """Deterministic id of a sheet region: the same sheet and bbox give the same id on every run."""
+    key = f"{sheet_name}\0{bbox.min_row}\0{bbox.min_col}\0{bbox.max_row}\0{bbox.max_col}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,170 @@
+"""
+Column profiles built in one pass with bounded memory: per column, the number
+of filled cells, the number of distinct values and the most common values.
+
+A column keeps exact value counts until it has seen EXACT_DISTINCT distinct
+values. Past that, the distinct count is estimated with a HyperLogLog and the
+most common values are tracked with a Misra-Gries heavy-hitters summary of
+HEAVY_HITTERS counters, so memory stays fixed however many rows the table has.
+Values are folded into the sketches in batches of SKETCH_BATCH, so each
+distinct value of a batch is hashed once.
+Most tables never leave the exact mode, and their profiles are identical to
+full value counts.
+
+Values are the stripped text of non-empty cells, as AIProcessor sees them.
+"""
+import hashlib
+import heapq
+import math
+from collections import Counter
+from typing import List, Dict, Any, Optional, Sequence, Iterable
+from .strings import StringId, SharedStringStore
+
+# Distinct values counted exactly before a column switches to sketches
+EXACT_DISTINCT = 1024
+# HyperLogLog registers: 2**12 = 4 KB per column, ~1.6% standard error
+HLL_PRECISION = 12
+# Counters kept by the heavy-hitters summary, and values reported per column
+HEAVY_HITTERS = 64
+TOP_VALUES = 3
+# Values buffered per column before they are folded into the sketches
+SKETCH_BATCH = 4096
+
+class HyperLogLog:
+    """Distinct-count estimator over strings, with a fixed 64-bit hash so estimates are reproducible."""
+    __slots__ = ('p', 'registers')
+
+    def __init__(self, p: int = HLL_PRECISION):
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+    def update(self, values: Iterable[str]):
+        registers = self.registers
+        bits = 64 - self.p
+        low = (1 << bits) - 1
+        blake2b = hashlib.blake2b
+        for value in values:
+            x = int.from_bytes(blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+            # Register from the top p bits, rank = position of the first set bit in the rest
+            idx = x >> bits
+            rank = bits - (x & low).bit_length() + 1
+            if rank > registers[idx]:
+                registers[idx] = rank
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+class ColumnSketch:
+    """Filled count, distinct count and heavy hitters of one column."""
+    __slots__ = ('filled', 'counts', 'hll', 'pending', 'floor')
+
+    def __init__(self):
+        self.filled = 0
+        # Exact counts, or the heavy-hitters counters once hll is set
+        self.counts: Dict[str, int] = {}
+        self.hll: Optional[HyperLogLog] = None
+        # Values not yet folded into the sketches
+        self.pending: List[str] = []
+        # Most common values when the sketches started, with their exact counts
+        # then: lower bounds that still give samples when the heavy hitters
+        # cancel out, as in a column of unique ids
+        self.floor: List[List[Any]] = []
+
+    def add(self, value: str):
+        self.filled += 1
+        if self.hll is not None:
+            self.pending.append(value)
+            if len(self.pending) >= SKETCH_BATCH:
+                self._flush()
+            return
+        counts = self.counts
+        counts[value] = counts.get(value, 0) + 1
+        if len(counts) > EXACT_DISTINCT:
+            self.hll = HyperLogLog()
+            self.hll.update(counts)
+            self.floor = self._most_common(TOP_VALUES)
+            self._shrink()
+
+    def _flush(self):
+        """Folds the pending values into the sketches, hashing each distinct value once."""
+        batch = Counter(self.pending)
+        self.pending = []
+        self.hll.update(batch)
+        counts = self.counts
+        for value, count in batch.items():
+            counts[value] = counts.get(value, 0) + count
+        self._shrink()
+
+    def _shrink(self):
+        # Misra-Gries merge: every counter loses the (HEAVY_HITTERS + 1)-th
+        # largest count and those left at zero are dropped, which undercounts
+        # any value by at most filled / (HEAVY_HITTERS + 1).
+        counts = self.counts
+        if len(counts) > HEAVY_HITTERS:
+            cut = heapq.nlargest(HEAVY_HITTERS + 1, counts.values())[-1]
+            self.counts = {k: c - cut for k, c in counts.items() if c > cut}
+
+    def _most_common(self, n: int) -> List[List[Any]]:
+        # Same order as Counter.most_common: by count, ties in first-seen order
+        return [[k, c] for k, c in sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:n]]
+
+    def summary(self) -> Dict[str, Any]:
+        """filled, distinct, exact (False when distinct and top counts are estimates), top [[value, count], ...]."""
+        exact = self.hll is None
+        if self.pending:
+            self._flush()
+        top = self._most_common(TOP_VALUES)
+        if len(top) < TOP_VALUES:
+            seen = {k for k, _ in top}
+            top += [[k, c] for k, c in self.floor if k not in seen][:TOP_VALUES - len(top)]
+            top.sort(key=lambda kv: kv[1], reverse=True)
+        return {
+            'filled': self.filled,
+            'distinct': len(self.counts) if exact else self.hll.estimate(),
+            'exact': exact,
+            'top': top,
+        }
+
+class ColumnProfiler:
+    """
+    Profiles of a table's columns, fed one row at a time. add() takes
+    normalized cells (stripped text or None); add_values() takes raw cell
+    values, StringIds included, and normalizes them the same way.
+    """
+    def __init__(self, width: int):
+        self.rows = 0
+        self.columns = [ColumnSketch() for _ in range(width)]
+
+    def add(self, cells: Sequence[Optional[str]]):
+        self.rows += 1
+        for sketch, v in zip(self.columns, cells):
+            if v is not None:
+                sketch.add(v)
+
+    def add_values(self, values: Sequence[Any], store: Optional[SharedStringStore] = None):
+        self.rows += 1
+        for sketch, v in zip(self.columns, values):
+            if v is None:
+                continue
+            if type(v) is StringId:
+                if store.blank[v]:
+                    continue
+                v = store.stripped[v]
+            elif isinstance(v, str):
+                v = v.strip()
+                if not v:
+                    continue
+            else:
+                v = str(v).strip()
+            sketch.add(v)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """{'rows': n, 'columns': [ColumnSketch.summary(), ...]}, in column order; JSON-serializable."""
+        return {'rows': self.rows, 'columns': [c.summary() for c in self.columns]}
@@ -1,150 +1,296 @@
-import openpyxl
-from typing import Generator, List, Any, Dict, Tuple, Optional
-from ..utils.xlsx_utils import get_merged_cells
+import queue
+import threading
+from typing import Generator, Iterator, List, Any, Dict, Tuple, Optional
+# StreamReader parses sheet XML itself with openpyxl's internal row parser,
+# which is not public API: ExcelReader's archive/parser/shared_strings,
+# WorkSheetParser and the workbook's _date_formats/_timedelta_formats.
+# These are only used in StreamReader._load_workbook and _sheet_parser, and
+# pyproject.toml pins openpyxl to the 3.1 series they were written against.
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.worksheet._reader import WorkSheetParser
+from ..utils.xlsx_utils import get_merged_cells, RowSkippingSource
+from .strings import SharedStringStore
+from .masks import SparseRow, sparse_row_mask
+
+# End-of-sheet marker on the prefetch queue
+_END = object()
 
 class StreamReader:
-    def __init__(self, file_path: str):
+    # Rows per batch handed from the prefetch thread to the consumer
+    BATCH_SIZE = 1024
+
+    def __init__(self, file_path: str, sheet_names: Optional[List[str]] = None, prefetch: int = 0, batch_size: int = BATCH_SIZE):
         self.file_path = file_path
+        # Restricts merged-cell parsing to these sheets (None = all sheets)
+        self.sheet_names = sheet_names
+        # With prefetch > 0, iter_sheet reads, inflates and parses rows on a
+        # background thread, at most `prefetch` batches of `batch_size` rows ahead
+        # of the consumer, so I/O and decompression overlap with processing.
+        self.prefetch = prefetch
+        self.batch_size = max(1, batch_size)
         self._merged_cells_cache = None
+        self._shared_strings = None
         self._wb = None
+        # From the openpyxl reader that loaded _wb: the open archive, each
+        # sheet's XML part and the parsed xl/sharedStrings.xml
+        self._archive = None
+        self._sheet_parts: Dict[str, str] = {}
+        self._sst: List[str] = []
 
     @property
     def merged_cells(self) -> Dict[str, List[Tuple[int, int, int, int]]]:
         if self._merged_cells_cache is None:
-            self._merged_cells_cache = get_merged_cells(self.file_path)
+            self._merged_cells_cache = get_merged_cells(self.file_path, self.sheet_names)
         return self._merged_cells_cache
 
-    def iter_sheet(self, sheet_name: str) -> Generator[Tuple[int, List[Any]], None, None]:
+    @property
+    def shared_strings(self) -> SharedStringStore:
+        """The workbook's shared-string table with precomputed stripped/blank flags."""
+        if self._shared_strings is None:
+            self._load_workbook()
+            self._shared_strings = SharedStringStore(self._sst)
+        return self._shared_strings
+
+    def _load_workbook(self):
+        if not self._wb:
+            # What openpyxl.load_workbook does, keeping the reader for the
+            # parts iter_sheet parses itself
+            reader = ExcelReader(self.file_path, read_only=True, data_only=True)
+            reader.read()
+            self._wb = reader.wb
+            self._archive = reader.archive
+            self._sheet_parts = {sheet.name: rel.target for sheet, rel in reader.parser.find_sheets()}
+            self._sst = reader.shared_strings
+
+    def iter_sheet(self, sheet_name: str, min_row: int = 1, max_row: Optional[int] = None, string_ids: bool = False, with_masks: bool = False, sparse: bool = False) -> Generator[Tuple, None, None]:
         """
         Yields (row_idx, row_values) with merged cells filled.
         row_idx is 1-based.
+        Only rows in [min_row, max_row] are yielded; reading stops after max_row.
+        Rows are trimmed after their last value and capped at the sheet's
+        <dimension>, so a stray far-right cell does not widen every row.
+        With sparse=True, row_values is the list of (col, value) pairs of the
+        row's non-empty cells (col 1-based, ascending) and rows without any
+        value are not yielded, so the cost follows the number of filled cells
+        rather than the sheet's width and height.
+        With string_ids=True, shared-string cells are yielded as StringId
+        references into self.shared_strings instead of str objects.
+        With with_masks=True, yields (row_idx, row_values, mask) where mask is
+        the (occupancy bitmask, type codes) pair from core.masks, computed once
+        on the filled row.
+        """
+        rows = self._iter_rows(sheet_name, min_row, max_row, string_ids, with_masks, sparse)
+        if self.prefetch > 0:
+            # Everything lazily loaded is loaded here, before the producer starts,
+            # so the two threads never race to build it.
+            self._load_workbook()
+            if string_ids:
+                self.shared_strings
+            self.merged_cells
+            rows = self._prefetched(rows)
+        yield from rows
+
+    def _iter_rows(self, sheet_name: str, min_row: int, max_row: Optional[int], string_ids: bool, with_masks: bool, sparse: bool) -> Generator[Tuple, None, None]:
+        next_row = min_row
+        for row_idx, cells in self._iter_cells(sheet_name, min_row, max_row, string_ids):
+            if sparse:
+                row_values = cells
+            else:
+                # Rows missing from the sheet are yielded empty
+                for empty_idx in range(next_row, row_idx):
+                    yield (empty_idx, [], (0, b'')) if with_masks else (empty_idx, [])
+                next_row = row_idx + 1
+                row_values = [None] * cells[-1][0]
+                for col, value in cells:
+                    row_values[col - 1] = value
+            if with_masks:
+                store = self._shared_strings if string_ids else None
+                yield row_idx, row_values, sparse_row_mask(cells, store)
+            else:
+                yield row_idx, row_values
+
+    def _prefetched(self, rows: Iterator[Tuple]) -> Generator[Tuple, None, None]:
+        """
+        Runs `rows` on a producer thread that fills a bounded queue with batches.
+        Producer errors are re-raised in the consumer. If the consumer stops early,
+        the producer is stopped and joined before this generator returns, so the
+        workbook is never used by two threads at once.
+        """
+        batches: "queue.Queue[Any]" = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                batch = []
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= self.batch_size:
+                        if not put(batch):
+                            return
+                        batch = []
+                if batch and not put(batch):
+                    return
+                put(_END)
+            except BaseException as e:
+                put(e)
+            finally:
+                rows.close()
+
+        producer = threading.Thread(target=produce, name="reader-prefetch", daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield from item
+        finally:
+            stop.set()
+            producer.join()
+
+    def _iter_cells(self, sheet_name: str, min_row: int, max_row: Optional[int], string_ids: bool) -> Generator[Tuple[int, SparseRow], None, None]:
+        """
+        Yields (row_idx, cells) for the rows of [min_row, max_row] that have at
+        least one value after merge filling, where cells are the row's
+        (col, value) pairs in column order. Rows and columns beyond the sheet's
+        <dimension> are dropped, as openpyxl does for dense rows.
         """
         # Ensure workbook is loaded
-        if not self._wb:
-            self._wb = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        self._load_workbook()
         
         if sheet_name not in self._wb.sheetnames:
             raise ValueError(f"Sheet {sheet_name} not found")
             
         ws = self._wb[sheet_name]
+        # The worksheet parser resolves t="s" cells by indexing this list
+        if string_ids:
+            shared_strings = self.shared_strings.refs
+        elif self._shared_strings is not None:
+            shared_strings = self._shared_strings.values
+        else:
+            shared_strings = self._sst
         
         # Get merged ranges for this sheet
-        sheet_ranges = self.merged_cells.get(sheet_name, [])
-        
         # Optimization: Sort ranges by min_row
         # Range format: (min_col, min_row, max_col, max_row)
-        sheet_ranges.sort(key=lambda x: x[1])
+        # Sorted into a new list: the cached map may be shared between readers.
+        sheet_ranges = sorted(self.merged_cells.get(sheet_name, []), key=lambda x: x[1])
         
-        # Active ranges: ranges that span across the current row
-        # We need to store the value of the top-left cell for each active range
-        # Key: range_tuple, Value: cell_value
-        active_values: Dict[Tuple[int, int, int, int], Any] = {}
+        # Ranges that start above the window but reach into it need their
+        # top-left value, so start reading at the earliest such row.
+        read_start = min_row
+        for rng in sheet_ranges:
+            if rng[1] < min_row <= rng[3]:
+                read_start = min(read_start, rng[1])
         
+
+        # Widths and heights are capped by the <dimension> ref when there is one
+        max_col = ws.max_column
+        limit = max_row if max_row is not None else ws.max_row
+        if max_row is not None and ws.max_row is not None:
+            limit = min(max_row, ws.max_row)
+
+        # Active ranges: ranges that span across the current row, with the
+        # value of their top-left cell
+        active: List[Tuple[int, int, int, int]] = []
+        active_values: Dict[Tuple[int, int, int, int], Any] = {}
         # Pointer to the next range to consider from the sorted list
         next_range_idx = 0
         total_ranges = len(sheet_ranges)
-        
-        # Helper to find if a cell is in an active range
-        def get_enclosing_range(r, c, active_ranges):
-            for rng in active_ranges:
-                min_c, min_r, max_c, max_r = rng
-                if min_r <= r <= max_r and min_c <= c <= max_c:
-                    return rng
-            return None
-
-        for row in ws.iter_rows(values_only=True):
-            # openpyxl iter_rows(values_only=True) yields a tuple of values
-            # But we don't get the row index easily if there are gaps? 
-            # Actually read_only iter_rows yields rows sequentially.
-            # We need to track row index manually or use enumerate.
-            pass
-        
-        # Re-implementing loop to get row index correctly
-        # In read_only, ws.iter_rows() yields Row objects or values.
-        # If we use values_only=False, we get Cell objects which have .row attribute.
-        # But values_only=True is faster. 
-        # However, empty rows might be skipped or return None?
-        # Let's use enumerate(ws.iter_rows(values_only=True), start=1) assuming standard behavior.
-        # Note: openpyxl read_only might skip empty rows at the start but usually yields None for empty cells.
-        
-        current_row_idx = 0
-        
-        # Active ranges for the current row
-        current_active_ranges = []
-        
-        for row_cells in ws.iter_rows(values_only=True):
-            current_row_idx += 1
-            
-            # Update active ranges
+
+        def fill(row_idx: int, values: Dict[int, Any]) -> SparseRow:
+            nonlocal active, next_range_idx
             # 1. Remove ranges that ended before this row
-            current_active_ranges = [
-                rng for rng in current_active_ranges 
-                if rng[3] >= current_row_idx # max_row >= current
-            ]
-            
-            # 2. Add new ranges starting at this row
-            while next_range_idx < total_ranges:
+            if active:
+                active = [rng for rng in active if rng[3] >= row_idx]
+            # 2. Add new ranges starting at this row (ranges that started
+            # above read_start never reach the window)
+            while next_range_idx < total_ranges and sheet_ranges[next_range_idx][1] <= row_idx:
                 rng = sheet_ranges[next_range_idx]
-                min_col, min_row, max_col, max_row = rng
-                
-                if min_row == current_row_idx:
-                    current_active_ranges.append(rng)
-                    next_range_idx += 1
-                elif min_row < current_row_idx:
-                    # Should not happen if sorted, unless ranges overlap weirdly or we missed some logic
-                    next_range_idx += 1
-                else:
-                    # min_row > current_row_idx, stop adding
-                    break
-            
-            if not current_active_ranges:
-                yield current_row_idx, list(row_cells)
-                continue
-
-            # Process cells in this row
-            new_row_values = []
-            for col_idx, value in enumerate(row_cells, start=1):
-                # Check if this cell belongs to any active range
-                enclosing_range = None
-                
-                # fast check: is col_idx within any active range's col bounds?
-                for rng in current_active_ranges:
-                    if rng[0] <= col_idx <= rng[2]:
-                        enclosing_range = rng
-                        break
-                
-                if enclosing_range:
-                    min_col, min_row, max_col, max_row = enclosing_range
-                    
-                    if min_row == current_row_idx and min_col == col_idx:
-                        # This is the top-left cell. Store value.
-                        active_values[enclosing_range] = value
-                        new_row_values.append(value)
+                if rng[1] == row_idx:
+                    active.append(rng)
+                    active_values[rng] = values.get(rng[0])
+                next_range_idx += 1
+            if not active:
+                return list(values.items())
+            # The first range (in start order) containing a cell wins, so
+            # ranges are applied last to first.
+            for rng in reversed(active):
+                value = active_values[rng]
+                last_col = rng[2] if max_col is None else min(rng[2], max_col)
+                for col in range(rng[0], last_col + 1):
+                    if value is None:
+                        values.pop(col, None)
                     else:
-                        # This is a merged cell. Use stored value.
-                        val = active_values.get(enclosing_range)
-                        new_row_values.append(val)
-                else:
-                    new_row_values.append(value)
-            
-            yield current_row_idx, new_row_values
-            
-            # Cleanup active_values for ranges that end on this row
-            # Actually we can do this lazily or periodically.
-            # To keep memory low, let's remove values for ranges that are no longer active in the *next* row.
-            # But wait, we filtered `current_active_ranges` at the START of the loop.
-            # So `active_values` might hold data for ranges that just finished.
-            # Let's clean up `active_values` based on `current_active_ranges`?
-            # No, `current_active_ranges` is for the *current* row.
-            # We can clean up values for ranges where `max_row == current_row_idx`.
-            
-            keys_to_remove = [
-                rng for rng in list(active_values.keys())
-                if rng[3] <= current_row_idx
-            ]
-            for k in keys_to_remove:
-                del active_values[k]
+                        values[col] = value
+            for rng in [rng for rng in active_values if rng[3] <= row_idx]:
+                del active_values[rng]
+            return sorted(values.items())
+
+        def fill_gap(first: int, last: int) -> Generator[Tuple[int, SparseRow], None, None]:
+            # Rows missing from the XML only get values from merged ranges
+            row_idx = first
+            while row_idx <= last:
+                if not any(rng[3] >= row_idx for rng in active):
+                    if next_range_idx >= total_ranges or sheet_ranges[next_range_idx][1] > last:
+                        return
+                    # Jump to the next range start; nothing before it is filled
+                    row_idx = max(row_idx, sheet_ranges[next_range_idx][1])
+                cells = fill(row_idx, {})
+                if cells and row_idx >= min_row:
+                    yield row_idx, cells
+                row_idx += 1
+
+        previous = read_start - 1
+        src = self._archive.open(self._sheet_parts[sheet_name])
+        # Rows above read_start are skipped by a byte scan of the inflated XML
+        # instead of going through openpyxl's row parser.
+        if read_start > 1:
+            src = RowSkippingSource(src, read_start)
+        with src:
+            for row_idx, row in self._sheet_parser(src, shared_strings).parse():
+                if limit is not None and row_idx > limit:
+                    break
+                if row_idx < read_start:
+                    continue
+                if row_idx > previous + 1 and (active or next_range_idx < total_ranges):
+                    yield from fill_gap(previous + 1, row_idx - 1)
+                previous = row_idx
+                values = {}
+                for cell in row:
+                    value = cell['value']
+                    if value is not None and (max_col is None or cell['column'] <= max_col):
+                        values[cell['column']] = value
+                cells = fill(row_idx, values) if sheet_ranges else list(values.items())
+                if cells and row_idx >= min_row:
+                    yield row_idx, cells
+        # Merged ranges reaching below the last row in the XML
+        if active:
+            yield from fill_gap(previous + 1, limit if limit is not None else max(rng[3] for rng in active))
+
+    def _sheet_parser(self, src, shared_strings: List[Any]) -> WorkSheetParser:
+        """
+        openpyxl's row parser over a sheet XML stream, set up as its read-only
+        worksheet does (private API, see the note at the top of this module).
+        Yields (row_idx, [{'column': col, 'value': value, ...}, ...]) from parse().
+        """
+        wb = self._wb
+        return WorkSheetParser(src, shared_strings, data_only=wb.data_only, epoch=wb.epoch,
+                               date_formats=wb._date_formats, timedelta_formats=wb._timedelta_formats)
 
     def close(self):
         if self._wb:
             self._wb.close()
+            self._wb = None
+            self._archive = None
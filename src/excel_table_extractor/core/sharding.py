@@ -0,0 +1,153 @@
+"""
+Row-sharded parallel processing of a single sheet.
+
+Detection: the sheet's row range is split into shards, and each shard is
+scanned by TableDetector.scan in its own process. Each worker opens its own
+reader and skips to its first row without parsing the rows above it. A
+merged range crossing a shard start is read from its top-left row (see
+StreamReader). Components are stitched with a union-find over the shard
+roots: the last row of one shard is matched against the first row of the
+next, exactly as consecutive rows are matched inside a scan.
+
+Extraction: the global candidates, in extraction order, are cut into
+contiguous groups of roughly equal row count, and each group is extracted by
+a worker. The groups' results are concatenated in order, so the output is
+identical to single-process extraction.
+"""
+import logging
+import os
+from concurrent.futures import Executor
+from typing import List, Tuple, Optional, Dict, Any
+from .reader import StreamReader
+from .detector import TableDetector, SheetScan, UnionFind
+from .extractor import TableExtractor
+from .models import TableCandidate, ExtractedTable
+
+logger = logging.getLogger("sharding")
+
+# Below this many rows per shard, process start-up and workbook loading
+# cost more than the parallel scan saves.
+MIN_SHARD_ROWS = 5000
+
+def plan_shards(first_row: int, last_row: int, count: int, min_rows: Optional[int] = None) -> List[Tuple[int, int]]:
+    """Splits [first_row, last_row] into at most count contiguous (start, end) ranges of >= min_rows rows (default MIN_SHARD_ROWS)."""
+    min_rows = MIN_SHARD_ROWS if min_rows is None else min_rows
+    total = last_row - first_row + 1
+    if total <= 0:
+        return []
+    count = max(1, min(count, total // max(1, min_rows)))
+    size, extra = divmod(total, count)
+    shards = []
+    start = first_row
+    for i in range(count):
+        end = start + size - 1 + (1 if i < extra else 0)
+        shards.append((start, end))
+        start = end + 1
+    return shards
+
+def sheet_row_count(reader: StreamReader, sheet_name: str) -> Optional[int]:
+    """Last row from the sheet's <dimension>, which bounds row iteration; None if unknown."""
+    reader._load_workbook()
+    return reader._wb[sheet_name].max_row
+
+def _open_reader(file_path: str, sheet_name: str, merged_ranges: List[Tuple[int, int, int, int]]) -> StreamReader:
+    reader = StreamReader(file_path, [sheet_name])
+    # Merged ranges are parsed once by the parent and shipped to every worker
+    reader._merged_cells_cache = {sheet_name: merged_ranges}
+    return reader
+
+def _scan_shard(file_path: str, sheet_name: str, merged_ranges, detector: TableDetector, min_row: int, max_row: int) -> SheetScan:
+    reader = _open_reader(file_path, sheet_name, merged_ranges)
+    try:
+        return detector.scan(reader, sheet_name, min_row=min_row, max_row=max_row)
+    finally:
+        reader.close()
+
+def _extract_group(file_path: str, sheet_name: str, merged_ranges, extractor: TableExtractor, candidates: List[TableCandidate]) -> List[ExtractedTable]:
+    reader = _open_reader(file_path, sheet_name, merged_ranges)
+    try:
+        return list(extractor.extract_all(reader, candidates))
+    finally:
+        reader.close()
+
+def stitch_scans(detector: TableDetector, sheet_name: str, scans: List[SheetScan]) -> List[TableCandidate]:
+    """Joins the scans of consecutive row shards into the sheet's candidates."""
+    uf = UnionFind()
+    stats: Dict[Any, Dict[str, int]] = {}
+    roots: Dict[Any, Any] = {}
+    previous = None
+    for scan in scans:
+        stats.update(scan.stats)
+        roots.update(scan.roots)
+        if scan.first_row is None:
+            previous = None
+            continue
+        if previous is not None and previous.last_row + 1 == scan.first_row:
+            for prev_start, prev_end, prev_id in previous.last_segments:
+                for curr_start, curr_end, curr_id in scan.first_segments:
+                    if curr_start <= prev_end and prev_start <= curr_end:
+                        uf.union(curr_id, prev_id)
+        previous = scan
+    return detector.build_candidates(sheet_name, stats, lambda cid: uf.find(roots[cid]))
+
+def group_candidates(candidates: List[TableCandidate], count: int) -> List[List[TableCandidate]]:
+    """Cuts candidates (in extraction order) into at most count contiguous groups of similar total height."""
+    ordered = sorted(candidates, key=lambda c: c.bbox.min_row)
+    total = sum(c.bbox.height for c in ordered)
+    groups: List[List[TableCandidate]] = []
+    current: List[TableCandidate] = []
+    done = 0
+    for c in ordered:
+        current.append(c)
+        done += c.bbox.height
+        if len(groups) < count - 1 and done >= total * (len(groups) + 1) / count:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+def detect_sharded(
+    pool: Executor,
+    workers: int,
+    file_path: str,
+    sheet_name: str,
+    merged_ranges: List[Tuple[int, int, int, int]],
+    last_row: int,
+    detector: Optional[TableDetector] = None,
+    min_row: int = 1,
+    max_row: Optional[int] = None,
+) -> List[TableCandidate]:
+    """Candidates of one sheet, detected by up to `workers` row shards on `pool`."""
+    detector = detector or TableDetector()
+    end = min(max_row, last_row) if max_row is not None else last_row
+    shards = plan_shards(min_row, end, workers)
+    logger.info(f"  Scanning {len(shards)} row shards")
+    futures = [
+        pool.submit(_scan_shard, file_path, sheet_name, merged_ranges, detector, start, stop)
+        for start, stop in shards
+    ]
+    return stitch_scans(detector, sheet_name, [f.result() for f in futures])
+
+def extract_sharded(
+    pool: Executor,
+    workers: int,
+    file_path: str,
+    sheet_name: str,
+    merged_ranges: List[Tuple[int, int, int, int]],
+    candidates: List[TableCandidate],
+    extractor: Optional[TableExtractor] = None,
+) -> List[ExtractedTable]:
+    """Extracts candidates in contiguous groups on `pool`; same order as TableExtractor.extract_all."""
+    extractor = extractor or TableExtractor()
+    futures = [
+        pool.submit(_extract_group, file_path, sheet_name, merged_ranges, extractor, group)
+        for group in group_candidates(candidates, workers)
+    ]
+    tables = []
+    for f in futures:
+        tables.extend(f.result())
+    return tables
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
@@ -0,0 +1,200 @@
+import sqlite3
+import json
+import datetime
+import logging
+import os
+from typing import List, Dict, Any, Iterable, Tuple
+
+class SqliteWriter:
+    # Rows per executemany(); a transaction spans tables and commits once this many rows are pending
+    BATCH_SIZE = 50000
+    # SQLite INTEGER is a signed 64-bit value; larger ints are stored as TEXT
+    INT_MIN, INT_MAX = -2 ** 63, 2 ** 63 - 1
+    # The output is a fresh file rebuilt on every run, so durability
+    # guarantees are traded for bulk-load speed.
+    PRAGMAS = [
+        "PRAGMA journal_mode=OFF",
+        "PRAGMA synchronous=OFF",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA locking_mode=EXCLUSIVE",
+    ]
+    AUDIT_COLUMNS = ["original_table_id", "row_index", "action", "reason", "content"]
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.logger = logging.getLogger("sqlite_writer")
+        self._conn = None
+
+    def write(self, tables: List[Dict[str, Any]], audit_log: List[Dict[str, Any]]):
+        """
+        Writes each table dict (same shape as tables.json entries) into its own
+        SQL table, a `_tables` catalog with sheet/bbox/meta, and an `audit_log` table.
+        """
+        self.begin()
+        try:
+            for table in tables:
+                self.write_table(table)
+            self.write_audit(audit_log)
+        except BaseException:
+            self.abort()
+            raise
+        self.finish()
+
+    # Streaming API: begin(), then write_table()/write_audit()/write_summary() in any order, then finish(),
+    # or abort() if the run failed.
+
+    def begin(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+        self._conn = sqlite3.connect(self.output_path, isolation_level=None)
+        for pragma in self.PRAGMAS:
+            self._conn.execute(pragma)
+
+        self._conn.execute(
+            'CREATE TABLE "_tables" ("table_id" TEXT PRIMARY KEY, "sql_table" TEXT, '
+            '"sheet" TEXT, "bbox" TEXT, "columns" TEXT, "meta" TEXT, "row_count" INTEGER)'
+        )
+        columns_sql = ", ".join(f'{self._quote(c)}' for c in self.AUDIT_COLUMNS)
+        self._conn.execute(f'CREATE TABLE "audit_log" ({columns_sql})')
+        self._used_names = {"_tables", "audit_log", "ai_summary"}
+        self._table_count = 0
+        self._conn.execute("BEGIN")
+        self._pending = 0
+
+    def write_table(self, table: Dict[str, Any]):
+        conn = self._conn
+        table_id = str(table.get('table_id') or f"Table_{self._table_count}")
+        self._table_count += 1
+        sql_table = self._unique_name(table_id, self._used_names)
+        if not self._write_table(conn, sql_table, table):
+            # No columns, so no SQL table: the catalog must not point at one
+            self.logger.debug(f"Skipping table {table_id}: no columns")
+            return
+        conn.execute(
+            'INSERT INTO "_tables" VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (
+                table_id,
+                sql_table,
+                table.get('sheet'),
+                json.dumps(table.get('bbox'), ensure_ascii=False),
+                json.dumps(table.get('columns', []), ensure_ascii=False),
+                json.dumps(table.get('meta', {}), ensure_ascii=False, default=str),
+                len(table.get('rows', [])),
+            )
+        )
+
+    def write_audit(self, entries: Iterable[Dict[str, Any]]):
+        self._bulk_insert(
+            self._conn, "audit_log", len(self.AUDIT_COLUMNS),
+            (tuple(self._adapt(entry.get(c)) for c in self.AUDIT_COLUMNS) for entry in entries)
+        )
+
+    def write_summary(self, summary: Dict[str, Any]):
+        """Run-level AI metrics as an `ai_summary` (metric, value) table."""
+        self._conn.execute('CREATE TABLE IF NOT EXISTS "ai_summary" ("metric" TEXT PRIMARY KEY, "value")')
+        self._conn.executemany('INSERT OR REPLACE INTO "ai_summary" VALUES (?, ?)',
+                               [(k, self._adapt(v)) for k, v in summary.items()])
+
+    def finish(self):
+        if self._conn is not None:
+            self._conn.execute("COMMIT")
+            self._conn.close()
+            self._conn = None
+            self.logger.info(f"Saved SQLite database to {self.output_path}")
+
+    def abort(self):
+        """Closes and removes the partly written database (the open transaction is never committed)."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def _write_table(self, conn: sqlite3.Connection, sql_table: str, table: Dict[str, Any]) -> bool:
+        """Creates and fills sql_table; False (and nothing created) if the table has no columns."""
+        columns = table.get('columns', [])
+        rows = table.get('rows', [])
+
+        # SQLite identifiers are case-insensitive, so dedupe on casefold
+        used_cols = set()
+        col_defs = []
+        for col in columns:
+            name = self._unique_name(str(col), used_cols)
+            col_type = self._infer_type(row.get(col) for row in rows)
+            col_defs.append(f"{self._quote(name)} {col_type}".rstrip())
+
+        if not col_defs:
+            return False
+
+        conn.execute(f"CREATE TABLE {self._quote(sql_table)} ({', '.join(col_defs)})")
+        self._bulk_insert(
+            conn, sql_table, len(columns),
+            (tuple(self._adapt(row.get(col)) for col in columns) for row in rows)
+        )
+        return True
+
+    def _bulk_insert(self, conn: sqlite3.Connection, sql_table: str, width: int, rows: Iterable[Tuple]):
+        placeholders = ", ".join("?" * width)
+        sql = f"INSERT INTO {self._quote(sql_table)} VALUES ({placeholders})"
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.BATCH_SIZE:
+                self._flush(conn, sql, batch)
+                batch = []
+        if batch:
+            self._flush(conn, sql, batch)
+
+    def _flush(self, conn: sqlite3.Connection, sql: str, batch: List[Tuple]):
+        conn.executemany(sql, batch)
+        self._pending += len(batch)
+        if self._pending >= self.BATCH_SIZE:
+            conn.execute("COMMIT")
+            conn.execute("BEGIN")
+            self._pending = 0
+
+    @classmethod
+    def _infer_type(cls, values: Iterable[Any]) -> str:
+        kinds = set()
+        for v in values:
+            if v is None:
+                continue
+            kinds.add(type(v))
+            if len(kinds) > 2:
+                break
+            if type(v) is int and not cls.INT_MIN <= v <= cls.INT_MAX:
+                return "TEXT"
+        if kinds and kinds <= {int, bool}:
+            return "INTEGER"
+        if kinds and kinds <= {int, float}:
+            return "REAL"
+        if kinds:
+            return "TEXT"
+        return ""
+
+    @classmethod
+    def _adapt(cls, value: Any) -> Any:
+        if isinstance(value, int) and not cls.INT_MIN <= value <= cls.INT_MAX:
+            return str(value)
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+            return value.isoformat()
+        return str(value)
+
+    @staticmethod
+    def _quote(name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+    @staticmethod
+    def _unique_name(name: str, used: set) -> str:
+        candidate = name
+        count = 2
+        while candidate.casefold() in used:
+            candidate = f"{name}_{count}"
+            count += 1
+        used.add(candidate.casefold())
+        return candidate
@@ -0,0 +1,79 @@
+from array import array
+from typing import List, Dict, Any, Sequence
+
+class StringId(int):
+    """
+    A cell value that references an entry of a SharedStringStore.
+    It is an int, so hashing, equality and set/Counter operations stay integer
+    operations until the text is materialized.
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"StringId({int(self)})"
+
+class SharedStringStore:
+    """
+    The workbook's shared-string table (xl/sharedStrings.xml), loaded once.
+
+    For each entry i:
+      values[i]    -- original text
+      stripped[i]  -- text.strip(), computed once
+      blank[i]     -- 1 if the stripped text is empty
+      canonical[i] -- id of the first entry with the same stripped text, so
+                      equality after stripping is an integer comparison
+      refs[i]      -- the shared StringId(i) object handed out in cells
+    """
+
+    def __init__(self, strings: Sequence[Any]):
+        self.values: List[str] = [s if isinstance(s, str) else str(s) for s in strings]
+        n = len(self.values)
+        self.refs: List[StringId] = [StringId(i) for i in range(n)]
+        self.stripped: List[str] = []
+        self.blank = bytearray(n)
+        self.canonical = array('l', [0]) * n
+        # stripped text -> canonical id
+        self.index: Dict[str, int] = {}
+
+        for i, s in enumerate(self.values):
+            st = s.strip()
+            self.stripped.append(st)
+            if not st:
+                self.blank[i] = 1
+            self.canonical[i] = self.index.setdefault(st, i)
+
+    def __len__(self):
+        return len(self.values)
+
+    def is_blank(self, value: Any) -> bool:
+        """The repo-wide emptiness rule: None or a string that strips to ''."""
+        if value is None:
+            return True
+        if type(value) is StringId:
+            return bool(self.blank[value])
+        if isinstance(value, str):
+            return not value.strip()
+        return False
+
+    def key(self, value: Any) -> Any:
+        """
+        Hashable key equal for two values iff their stripped str() forms are equal.
+        Shared strings map to their canonical id without building a string.
+        """
+        if type(value) is StringId:
+            return self.canonical[value]
+        text = str(value).strip()
+        return self.index.get(text, text)
+
+    def text(self, value: Any) -> Any:
+        """Materializes a StringId back to its string; other values pass through."""
+        if type(value) is StringId:
+            return self.values[value]
+        return value
+
+    def stripped_text(self, value: Any) -> str:
+        if type(value) is StringId:
+            return self.stripped[value]
+        return str(value).strip()
+
+EMPTY_STORE = SharedStringStore([])
@@ -1,80 +1,258 @@
 import json
 import csv
 import os
-from typing import List, Union
+import datetime
+from typing import List, Iterable, Union, Any
 from .models import ExtractedTable
+from ..utils.compression import check_compression, check_level, compressed_path, open_text_writer
 
 class TableWriter:
-    def __init__(self, output_dir: str, format: str = 'json'):
+    # Rows per Parquet row group / Arrow record batch
+    ROW_GROUP_SIZE = 65536
+    # Codec for columnar outputs ('zstd', 'lz4', 'snappy' for parquet, ...)
+    COLUMNAR_COMPRESSION = 'zstd'
+
+    def __init__(self, output_dir: str, format: str = 'json', compress: str = None, compress_level: int = None):
+        """
+        compress ('gzip' or 'zstd') compresses the json/csv outputs as they are
+        written (tables.json.gz, <table_id>.csv.zst, ...); compress_level trades
+        CPU time for size. Columnar formats use COLUMNAR_COMPRESSION instead.
+        """
         self.output_dir = output_dir
         self.format = format.lower()
+        if self.format not in ('json', 'csv', 'parquet', 'arrow', 'sqlite', 'binary'):
+            raise ValueError(f"Unsupported format: {self.format}")
+        self.compress = check_compression(compress)
+        if self.compress and self.format not in ('json', 'csv'):
+            raise ValueError(f"Compression applies to json and csv output, not {self.format}")
+        self.compress_level = check_level(self.compress, compress_level)
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
+        self._json_file = None
+        self._json_count = 0
+        self._sqlite = None
+        self._binary = None
+        # Files created by this run, removed by abort()
+        self._paths: List[str] = []
+        self.tables_written = 0
+
+    def write(self, tables: Iterable[ExtractedTable]):
+        self.begin()
+        try:
+            for t in tables:
+                self.write_table(t)
+        except BaseException:
+            self.abort()
+            raise
+        self.finish()
+
+    # Streaming API: begin() once, write_table() per table as it is produced, finish() once,
+    # or abort() if the run failed.
+
+    def begin(self):
+        self._paths = []
+        if self.format == 'json':
+            # One `tables.json` holding the list of all tables, written incrementally
+            out_path = compressed_path(os.path.join(self.output_dir, "tables.json"), self.compress)
+            self._paths.append(out_path)
+            self._json_file = open_text_writer(out_path, self.compress, self.compress_level)
+            self._json_file.write("[")
+            self._json_count = 0
+        elif self.format == 'sqlite':
+            # One database with a SQL table per extracted table
+            from .sqlite_writer import SqliteWriter
+            self._sqlite = SqliteWriter(os.path.join(self.output_dir, "tables.db"))
+            self._sqlite.begin()
+        elif self.format == 'binary':
+            # One memory-mappable `tables.bin` with a table-of-contents (see binary_tables.py)
+            from .binary_tables import BinaryTableWriter
+            self._binary = BinaryTableWriter(os.path.join(self.output_dir, "tables.bin"))
+            self._binary.begin()
+        elif self.format in ('parquet', 'arrow'):
+            self._import_pyarrow()
 
-    def write(self, tables: List[ExtractedTable]):
+    def write_table(self, t: ExtractedTable):
         if self.format == 'json':
-            self._write_json(tables)
+            self._write_json_table(t)
         elif self.format == 'csv':
-            self._write_csv(tables)
-        else:
-            raise ValueError(f"Unsupported format: {self.format}")
+            self._write_csv_table(t)
+        elif self.format in ('parquet', 'arrow'):
+            self._write_columnar_table(t)
+        elif self.format == 'sqlite':
+            self._sqlite.write_table(table_to_dict(t))
+        elif self.format == 'binary':
+            self._binary.write_table(t)
+        self.tables_written += 1
 
-    def _write_json(self, tables: List[ExtractedTable]):
-        # Option 1: One big JSON file
-        # Option 2: One file per table
-        # User requirement: "Output for all identified tables"
-        # Let's do one file containing all tables for the input file?
-        # Or if we process multiple input files?
-        # Let's write one main output file `output.json` or `input_filename.json`.
-        # Since we don't know input filename here easily without passing it, 
-        # let's assume we write individual files by table_id or one big list.
-        # Writing individual files is safer for large data.
-        
-        # But user might prefer one result.
-        # Let's write `tables.json` with list of all tables.
-        
-        data = []
-        for t in tables:
-            data.append({
-                'table_id': t.table_id,
-                'sheet': t.sheet_name,
-                'bbox': {
-                    'min_row': t.bbox.min_row,
-                    'min_col': t.bbox.min_col,
-                    'max_row': t.bbox.max_row,
-                    'max_col': t.bbox.max_col
-                },
-                'columns': t.columns,
-                'rows': t.rows,
-                'meta': t.meta
-            })
-            
-        out_path = os.path.join(self.output_dir, "tables.json")
-        with open(out_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+    def finish(self):
+        if self._json_file:
+            self._json_file.write("\n]\n" if self._json_count else "]\n")
+            self._json_file.close()
+            self._json_file = None
+        if self._sqlite:
+            self._sqlite.finish()
+            self._sqlite = None
+        if self._binary:
+            self._binary.finish()
+            self._binary = None
+
+    def abort(self):
+        """Closes and removes everything written so far, so a failed run leaves no output that looks complete."""
+        if self._json_file:
+            self._json_file.close()
+            self._json_file = None
+        if self._sqlite:
+            self._sqlite.abort()
+            self._sqlite = None
+        if self._binary:
+            self._binary.abort()
+            self._binary = None
+        for path in self._paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self._paths = []
+
+    def _write_json_table(self, t: ExtractedTable):
+        f = self._json_file
+        f.write(",\n" if self._json_count else "\n")
+        # Dates and other non-JSON cell values are written as strings
+        f.write(json.dumps(table_to_dict(t), ensure_ascii=False, indent=2, default=str))
+        self._json_count += 1
+
+    def _write_csv_table(self, t: ExtractedTable):
+        # Write CSV
+        csv_path = compressed_path(os.path.join(self.output_dir, f"{t.table_id}.csv"), self.compress)
+        self._paths.append(csv_path)
+        with open_text_writer(csv_path, self.compress, self.compress_level, newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=t.columns)
+            writer.writeheader()
+            writer.writerows(t.rows)
             
-    def _write_csv(self, tables: List[ExtractedTable]):
-        for t in tables:
-            # Write CSV
-            csv_path = os.path.join(self.output_dir, f"{t.table_id}.csv")
-            with open(csv_path, 'w', encoding='utf-8', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=t.columns)
-                writer.writeheader()
-                writer.writerows(t.rows)
-                
-            # Write Meta
-            meta_path = os.path.join(self.output_dir, f"{t.table_id}.meta.json")
-            meta = {
-                'table_id': t.table_id,
-                'sheet': t.sheet_name,
-                'bbox': {
-                    'min_row': t.bbox.min_row,
-                    'min_col': t.bbox.min_col,
-                    'max_row': t.bbox.max_row,
-                    'max_col': t.bbox.max_col
-                },
-                'columns': t.columns,
-                'meta': t.meta
-            }
-            with open(meta_path, 'w', encoding='utf-8') as f:
-                json.dump(meta, f, ensure_ascii=False, indent=2)
+        # Write Meta
+        meta_path = os.path.join(self.output_dir, f"{t.table_id}.meta.json")
+        self._paths.append(meta_path)
+        meta = {
+            'table_id': t.table_id,
+            'sheet': t.sheet_name,
+            'bbox': {
+                'min_row': t.bbox.min_row,
+                'min_col': t.bbox.min_col,
+                'max_row': t.bbox.max_row,
+                'max_col': t.bbox.max_col
+            },
+            'columns': t.columns,
+            'meta': t.meta
+        }
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+
+    def _import_pyarrow(self):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            import pyarrow.ipc
+        except ImportError:
+            raise ImportError(
+                f"Format '{self.format}' requires pyarrow. "
+                "Install it with: pip install 'excel-table-extractor[columnar]'"
+            )
+        return pyarrow, pyarrow.parquet, pyarrow.ipc
+
+    def _write_columnar_table(self, t: ExtractedTable):
+        """
+        Writes one typed, compressed file per table (.parquet or .arrow IPC).
+        Rows are converted one row group at a time, so a table is never held
+        as a full Arrow table in memory. bbox and meta go into the schema metadata.
+        """
+        pa, pq, ipc = self._import_pyarrow()
+
+        fields = [
+            pa.field(col, self._infer_arrow_type(pa, (row.get(col) for row in t.rows)))
+            for col in t.columns
+        ]
+        schema = pa.schema(fields, metadata={
+            'table_id': t.table_id,
+            'sheet': t.sheet_name,
+            'bbox': json.dumps({
+                'min_row': t.bbox.min_row,
+                'min_col': t.bbox.min_col,
+                'max_row': t.bbox.max_row,
+                'max_col': t.bbox.max_col
+            }),
+            'meta': json.dumps(t.meta, ensure_ascii=False, default=str)
+        })
+
+        if self.format == 'parquet':
+            out_path = os.path.join(self.output_dir, f"{t.table_id}.parquet")
+            self._paths.append(out_path)
+            writer = pq.ParquetWriter(out_path, schema, compression=self.COLUMNAR_COMPRESSION)
+        else:
+            out_path = os.path.join(self.output_dir, f"{t.table_id}.arrow")
+            self._paths.append(out_path)
+            options = ipc.IpcWriteOptions(compression=self.COLUMNAR_COMPRESSION)
+            writer = ipc.new_file(out_path, schema, options=options)
+
+        try:
+            for start in range(0, len(t.rows), self.ROW_GROUP_SIZE):
+                chunk = t.rows[start:start + self.ROW_GROUP_SIZE]
+                arrays = []
+                for f in fields:
+                    values = [row.get(f.name) for row in chunk]
+                    if f.type == pa.string():
+                        # Mixed-type columns are stored as text
+                        values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+                    arrays.append(pa.array(values, type=f.type))
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _infer_arrow_type(pa, values) -> Any:
+        """
+        Narrowest Arrow type holding every non-empty value; mixed columns and
+        integers outside int64 become strings.
+        """
+        kinds = set()
+        for v in values:
+            if v is None:
+                continue
+            kinds.add(type(v))
+            if len(kinds) > 2:
+                break
+            if type(v) is int and not -2**63 <= v < 2**63:
+                return pa.string()
+
+        if not kinds:
+            return pa.string()
+        if kinds == {bool}:
+            return pa.bool_()
+        if kinds == {int}:
+            return pa.int64()
+        if kinds <= {int, float}:
+            return pa.float64()
+        if kinds == {datetime.datetime}:
+            return pa.timestamp('us')
+        if kinds == {datetime.date}:
+            return pa.date32()
+        if kinds == {datetime.time}:
+            return pa.time64('us')
+        if kinds == {datetime.timedelta}:
+            return pa.duration('us')
+        return pa.string()
+
+
+def table_to_dict(t: ExtractedTable) -> dict:
+    """The tables.json representation of an ExtractedTable (rows are not copied)."""
+    return {
+        'table_id': t.table_id,
+        'sheet': t.sheet_name,
+        'bbox': {
+            'min_row': t.bbox.min_row,
+            'min_col': t.bbox.min_col,
+            'max_row': t.bbox.max_row,
+            'max_col': t.bbox.max_col
+        },
+        'columns': t.columns,
+        'rows': t.rows,
+        'meta': t.meta
+    }
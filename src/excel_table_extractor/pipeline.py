@@ -0,0 +1,269 @@
+"""
+In-process pipeline: xlsx -> detection -> extraction -> AI refinement -> report.
+
+Every stage is a generator, so each table moves to the next stage as soon as it
+is extracted and no intermediate file is needed. Typical use:
+
+    from excel_table_extractor.pipeline import clean
+    stats = clean("input.xlsx", "report.xlsx")
+"""
+import fnmatch
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Generator, Iterable, List, Dict, Any, Optional, Tuple, MutableMapping
+from .core.reader import StreamReader
+from .core import sharding
+from .core.detector import TableDetector
+from .core.extractor import TableExtractor
+from .core.models import ExtractedTable
+from .core.writers import TableWriter, table_to_dict
+from .utils.xlsx_utils import get_sheet_list
+
+logger = logging.getLogger("pipeline")
+
+def select_sheets(sheets: List[Tuple[str, str]], patterns: Optional[List[str]] = None, skip_hidden: bool = False) -> List[str]:
+    """
+    Filters [(sheet_name, state)] by name/glob patterns and visibility.
+    Returns sheet names in workbook order.
+    """
+    selected = []
+    for name, state in sheets:
+        if skip_hidden and state != 'visible':
+            continue
+        if patterns and not any(fnmatch.fnmatchcase(name, p) for p in patterns):
+            continue
+        selected.append(name)
+    return selected
+
+def parse_row_window(text: str) -> Tuple[int, Optional[int]]:
+    """Parses 'START:END' (1-based, inclusive; either side may be empty)."""
+    if ':' not in text:
+        raise ValueError(f"Invalid row window '{text}', expected START:END")
+    start_str, end_str = text.split(':', 1)
+    try:
+        start = int(start_str) if start_str.strip() else 1
+        end = int(end_str) if end_str.strip() else None
+    except ValueError:
+        raise ValueError(f"Invalid row window '{text}', expected START:END")
+    if start < 1 or (end is not None and end < start):
+        raise ValueError(f"Invalid row window '{text}'")
+    return start, end
+
+def extract_tables(
+    file_path: str,
+    sheets: Optional[List[str]] = None,
+    skip_hidden: bool = False,
+    row_window: Optional[Tuple[int, Optional[int]]] = None,
+    detector: Optional[TableDetector] = None,
+    extractor: Optional[TableExtractor] = None,
+    merged_cells_cache: Optional[MutableMapping] = None,
+    prefetch: int = 0,
+    batch_size: int = StreamReader.BATCH_SIZE,
+    workers: int = 1,
+) -> Generator[ExtractedTable, None, None]:
+    """
+    Yields ExtractedTables sheet by sheet, as soon as each is extracted.
+    sheets are names or glob patterns; row_window is (start, end) 1-based inclusive.
+    merged_cells_cache, if given, keeps parsed merged-cell maps across calls,
+    keyed by file identity (path, size, mtime) and sheet selection.
+    prefetch/batch_size enable the reader's background parsing thread (see StreamReader).
+    workers > 1 splits large sheets into row shards detected and extracted by that
+    many processes (0 = one per CPU); the output is the same as with workers=1.
+    """
+    # Sheet names come from xl/workbook.xml only; unselected sheets are never decompressed.
+    sheet_names = select_sheets(get_sheet_list(file_path), sheets, skip_hidden)
+    if not sheet_names:
+        logger.warning("No sheets matched the selection.")
+    min_row, max_row = row_window if row_window else (1, None)
+
+    detector = detector or TableDetector()
+    extractor = extractor or TableExtractor()
+    # The same reader is reused so merged-cell maps and the
+    # shared-string table are loaded only once per workbook.
+    reader = StreamReader(file_path, sheet_names, prefetch=prefetch, batch_size=batch_size)
+    cache_key = None
+    if merged_cells_cache is not None:
+        st = os.stat(file_path)
+        cache_key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns, tuple(sheet_names))
+        cached = merged_cells_cache.get(cache_key)
+        if cached is not None:
+            reader._merged_cells_cache = cached
+    workers = workers if workers > 0 else sharding.default_workers()
+    pool = None
+    try:
+        for sheet in sheet_names:
+            logger.info(f"Analyzing sheet: {sheet}")
+            last_row = sharding.sheet_row_count(reader, sheet) if workers > 1 else None
+            end = min(max_row, last_row) if last_row and max_row is not None else last_row
+            if last_row and len(sharding.plan_shards(min_row, end, workers)) > 1:
+                if pool is None:
+                    pool = ProcessPoolExecutor(workers)
+                merged = reader.merged_cells.get(sheet, [])
+                candidates = sharding.detect_sharded(pool, workers, file_path, sheet, merged, last_row, detector, min_row, max_row)
+                logger.info(f"  Found {len(candidates)} candidates")
+                tables = sharding.extract_sharded(pool, workers, file_path, sheet, merged, candidates, extractor)
+            else:
+                # 1. Detect
+                candidates = detector.detect(reader, sheet, min_row=min_row, max_row=max_row)
+                logger.info(f"  Found {len(candidates)} candidates")
+
+                # 2. Extract
+                tables = extractor.extract_all(reader, candidates)
+
+            count = 0
+            for table in tables:
+                count += 1
+                yield table
+            logger.info(f"  Extracted {count} tables")
+        if cache_key is not None and reader._merged_cells_cache is not None:
+            merged_cells_cache[cache_key] = reader._merged_cells_cache
+    finally:
+        reader.close()
+        if pool is not None:
+            pool.shutdown()
+
+def read_tables(path: str, table_ids: Optional[List[str]] = None) -> Generator[Dict[str, Any], None, None]:
+    """
+    Tables of an extraction output in file order: tables.json (gzip/zstd
+    compressed or not) or the binary tables.bin. With table_ids, only those
+    tables; a binary file then decodes nothing else.
+    """
+    from .core.binary_tables import BinaryTableReader, is_binary_tables
+    wanted = set(table_ids) if table_ids is not None else None
+    if is_binary_tables(path):
+        with BinaryTableReader(path) as reader:
+            ids = reader.table_ids()
+            if wanted is not None:
+                ids = [t for t in ids if t in wanted]
+            found = set(ids)
+            yield from reader.iter_tables(ids)
+    else:
+        import json
+        from .utils.compression import open_text_reader
+        with open_text_reader(path) as f:
+            tables = json.load(f)
+        found = set()
+        for table in tables:
+            if wanted is None or table.get('table_id') in wanted:
+                found.add(table.get('table_id'))
+                yield table
+    if wanted is not None and wanted - found:
+        logger.warning(f"Tables not found in {path}: {', '.join(sorted(wanted - found))}")
+
+def refine_tables(tables: Iterable[Dict[str, Any]], processor, state=None, metrics=None) -> Generator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]], None, None]:
+    """
+    Runs the AIProcessor on each table dict, yielding (subtables, audit_log) in order.
+    Small tables may be packed into shared LLM requests (see AIProcessor.process_tables).
+    state, an ai.state.RefinementState, reuses the decisions of unchanged tables.
+    metrics, an ai.metrics.AIMetrics, collects tokens, latency and retries per call and table.
+    """
+    for table, processed_subtables, log in processor.process_tables(tables, state, metrics):
+        logger.info(f"  Table {table.get('table_id')}: Split into {len(processed_subtables)} tables, {len(log)} audit actions.")
+        yield processed_subtables, log
+
+def open_report_writer(output_path: str, output_format: Optional[str] = None):
+    """ExcelWriter or SqliteWriter; the format defaults to the output file extension."""
+    if not output_format:
+        ext = os.path.splitext(output_path)[1].lower()
+        output_format = 'sqlite' if ext in ('.db', '.sqlite', '.sqlite3') else 'xlsx'
+    if output_format == 'sqlite':
+        from .core.sqlite_writer import SqliteWriter
+        return SqliteWriter(output_path)
+    from .core.excel_writer import ExcelWriter
+    return ExcelWriter(output_path)
+
+def open_audit_writer(report_writer, audit_path: Optional[str] = None):
+    """
+    Where audit entries go: an AuditLogWriter (.jsonl or .csv) if audit_path is
+    given, otherwise the report's own audit sheet/table.
+    """
+    if not audit_path:
+        return report_writer
+    from .core.audit_writer import AuditLogWriter
+    return AuditLogWriter(audit_path)
+
+def clean(
+    file_path: str,
+    output_path: str,
+    processor=None,
+    output_format: Optional[str] = None,
+    intermediate_dir: Optional[str] = None,
+    intermediate_format: str = 'json',
+    intermediate_compress: Optional[str] = None,
+    compress_level: Optional[int] = None,
+    sheets: Optional[List[str]] = None,
+    skip_hidden: bool = False,
+    row_window: Optional[Tuple[int, Optional[int]]] = None,
+    merged_cells_cache: Optional[MutableMapping] = None,
+    audit_path: Optional[str] = None,
+    prefetch: int = 0,
+    batch_size: int = StreamReader.BATCH_SIZE,
+    workers: int = 1,
+    metrics_path: Optional[str] = None,
+    price_in: float = 0.0,
+    price_out: float = 0.0,
+) -> Dict[str, Any]:
+    """
+    Extracts, refines and writes the final report in one pass.
+    The raw extraction is written to intermediate_dir only if given, as
+    intermediate_format ('json' or 'binary'), compressed with
+    intermediate_compress ('gzip'/'zstd', json only) at compress_level if set.
+    With audit_path (.jsonl or .csv), audit entries are appended there as they
+    happen instead of to the report.
+    The report gets an AI summary (tokens, latency, cost at price_in/price_out
+    per 1M tokens); metrics_path also receives the per-table and per-call metrics.
+    Returns counts of extracted tables, output tables and audit entries, and the AI summary.
+    """
+    from .ai.metrics import AIMetrics
+    if processor is None:
+        from .ai.processor import AIProcessor
+        processor = AIProcessor()
+
+    stats = {'extracted_tables': 0, 'output_tables': 0, 'audit_entries': 0}
+    metrics = AIMetrics(price_in, price_out)
+    intermediate = TableWriter(intermediate_dir, intermediate_format, intermediate_compress, compress_level) if intermediate_dir else None
+
+    def raw_tables():
+        for table in extract_tables(file_path, sheets, skip_hidden, row_window, merged_cells_cache=merged_cells_cache,
+                                    prefetch=prefetch, batch_size=batch_size, workers=workers):
+            stats['extracted_tables'] += 1
+            if intermediate:
+                intermediate.write_table(table)
+            yield table_to_dict(table)
+
+    writer = open_report_writer(output_path, output_format)
+    audit = open_audit_writer(writer, audit_path)
+    writer.begin()
+    try:
+        if audit is not writer:
+            audit.begin()
+        try:
+            if intermediate:
+                intermediate.begin()
+            for subtables, log in refine_tables(raw_tables(), processor, metrics=metrics):
+                for subtable in subtables:
+                    writer.write_table(subtable)
+                audit.write_audit(log)
+                stats['output_tables'] += len(subtables)
+                stats['audit_entries'] += len(log)
+            if intermediate:
+                intermediate.finish()
+        except BaseException:
+            # A truncated intermediate would be read back as a complete extraction
+            if intermediate:
+                intermediate.abort()
+            raise
+        finally:
+            if audit is not writer:
+                audit.finish()
+        stats['ai'] = metrics.summary()
+        writer.write_summary(stats['ai'])
+        writer.finish()
+    except BaseException:
+        # Only a completed run produces a report
+        writer.abort()
+        raise
+    if metrics_path:
+        metrics.write(metrics_path)
+    return stats
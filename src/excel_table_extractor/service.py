@@ -0,0 +1,338 @@
+"""
+Long-running local worker service.
+
+Keeps one process warm (imports, a shared AIProcessor with its OpenAI client
+and LLM response cache, parsed merged-cell maps) and runs extract/clean jobs
+from a bounded queue on a pool of worker threads.
+
+HTTP API (JSON):
+    POST /jobs          {"type": "extract" | "clean", "input": "...", "output": "...", ...}
+                        -> 202 {"job_id": ...}, 503 if the queue is full
+    GET  /jobs/<id>     -> job status
+    GET  /metrics       -> queue, worker and cache metrics
+    GET  /health        -> {"status": "ok"}
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from .core.reader import StreamReader
+from .core.writers import TableWriter
+from .pipeline import extract_tables, clean, parse_row_window
+
+logger = logging.getLogger("service")
+
+JOB_KINDS = ('extract', 'clean')
+
+class QueueFullError(Exception):
+    pass
+
+class LRUCache:
+    """Small thread-safe LRU mapping with hit/miss counters."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+@dataclass
+class Job:
+    job_id: str
+    kind: str
+    params: Dict[str, Any]
+    status: str = 'queued'  # queued, running, done, failed
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        duration = None
+        if self.started_at and self.finished_at:
+            duration = self.finished_at - self.started_at
+        return {
+            'job_id': self.job_id,
+            'type': self.kind,
+            'status': self.status,
+            'params': self.params,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration_seconds': duration,
+            'result': self.result,
+            'error': self.error,
+        }
+
+class WorkerService:
+    def __init__(self, workers: int = 2, queue_size: int = 64, processor=None,
+                 max_finished_jobs: int = 1000, merged_cells_cache_size: int = 32):
+        self.workers = workers
+        self.processor = processor
+        self.max_finished_jobs = max_finished_jobs
+        self.merged_cells_cache = LRUCache(merged_cells_cache_size)
+
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=queue_size)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started_at = time.time()
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+        self._running = 0
+        self._busy_seconds = 0.0
+
+    def start(self):
+        if self.processor is None:
+            from .ai.processor import AIProcessor
+            self.processor = AIProcessor()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"Started {self.workers} workers (queue size {self._queue.maxsize})")
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> Job:
+        self._validate(kind, params)
+        job = Job(job_id=uuid.uuid4().hex, kind=kind, params=params)
+        # Registered before it is queued, so a worker or GET /jobs/<id> always finds it
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._counters['submitted'] += 1
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.job_id]
+                self._counters['submitted'] -= 1
+                self._counters['rejected'] += 1
+            raise QueueFullError("Job queue is full")
+        with self._lock:
+            self._trim_jobs()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = self._counters['completed'] + self._counters['failed']
+            return {
+                'uptime_seconds': time.time() - self._started_at,
+                'workers': self.workers,
+                'running': self._running,
+                'queued': self._queue.qsize(),
+                'queue_size': self._queue.maxsize,
+                **self._counters,
+                'busy_seconds': self._busy_seconds,
+                'avg_job_seconds': self._busy_seconds / completed if completed else None,
+                'merged_cells_cache': {
+                    'entries': len(self.merged_cells_cache),
+                    'hits': self.merged_cells_cache.hits,
+                    'misses': self.merged_cells_cache.misses,
+                },
+                'llm_cache_entries': len(getattr(self.processor, '_response_cache', {}) or {}),
+                'merge_cache_entries': len(getattr(self.processor, '_merge_cache', {}) or {}),
+            }
+
+    def _validate(self, kind: str, params: Dict[str, Any]):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job type '{kind}', expected one of {JOB_KINDS}")
+        if not params.get('input'):
+            raise ValueError("Missing 'input'")
+        if kind == 'clean' and not params.get('output'):
+            raise ValueError("Missing 'output'")
+        if params.get('rows') and not isinstance(params['rows'], (list, tuple)):
+            parse_row_window(str(params['rows']))
+
+    def _trim_jobs(self):
+        # Forget the oldest finished jobs beyond the retention limit
+        excess = len(self._jobs) - self.max_finished_jobs
+        if excess <= 0:
+            return
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].status in ('done', 'failed'):
+                del self._jobs[job_id]
+                excess -= 1
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            with self._lock:
+                job.status = 'running'
+                job.started_at = time.time()
+                self._running += 1
+            try:
+                job.result = self._run_job(job)
+                job.status = 'done'
+            except Exception as e:
+                logger.error(f"Job {job.job_id} failed: {e}", exc_info=True)
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._running -= 1
+                    self._busy_seconds += job.finished_at - job.started_at
+                    self._counters['completed' if job.status == 'done' else 'failed'] += 1
+                self._queue.task_done()
+
+    def _run_job(self, job: Job) -> Dict[str, Any]:
+        p = job.params
+        if not os.path.exists(p['input']):
+            raise FileNotFoundError(f"Input file not found: {p['input']}")
+        rows = p.get('rows')
+        if rows and not isinstance(rows, (list, tuple)):
+            rows = parse_row_window(str(rows))
+        selection = dict(sheets=p.get('sheets'), skip_hidden=bool(p.get('skip_hidden')), row_window=tuple(rows) if rows else None,
+                         prefetch=int(p.get('prefetch') or 0), batch_size=int(p.get('batch_size') or StreamReader.BATCH_SIZE))
+
+        if job.kind == 'extract':
+            writer = TableWriter(p.get('output') or 'output', p.get('format') or 'json',
+                                 compress=p.get('compress'), compress_level=p.get('compress_level'))
+            writer.write(extract_tables(p['input'], merged_cells_cache=self.merged_cells_cache, **selection))
+            return {'output': writer.output_dir, 'tables': writer.tables_written}
+
+        stats = clean(
+            p['input'], p['output'], self.processor,
+            output_format=p.get('format'),
+            intermediate_dir=p.get('intermediate'),
+            intermediate_format=p.get('intermediate_format') or 'json',
+            intermediate_compress=p.get('compress'),
+            compress_level=p.get('compress_level'),
+            audit_path=p.get('audit_log'),
+            metrics_path=p.get('metrics'),
+            price_in=float(p.get('price_in') or 0.0),
+            price_out=float(p.get('price_out') or 0.0),
+            merged_cells_cache=self.merged_cells_cache,
+            **selection,
+        )
+        return {'output': p['output'], **stats}
+
+class _Handler(BaseHTTPRequestHandler):
+    service: WorkerService = None
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        elif self.path == '/metrics':
+            self._send(200, self.service.metrics())
+        elif self.path.startswith('/jobs/'):
+            job = self.service.get(self.path[len('/jobs/'):])
+            if job is None:
+                self._send(404, {'error': 'Job not found'})
+            else:
+                self._send(200, job.to_dict())
+        else:
+            self._send(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            self._send(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object")
+            params = dict(body)
+            kind = params.pop('type', None)
+            job = self.service.submit(kind, params)
+        except QueueFullError as e:
+            self._send(503, {'error': str(e)})
+            return
+        except ValueError as e:
+            self._send(400, {'error': str(e)})
+            return
+        self._send(202, {'job_id': job.job_id, 'status': job.status})
+
+    def _send(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+class _UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, ('unix', 0)
+
+def make_server(service: WorkerService, host: str = '127.0.0.1', port: int = 8765, socket_path: Optional[str] = None) -> ThreadingHTTPServer:
+    handler = type('Handler', (_Handler,), {'service': service})
+    if socket_path:
+        return _UnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+def serve(service: WorkerService, host: str = '127.0.0.1', port: int = 8765, socket_path: Optional[str] = None):
+    """Starts the workers and serves HTTP until interrupted."""
+    service.start()
+    server = make_server(service, host, port, socket_path)
+    where = socket_path or f"http://{host}:{server.server_address[1]}"
+    logger.info(f"Listening on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
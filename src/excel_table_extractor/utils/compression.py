@@ -0,0 +1,92 @@
+"""
+Compressed text streams for the JSON/JSONL/CSV outputs.
+
+gzip uses the standard library. zstd needs the optional `zstandard` package
+(pip install 'excel-table-extractor[zstd]'), which is imported only when
+zstd is actually used. Readers detect the codec from the file's magic bytes,
+so a compressed intermediate can be passed wherever a plain one is accepted.
+"""
+import gzip
+import io
+import os
+from typing import Optional, TextIO
+
+# codec -> file suffix
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+# Levels trade CPU time for bytes: higher is smaller but slower
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+LEVEL_RANGES = {'gzip': (0, 9), 'zstd': (1, 22)}
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+def check_compression(compression: Optional[str]) -> Optional[str]:
+    if compression in (None, '', 'none'):
+        return None
+    if compression not in SUFFIXES:
+        raise ValueError(f"Unsupported compression: {compression}")
+    return compression
+
+def check_level(compression: Optional[str], level: Optional[int]) -> Optional[int]:
+    """level if the codec accepts it (None = the codec's default); ValueError otherwise."""
+    compression = check_compression(compression)
+    if level is None or compression is None:
+        return level
+    low, high = LEVEL_RANGES[compression]
+    if not low <= level <= high:
+        raise ValueError(f"{compression} compression level must be between {low} and {high}, got {level}")
+    return level
+
+def compressed_path(path: str, compression: Optional[str]) -> str:
+    """path with the codec's suffix appended (unchanged if uncompressed)."""
+    return path + SUFFIXES[compression] if compression else path
+
+def compression_from_path(path: str) -> Optional[str]:
+    """Codec implied by the file name's last suffix, or None."""
+    ext = os.path.splitext(path)[1].lower()
+    return next((codec for codec, suffix in SUFFIXES.items() if suffix == ext), None)
+
+def strip_compression_suffix(path: str) -> str:
+    return os.path.splitext(path)[0] if compression_from_path(path) else path
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd compression requires zstandard. "
+            "Install it with: pip install 'excel-table-extractor[zstd]'"
+        )
+    return zstandard
+
+def open_text_writer(path: str, compression: Optional[str] = None, level: Optional[int] = None, newline: Optional[str] = None) -> TextIO:
+    """
+    UTF-8 text file for writing, compressed on the fly with compression
+    ('gzip', 'zstd' or None). Data is compressed as it is written, so the
+    uncompressed output is never held in memory or on disk.
+    """
+    compression = check_compression(compression)
+    if compression is None:
+        return open(path, 'w', encoding='utf-8', newline=newline)
+    # Checked before the file is created
+    check_level(compression, level)
+    if level is None:
+        level = DEFAULT_LEVELS[compression]
+    if compression == 'gzip':
+        # mtime=0 keeps the output byte-identical across runs
+        raw = gzip.GzipFile(path, 'wb', compresslevel=level, mtime=0)
+    else:
+        zstandard = _import_zstandard()
+        raw = zstandard.open(path, 'wb', cctx=zstandard.ZstdCompressor(level=level))
+    return io.TextIOWrapper(raw, encoding='utf-8', newline=newline)
+
+def open_text_reader(path: str, newline: Optional[str] = None) -> TextIO:
+    """UTF-8 text file for reading; gzip and zstd files are decompressed transparently."""
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return io.TextIOWrapper(gzip.GzipFile(path, 'rb'), encoding='utf-8', newline=newline)
+    if magic.startswith(ZSTD_MAGIC):
+        zstandard = _import_zstandard()
+        return io.TextIOWrapper(zstandard.open(path, 'rb'), encoding='utf-8', newline=newline)
+    return open(path, 'r', encoding='utf-8', newline=newline)
@@ -1,8 +1,9 @@
+import io
 import zipfile
 import xml.etree.ElementTree as ET
 import os
 import re
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Optional, Iterable
 from openpyxl.utils.cell import range_boundaries
 
 class XlsxMergeParser:
@@ -13,14 +14,27 @@ class XlsxMergeParser:
             'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
             'pkg_rels': 'http://schemas.openxmlformats.org/package/2006/relationships'
         }
+        # Filled by _get_sheet_mapping: {sheet_name: 'visible' | 'hidden' | 'veryHidden'}
+        self.sheet_states: Dict[str, str] = {}
 
-    def parse(self) -> Dict[str, List[Tuple[int, int, int, int]]]:
+    def list_sheets(self) -> List[Tuple[str, str]]:
+        """
+        Returns [(sheet_name, state)] in workbook order.
+        Only xl/workbook.xml is read; no worksheet part is decompressed.
+        """
+        with zipfile.ZipFile(self.file_path, 'r') as z:
+            sheet_mapping = self._get_sheet_mapping(z)
+        return [(name, self.sheet_states.get(name, 'visible')) for name in sheet_mapping]
+
+    def parse(self, sheet_names: Optional[Iterable[str]] = None) -> Dict[str, List[Tuple[int, int, int, int]]]:
         """
         Returns a dictionary mapping sheet names to a list of merged cell ranges.
         Each range is (min_col, min_row, max_col, max_row).
         Note: openpyxl range_boundaries returns (min_col, min_row, max_col, max_row).
+        If sheet_names is given, only those sheets are parsed.
         """
         merged_cells = {}
+        wanted = set(sheet_names) if sheet_names is not None else None
         
         with zipfile.ZipFile(self.file_path, 'r') as z:
             # 1. Get sheet mapping from workbook.xml
@@ -31,6 +45,8 @@ class XlsxMergeParser:
             
             # 3. Parse each sheet
             for sheet_name, rId in sheet_mapping.items():
+                if wanted is not None and sheet_name not in wanted:
+                    continue
                 target_path = rels.get(rId)
                 if not target_path:
                     continue
@@ -52,6 +68,16 @@ class XlsxMergeParser:
                 
         return merged_cells
 
+    def sheet_paths(self, z: zipfile.ZipFile) -> Dict[str, str]:
+        """{sheet_name: worksheet part path in the zip}, in workbook order."""
+        rels = self._get_workbook_rels(z)
+        paths = {}
+        for sheet_name, rId in self._get_sheet_mapping(z).items():
+            target = rels.get(rId)
+            if target:
+                paths[sheet_name] = target[1:] if target.startswith('/') else f"xl/{target}"
+        return paths
+
     def _get_sheet_mapping(self, z: zipfile.ZipFile) -> Dict[str, str]:
         """Returns {sheet_name: rId}"""
         mapping = {}
@@ -65,6 +91,7 @@ class XlsxMergeParser:
                         name = sheet.get('name')
                         rId = sheet.get(f"{{{self.ns['r']}}}id")
                         mapping[name] = rId
+                        self.sheet_states[name] = sheet.get('state', 'visible')
         except KeyError:
             pass # Handle case where structure is different
         return mapping
@@ -101,6 +128,112 @@ class XlsxMergeParser:
             pass
         return ranges
 
-def get_merged_cells(file_path: str) -> Dict[str, List[Tuple[int, int, int, int]]]:
+def get_merged_cells(file_path: str, sheet_names: Optional[Iterable[str]] = None) -> Dict[str, List[Tuple[int, int, int, int]]]:
     parser = XlsxMergeParser(file_path)
-    return parser.parse()
+    return parser.parse(sheet_names)
+
+def get_sheet_list(file_path: str) -> List[Tuple[str, str]]:
+    """Returns [(sheet_name, state)] read from xl/workbook.xml."""
+    parser = XlsxMergeParser(file_path)
+    return parser.list_sheets()
+
+_SHEET_DATA_OPEN = re.compile(rb'<(?:[A-Za-z_][\w.-]*:)?sheetData\b[^>]*?(/?)>')
+# Next row start tag, or the end of sheetData (group 1 is None)
+_ROW_OPEN = re.compile(rb'<((?:[A-Za-z_][\w.-]*:)?)row[\s>/]|</(?:[A-Za-z_][\w.-]*:)?sheetData\s*>')
+_ROW_NUMBER = re.compile(rb'\sr\s*=\s*["\'](\d+)["\']')
+
+class RowSkippingSource(io.RawIOBase):
+    """
+    Read-only view of a worksheet XML stream without the <row> elements
+    numbered below start_row.
+
+    Everything up to <sheetData> is passed through unchanged. The rows that
+    follow are skipped by a byte scan for their opening tags, so they are
+    inflated but never parsed as XML. Output resumes at the first row whose
+    r attribute is >= start_row. If a row has no r attribute, a synthetic
+    empty row carrying the last skipped number is emitted first, so the
+    parser's implicit row counter still lines up.
+    """
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, raw, start_row: int):
+        self._raw = raw
+        self._chunks = self._generate(start_row)
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = chunk
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+    def _read_chunks(self):
+        while True:
+            chunk = self._raw.read(self.CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def _generate(self, start_row: int):
+        chunks = self._read_chunks()
+        buf = b''
+        # 1. Pass the header through, up to and including <sheetData>
+        match = None
+        for chunk in chunks:
+            buf += chunk
+            match = _SHEET_DATA_OPEN.search(buf)
+            if match:
+                break
+        if match is None or match.group(1) == b'/':
+            yield buf
+            yield from chunks
+            return
+        yield buf[:match.end()]
+        buf = buf[match.end():]
+
+        # 2. Drop whole rows until the first one numbered >= start_row
+        last_skipped = 0
+        pos = 0
+        while True:
+            match = _ROW_OPEN.search(buf, pos)
+            tag_end = buf.find(b'>', match.end() - 1) if match else -1
+            if tag_end == -1:
+                # Keep a possibly incomplete tag and read on
+                keep_from = buf.rfind(b'<', pos) if not match else match.start()
+                buf = buf[max(keep_from, pos):] if keep_from != -1 else b''
+                pos = 0
+                chunk = next(chunks, None)
+                if chunk is None:
+                    yield buf
+                    return
+                buf += chunk
+                continue
+            if match.group(1) is None:
+                # No row left at or after start_row
+                break
+            number = _ROW_NUMBER.search(buf, match.start(), tag_end)
+            if number is None:
+                prefix = match.group(1)
+                if last_skipped:
+                    yield b'<' + prefix + b'row r="' + str(last_skipped).encode() + b'"/>'
+                break
+            row_number = int(number.group(1))
+            if row_number >= start_row:
+                break
+            last_skipped = row_number
+            pos = tag_end + 1
+        yield buf[match.start():]
+        yield from chunks
@@ -0,0 +1,108 @@
+import datetime
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import openpyxl
+import pytest
+
+from excel_table_extractor.core.models import BoundingBox, ExtractedTable
+
+
+@pytest.fixture(scope="session")
+def sample_xlsx(tmp_path_factory):
+    """Two sheets: a titled table with a junk row and a second table below it, and a small table."""
+    path = tmp_path_factory.mktemp("workbooks") / "sample.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Main"
+    ws.append(["Orders"])
+    ws.merge_cells("A1:D1")
+    ws.append(["Order", "Customer", "Qty", "Date"])
+    for i in range(12):
+        ws.append([f"O-{i}", f"Customer {i % 4}", i * 3, datetime.date(2024, 1, 1) + datetime.timedelta(days=i)])
+    ws.append(["Back", "Save"])
+    ws.append([])
+    ws.append([])
+    ws.append(["Item", "Price"])
+    for i in range(5):
+        ws.append([f"Item {i}", i * 1.25])
+    other = wb.create_sheet("Other")
+    other.append(["Key", "Value", "Note"])
+    for i in range(4):
+        other.append([f"k{i}", i, None if i % 2 else "note"])
+    wb.save(path)
+    return str(path)
+
+
+def make_table(table_id="t0", rows=3, columns=("a", "b")):
+    return ExtractedTable(
+        table_id=table_id,
+        sheet_name="Sheet",
+        bbox=BoundingBox(1, 1, rows + 1, len(columns)),
+        columns=list(columns),
+        rows=[{c: (f"{table_id}-{i}" if j == 0 else i * j) for j, c in enumerate(columns)} for i in range(rows)],
+        meta={"content_hash": f"hash-{table_id}"},
+    )
+
+
+def make_table_dict(table_id, rows=5, junk_at=None):
+    """A tables.json entry of (name, qty) rows; junk_at inserts a "Back" navigation row there."""
+    data = [{"name": f"{table_id}-{i}", "qty": i} for i in range(rows)]
+    if junk_at is not None:
+        data.insert(junk_at, {"name": "Back", "qty": None})
+    return {"table_id": table_id, "sheet": "Sheet", "columns": ["name", "qty"], "rows": data,
+            "meta": {"content_hash": f"hash-{table_id}-{len(data)}"}}
+
+
+class FakeLLM:
+    """
+    Stand-in for the OpenAI client: asks to delete every row holding a "Back"
+    cell, answering packed prompts per "### Table <tag>" section. Tags in
+    drop_tags are left out of packed answers. delay is the seconds one call
+    takes, or a function of the call number (0-based) returning them.
+    """
+
+    def __init__(self, delay=0.0, drop_tags=(), error=None):
+        self.delay = delay
+        self.drop_tags = set(drop_tags)
+        self.error = error
+        self.prompts = []
+        self.timeouts = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, response_format, timeout=None):
+        prompt = messages[-1]["content"]
+        with self._lock:
+            number = len(self.prompts)
+            self.prompts.append(prompt)
+            self.timeouts.append(timeout)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay(number) if callable(self.delay) else self.delay)
+            if self.error is not None:
+                raise self.error
+        finally:
+            with self._lock:
+                self.active -= 1
+        sections = re.split(r"^### Table (T\d+)\n", prompt, flags=re.M)
+        if len(sections) > 1:
+            tags = sections[1::2]
+            answer = {"tables": {tag: {"actions": self._actions(text), "merge_columns": []}
+                                 for tag, text in zip(tags, sections[2::2]) if tag not in self.drop_tags}}
+        else:
+            answer = {"actions": self._actions(prompt), "merge_columns": []}
+        message = SimpleNamespace(content=json.dumps(answer))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    @staticmethod
+    def _actions(text):
+        rows = text.split("Rows:\n", 1)[1].splitlines()[1:]
+        return [{"row_id": int(line.split("\t")[0]), "type": "delete", "reason": "Junk button"}
+                for line in rows if "Back" in line.split("\t")[1:]]
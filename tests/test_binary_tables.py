@@ -0,0 +1,134 @@
+import datetime
+import json
+import math
+from decimal import Decimal
+
+import pytest
+
+from excel_table_extractor.core import binary_tables
+from excel_table_extractor.core.binary_tables import BinaryTableReader, BinaryTableWriter, is_binary_tables
+from excel_table_extractor.core.models import BoundingBox, ExtractedTable
+from excel_table_extractor.core.writers import TableWriter
+from excel_table_extractor.pipeline import read_tables
+
+UTC = datetime.timezone.utc
+
+# One value of every kind, stored natively unless noted
+VALUES = [
+    None, "", "text", "ünïcödé ✓", 0, -5, 2**63 - 1, -2**63,
+    2**63, -2**70,  # beyond int64
+    1.5, -0.0, 1e300, float("inf"), True, False,
+    datetime.datetime(2024, 1, 2, 3, 4, 5, 6), datetime.datetime(1899, 12, 31),
+    datetime.date(1900, 1, 1), datetime.time(23, 59, 59, 999999), datetime.timedelta(days=-1, seconds=5),
+    datetime.datetime(2024, 1, 2, tzinfo=UTC), Decimal("1.10"),  # stored as their str()
+]
+
+
+def expected(value):
+    if isinstance(value, Decimal) or getattr(value, "tzinfo", None) is not None:
+        return str(value)
+    return value
+
+
+def make_table(table_id, n):
+    """Uniform columns of each kind, a column mixing all kinds, an empty column, and one that turns mixed."""
+    columns = ["int", "float", "str", "date", "mixed", "empty", "late_mixed"]
+    rows = []
+    for i in range(n):
+        rows.append({
+            "int": i * 7 - 3,
+            "float": i / 3,
+            "str": f"s{i % 5}",
+            "date": datetime.date(2020, 1, 1) + datetime.timedelta(days=i),
+            "mixed": VALUES[i % len(VALUES)],
+            "empty": None,
+            "late_mixed": i if i < n // 2 else VALUES[i % len(VALUES)],
+        })
+    return ExtractedTable(table_id, "Sheet", BoundingBox(1, 1, n + 1, len(columns)), columns, rows,
+                          {"content_hash": table_id * 2})
+
+
+def write(path, tables):
+    writer = BinaryTableWriter(str(path))
+    writer.begin()
+    for table in tables:
+        writer.write_table(table)
+    writer.finish()
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(binary_tables, "BLOCK_ROWS", 16)
+
+
+def test_round_trip_of_every_value_kind(tmp_path, small_blocks):
+    table = make_table("t", 100)
+    write(tmp_path / "t.bin", [table])
+    with BinaryTableReader(str(tmp_path / "t.bin")) as reader:
+        rows = reader.table("t")["rows"]
+    assert len(rows) == 100
+    for got, row in zip(rows, table.rows):
+        assert got == {k: expected(v) for k, v in row.items()}
+        assert all(type(got[k]) is type(expected(v)) for k, v in row.items())
+
+
+def test_table_without_columns_keeps_its_rows(tmp_path, small_blocks):
+    write(tmp_path / "e.bin", [{"table_id": "e", "columns": [], "rows": [{}] * 20}])
+    with BinaryTableReader(str(tmp_path / "e.bin")) as reader:
+        assert reader.table("e")["rows"] == [{}] * 20
+        assert reader.table("e", 10, 18)["rows"] == [{}] * 8
+        assert reader.toc[0]["rows"] == 20
+
+
+def test_nan_round_trips(tmp_path):
+    write(tmp_path / "nan.bin", [{"table_id": "n", "columns": ["a", "b"], "rows": [{"a": math.nan, "b": math.nan}, {"a": 1.0, "b": "x"}]}])
+    with BinaryTableReader(str(tmp_path / "nan.bin")) as reader:
+        rows = reader.table("n")["rows"]
+    assert math.isnan(rows[0]["a"]) and math.isnan(rows[0]["b"])
+    assert rows[1] == {"a": 1.0, "b": "x"}
+
+
+@pytest.mark.parametrize("start,stop", [(0, None), (0, 16), (15, 17), (16, 32), (5, 70), (31, 33), (47, 100), (99, 100), (40, 40), (90, 500)])
+def test_row_ranges_across_block_boundaries(tmp_path, small_blocks, start, stop):
+    table = make_table("t", 100)
+    write(tmp_path / "t.bin", [table])
+    full = [{k: expected(v) for k, v in row.items()} for row in table.rows]
+    with BinaryTableReader(str(tmp_path / "t.bin")) as reader:
+        assert reader.table("t", start, stop)["rows"] == full[start:stop]
+        for column in table.columns:
+            assert reader.column("t", column, start, stop) == [row[column] for row in full[start:stop]]
+
+
+def test_real_block_boundary(tmp_path):
+    n = binary_tables.BLOCK_ROWS + 3
+    rows = [{"i": i, "s": f"r{i % 97}", "m": i if i % 2 else str(i)} for i in range(n)]
+    write(tmp_path / "big.bin", [{"table_id": "big", "columns": ["i", "s", "m"], "rows": rows}])
+    with BinaryTableReader(str(tmp_path / "big.bin")) as reader:
+        assert len(reader.toc[0]["blocks"]) == 2
+        edge = binary_tables.BLOCK_ROWS
+        assert reader.table("big", edge - 2, edge + 2)["rows"] == rows[edge - 2:edge + 2]
+        assert reader.table("big")["rows"] == rows
+
+
+def test_binary_matches_json_output(tmp_path, small_blocks):
+    tables = [make_table(f"t{i}", n) for i, n in enumerate((0, 1, 40, 100))]
+    for fmt in ("json", "binary"):
+        writer = TableWriter(str(tmp_path / fmt), fmt)
+        writer.write(tables)
+    binary_path = str(tmp_path / "binary" / "tables.bin")
+    json_path = str(tmp_path / "json" / "tables.json")
+    assert is_binary_tables(binary_path) and not is_binary_tables(json_path)
+
+    from_binary = list(read_tables(binary_path))
+    from_json = list(read_tables(json_path))
+    # tables.json writes dates and other non-JSON values as str(); everything else is identical
+    assert json.loads(json.dumps(from_binary, default=str)) == from_json
+    assert [t["table_id"] for t in read_tables(binary_path, ["t2", "t0"])] == ["t0", "t2"]
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    write(tmp_path / "t.bin", [make_table("t", 5)])
+    data = (tmp_path / "t.bin").read_bytes()
+    (tmp_path / "cut.bin").write_bytes(data[:-3])
+    with pytest.raises(ValueError):
+        BinaryTableReader(str(tmp_path / "cut.bin"))
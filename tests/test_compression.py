@@ -0,0 +1,95 @@
+import os
+import sys
+
+import pytest
+
+from excel_table_extractor import cli
+from excel_table_extractor.core.audit_writer import AuditLogWriter
+from excel_table_extractor.core.writers import TableWriter
+from excel_table_extractor.pipeline import read_tables
+from excel_table_extractor.utils.compression import (
+    GZIP_MAGIC, ZSTD_MAGIC, check_level, open_text_reader, open_text_writer,
+)
+
+from conftest import make_table
+
+CODECS = [("gzip", GZIP_MAGIC), ("zstd", ZSTD_MAGIC)]
+TEXT = "ünïcödé ✓\r\nline 2\n" * 1000
+
+
+@pytest.mark.parametrize("codec, magic", CODECS)
+def test_round_trip_and_magic_detection(tmp_path, codec, magic):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    # The reader goes by the magic bytes, not the name
+    path = str(tmp_path / "data.txt")
+    with open_text_writer(path, codec, newline="") as f:
+        f.write(TEXT)
+    with open(path, "rb") as f:
+        raw = f.read()
+    assert raw.startswith(magic) and len(raw) < len(TEXT)
+    with open_text_reader(path, newline="") as f:
+        assert f.read() == TEXT
+
+
+def test_plain_files_are_read_as_text(tmp_path):
+    path = str(tmp_path / "data.gz")
+    with open_text_writer(path, None) as f:
+        f.write("plain")
+    with open_text_reader(path) as f:
+        assert f.read() == "plain"
+
+
+def test_gzip_output_is_reproducible(tmp_path):
+    # The gzip header holds the file name, so both runs write tables.json.gz
+    for run in ("a", "b"):
+        (tmp_path / run).mkdir()
+        with open_text_writer(str(tmp_path / run / "tables.json.gz"), "gzip") as f:
+            f.write(TEXT)
+    assert (tmp_path / "a" / "tables.json.gz").read_bytes() == (tmp_path / "b" / "tables.json.gz").read_bytes()
+
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd"])
+def test_compressed_tables_round_trip(tmp_path, codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    tables = [make_table("t0"), make_table("t1", rows=0)]
+    TableWriter(str(tmp_path), "json", compress=codec, compress_level=1).write(tables)
+    suffix = {"gzip": ".gz", "zstd": ".zst"}[codec]
+    assert os.listdir(tmp_path) == [f"tables.json{suffix}"]
+    read = list(read_tables(str(tmp_path / f"tables.json{suffix}")))
+    assert [t["rows"] for t in read] == [t.rows for t in tables]
+
+
+@pytest.mark.parametrize("codec, level, ok", [
+    ("gzip", 0, True), ("gzip", 9, True), ("gzip", 10, False), ("gzip", -1, False),
+    ("zstd", 1, True), ("zstd", 22, True), ("zstd", 0, False), ("zstd", 23, False),
+    (None, 99, True), ("gzip", None, True),
+])
+def test_check_level(codec, level, ok):
+    if ok:
+        assert check_level(codec, level) == level
+    else:
+        with pytest.raises(ValueError, match=f"{codec} compression level must be between"):
+            check_level(codec, level)
+
+
+def test_bad_level_fails_before_any_file_is_created(tmp_path):
+    with pytest.raises(ValueError):
+        TableWriter(str(tmp_path / "out"), "csv", compress="gzip", compress_level=12)
+    with pytest.raises(ValueError):
+        AuditLogWriter(str(tmp_path / "audit.jsonl.zst"), compress_level=30)
+    with pytest.raises(ValueError):
+        open_text_writer(str(tmp_path / "x.gz"), "gzip", 10)
+    assert os.listdir(tmp_path) == []
+
+
+def test_cli_rejects_bad_level(tmp_path, monkeypatch, capsys, sample_xlsx):
+    out = tmp_path / "out"
+    monkeypatch.setattr(sys, "argv", ["excel-extract", "extract", sample_xlsx, "-o", str(out),
+                                      "--compress", "zstd", "--compress-level", "40"])
+    with pytest.raises(SystemExit) as exc:
+        cli.main()
+    assert exc.value.code == 2
+    assert "zstd compression level must be between 1 and 22, got 40" in capsys.readouterr().err
+    assert not out.exists()
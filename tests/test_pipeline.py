@@ -0,0 +1,50 @@
+import os
+import sqlite3
+
+import openpyxl
+import pytest
+
+from excel_table_extractor import pipeline
+from excel_table_extractor.ai.processor import AIProcessor
+
+
+class FailingProcessor(AIProcessor):
+    """Offline processor that fails after the first refined table."""
+    def process_tables(self, tables, state=None, metrics=None):
+        for result in super().process_tables(tables, state, metrics):
+            yield result
+            raise RuntimeError("refinement failed")
+
+
+@pytest.mark.parametrize("output", ["report.xlsx", "report.db"])
+@pytest.mark.parametrize("intermediate_format", ["json", "binary"])
+def test_failed_clean_leaves_no_report_or_intermediate(tmp_path, sample_xlsx, output, intermediate_format):
+    out = tmp_path / output
+    inter = tmp_path / "inter"
+    with pytest.raises(RuntimeError):
+        pipeline.clean(sample_xlsx, str(out), processor=FailingProcessor(offline=True),
+                       intermediate_dir=str(inter), intermediate_format=intermediate_format)
+    assert not out.exists()
+    assert os.listdir(inter) == []
+
+
+def test_clean_writes_report_and_intermediate(tmp_path, sample_xlsx):
+    out = tmp_path / "report.db"
+    stats = pipeline.clean(sample_xlsx, str(out), processor=AIProcessor(offline=True),
+                           intermediate_dir=str(tmp_path / "inter"), intermediate_format="binary")
+    extracted = list(pipeline.read_tables(str(tmp_path / "inter" / "tables.bin")))
+    assert stats["extracted_tables"] == len(extracted) >= 3
+    with sqlite3.connect(out) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM "_tables"').fetchone()[0] == stats["output_tables"]
+        assert conn.execute('SELECT COUNT(*) FROM "audit_log"').fetchone()[0] == stats["audit_entries"]
+        assert dict(conn.execute('SELECT * FROM "ai_summary"'))["calls"] == 0
+
+
+def test_clean_streams_audit_log_to_its_own_file(tmp_path, sample_xlsx):
+    out = tmp_path / "report.xlsx"
+    audit = tmp_path / "audit.jsonl"
+    stats = pipeline.clean(sample_xlsx, str(out), processor=AIProcessor(offline=True), audit_path=str(audit))
+    assert stats["audit_entries"] > 0
+    assert len(audit.read_text(encoding="utf-8").splitlines()) == stats["audit_entries"]
+    assert "Audit_Log" not in openpyxl.load_workbook(out).sheetnames
+
@@ -0,0 +1,191 @@
+import copy
+import sqlite3
+import time
+
+from excel_table_extractor.ai.metrics import AIMetrics
+from excel_table_extractor.ai.processor import AIProcessor, RowAction
+from excel_table_extractor.ai.state import RefinementState
+from excel_table_extractor.core.sqlite_writer import SqliteWriter
+
+from conftest import FakeLLM, make_table_dict
+
+
+def table(rows=6):
+    return {
+        "table_id": "t",
+        "sheet": "S",
+        "columns": ["name", "code", "qty"],
+        "rows": [{"name": f"n{i}", "code": f"n{i}", "qty": i} for i in range(rows)],
+        "meta": {},
+    }
+
+
+def test_apply_actions_splits_deletes_and_drops_without_touching_rows():
+    t = table()
+    before = copy.deepcopy(t["rows"])
+    actions = [RowAction(1, "delete", "junk", None), RowAction(3, "split_header", "section", "Part2"),
+               RowAction(4, "keep", "", None)]
+    merges = [{"keep": "name", "drop": "code", "reason": "duplicate"}]
+    tables, audit = AIProcessor(offline=True)._apply_actions(t, t["rows"], actions, merges)
+
+    assert t["rows"] == before
+    assert [st["columns"] for st in tables] == [["name", "qty"], ["name", "qty"]]
+    assert [st["sheet"] for st in tables] == ["S", "S_Part2"]
+    assert [st["table_id"] for st in tables] == ["t_0", "t_1"]
+    # Kept rows are the input dicts themselves
+    assert [id(r) for st in tables for r in st["rows"]] == [id(t["rows"][i]) for i in (0, 2, 4, 5)]
+    assert [(e["action"], e["row_index"]) for e in audit] == [("delete", 1), ("split", 3), ("merge_column", -1)]
+
+
+def test_dropped_columns_are_not_written(tmp_path):
+    t = table(3)
+    tables, _ = AIProcessor(offline=True)._apply_actions(t, t["rows"], [], [{"keep": "name", "drop": "code"}])
+    writer = SqliteWriter(str(tmp_path / "out.db"))
+    writer.write(tables, [])
+    with sqlite3.connect(tmp_path / "out.db") as conn:
+        assert [c[1] for c in conn.execute('PRAGMA table_info("t_0")')] == ["name", "qty"]
+
+
+def test_process_table_leaves_input_table_intact():
+    t = table()
+    t["rows"].insert(2, {"name": None, "code": None, "qty": None})
+    before = copy.deepcopy(t)
+    tables, audit = AIProcessor(offline=True).process_table(t)
+    assert t == before
+    assert sum(len(st["rows"]) for st in tables) == len(t["rows"]) - 1
+    assert audit[0]["action"] == "delete" and audit[0]["row_index"] == 2
+
+
+def llm_processor(client=None, **kwargs):
+    processor = AIProcessor(offline=True, **kwargs)
+    processor.client = client or FakeLLM()
+    return processor
+
+
+def packed_tags(prompt):
+    return [line.split()[-1] for line in prompt.splitlines() if line.startswith("### Table ")]
+
+
+def deleted(results):
+    return {table["table_id"]: [e["row_index"] for e in log if e["action"] == "delete"] for table, _, log in results}
+
+
+def test_small_tables_share_one_request():
+    processor = llm_processor()
+    tables = [make_table_dict(f"t{i}", 3, junk_at=i) for i in range(3)]
+    results = list(processor.process_tables(tables))
+    assert [packed_tags(p) for p in processor.client.prompts] == [["T0", "T1", "T2"]]
+    assert [t["table_id"] for t, _, _ in results] == ["t0", "t1", "t2"]
+    assert deleted(results) == {"t0": [0], "t1": [1], "t2": [2]}
+
+
+def test_packs_are_split_at_the_token_budget():
+    tables = [make_table_dict(f"t{i}", 3, junk_at=0) for i in range(5)]
+    processor = llm_processor()
+    tokens = processor._prepare(tables[0]).tokens
+    processor.pack_tokens = 2 * tokens + 1
+    results = list(processor.process_tables(tables))
+    # T0/T1, T0/T1, then a pack of one table asked on its own
+    assert [packed_tags(p) for p in processor.client.prompts] == [["T0", "T1"], ["T0", "T1"], []]
+    assert deleted(results) == {f"t{i}": [0] for i in range(5)}
+
+
+def test_big_table_flushes_the_pack_and_keeps_the_order():
+    processor = llm_processor()
+    tables = [make_table_dict("a", 2), make_table_dict("b", 2), make_table_dict("big", 150, junk_at=120),
+              make_table_dict("c", 2)]
+    results = list(processor.process_tables(tables))
+    assert [t["table_id"] for t, _, _ in results] == ["a", "b", "big", "c"]
+    # a+b packed, big in two chunks, c alone
+    assert [packed_tags(p) for p in processor.client.prompts] == [["T0", "T1"], [], [], []]
+    assert deleted(results)["big"] == [120]
+
+
+def test_tables_missing_from_the_packed_answer_are_retried_alone():
+    processor = llm_processor(FakeLLM(drop_tags={"T1"}))
+    tables = [make_table_dict(f"t{i}", 3, junk_at=1) for i in range(3)]
+    results = list(processor.process_tables(tables))
+    prompts = processor.client.prompts
+    assert [packed_tags(p) for p in prompts] == [["T0", "T1", "T2"], []]
+    assert "t1-0" in prompts[1]
+    assert deleted(results) == {"t0": [1], "t1": [1], "t2": [1]}
+
+
+def test_reused_tables_wait_behind_the_pending_pack(tmp_path, monkeypatch):
+    path = str(tmp_path / "state.json")
+    first = llm_processor()
+    state = RefinementState(path, first.decision_source)
+    list(first.process_tables([make_table_dict("r", 3, junk_at=0)], state))
+    state.save()
+
+    tables = [make_table_dict("a", 2), make_table_dict("r", 3, junk_at=0), make_table_dict("b", 2)]
+    processor = llm_processor()
+    state = RefinementState(path, processor.decision_source).load()
+    results = list(processor.process_tables(tables, state))
+    assert [t["table_id"] for t, _, _ in results] == ["a", "r", "b"]
+    assert [packed_tags(p) for p in processor.client.prompts] == [["T0", "T1"]]
+    assert deleted(results)["r"] == [0]
+
+    # Past PACK_REUSED_ROWS, the reused table flushes the pack it waits behind
+    monkeypatch.setattr(AIProcessor, "PACK_REUSED_ROWS", 0)
+    processor = llm_processor()
+    state = RefinementState(path, processor.decision_source).load()
+    results = list(processor.process_tables(tables, state))
+    assert [t["table_id"] for t, _, _ in results] == ["a", "r", "b"]
+    assert [packed_tags(p) for p in processor.client.prompts] == [[], []]
+
+
+def timed(processor, tables):
+    metrics = AIMetrics(0.0, 0.0)
+    start = time.perf_counter()
+    results = list(processor.process_tables(tables, None, metrics))
+    return results, metrics.summary(), time.perf_counter() - start
+
+
+def test_table_deadline_falls_back_to_the_offline_rules():
+    processor = llm_processor(FakeLLM(delay=2.0), pack_tokens=0, table_deadline=0.1)
+    results, summary, elapsed = timed(processor, [make_table_dict("t0", 4, junk_at=2)])
+    assert elapsed < 1.0
+    # The request's HTTP timeout never reaches past the deadline
+    assert processor.client.timeouts[0] <= 0.1
+    (_, subtables, log), = results
+    assert [(e["action"], e["row_index"]) for e in log] == [("delete", 2), ("fallback", 0)]
+    assert "Table deadline exceeded" in log[1]["reason"]
+    assert sum(len(t["rows"]) for t in subtables) == 4
+    assert summary["fallback_rows"] == 5
+
+
+def with_latency_history(processor, seconds=0.05):
+    processor._latencies.extend([seconds] * AIProcessor.HEDGE_MIN_SAMPLES)
+    return processor
+
+
+def test_slow_request_is_hedged_and_the_first_answer_wins():
+    client = FakeLLM(delay=lambda call: 2.0 if call == 0 else 0.0)
+    processor = with_latency_history(llm_processor(client, pack_tokens=0, hedge_percentile=50))
+    results, summary, elapsed = timed(processor, [make_table_dict("t0", 4, junk_at=1)])
+    assert elapsed < 1.0
+    assert len(client.prompts) == 2 and summary["hedged_calls"] == 1
+    assert deleted(results) == {"t0": [1]}
+
+
+def test_no_hedge_without_a_free_request_slot(monkeypatch):
+    monkeypatch.setattr(AIProcessor, "REQUEST_SLOTS", 1)
+    client = FakeLLM(delay=lambda call: 0.3 if call == 0 else 0.0)
+    processor = with_latency_history(llm_processor(client, pack_tokens=0, hedge_percentile=50))
+    results, summary, _ = timed(processor, [make_table_dict("t0", 4, junk_at=1)])
+    assert len(client.prompts) == 1 and summary["hedged_calls"] == 0
+    assert deleted(results) == {"t0": [1]}
+
+
+def test_abandoned_requests_are_bounded(monkeypatch):
+    monkeypatch.setattr(AIProcessor, "REQUEST_SLOTS", 2)
+    client = FakeLLM(delay=0.5)
+    processor = llm_processor(client, pack_tokens=0, table_deadline=0.05)
+    tables = [make_table_dict(f"t{i}", 3, junk_at=0) for i in range(6)]
+    results, summary, elapsed = timed(processor, tables)
+    # Tables past the first two find both slots held by abandoned requests and fall back
+    assert client.max_active <= 2 and len(client.prompts) < 6
+    assert elapsed < 1.0
+    assert deleted(results) == {f"t{i}": [0] for i in range(6)}
+    assert summary["fallback_rows"] == 24
@@ -0,0 +1,81 @@
+import random
+from collections import Counter
+
+import pytest
+
+from excel_table_extractor.core.profiles import (
+    EXACT_DISTINCT, HEAVY_HITTERS, TOP_VALUES, ColumnProfiler, ColumnSketch, HyperLogLog,
+)
+from excel_table_extractor.core.strings import SharedStringStore, StringId
+
+
+def sketch_of(values):
+    sketch = ColumnSketch()
+    for v in values:
+        sketch.add(v)
+    return sketch
+
+
+def test_exact_mode_matches_counter():
+    rng = random.Random(1)
+    values = [f"v{rng.randint(0, EXACT_DISTINCT // 2)}" for _ in range(20000)]
+    summary = sketch_of(values).summary()
+    counts = Counter(values)
+    assert summary["exact"] is True
+    assert summary["filled"] == len(values)
+    assert summary["distinct"] == len(counts)
+    assert summary["top"] == [[k, c] for k, c in counts.most_common(TOP_VALUES)]
+
+
+@pytest.mark.parametrize("n", [2000, 20000, 200000])
+def test_hyperloglog_error_is_within_three_standard_errors(n):
+    hll = HyperLogLog()
+    hll.update(f"id-{i}" for i in range(n))
+    # Standard error of 2**12 registers: 1.04 / 64 ~ 1.6%
+    assert abs(hll.estimate() - n) / n < 3 * 1.04 / 64
+
+
+def test_hyperloglog_ignores_duplicates():
+    hll = HyperLogLog()
+    hll.update(f"id-{i % 500}" for i in range(50000))
+    assert abs(hll.estimate() - 500) / 500 < 0.05
+
+
+def test_sketch_mode_bounds_heavy_hitter_counts_and_memory():
+    rng = random.Random(7)
+    values = []
+    for i in range(100000):
+        r = rng.random()
+        values.append("hot" if r < 0.3 else "warm" if r < 0.4 else f"id-{i}")
+    counts = Counter(values)
+    sketch = sketch_of(values)
+    summary = sketch.summary()
+
+    assert summary["exact"] is False
+    assert summary["filled"] == len(values)
+    assert abs(summary["distinct"] - len(counts)) / len(counts) < 3 * 1.04 / 64
+    assert len(sketch.counts) <= HEAVY_HITTERS
+    top = dict(summary["top"])
+    assert [k for k, _ in summary["top"][:2]] == ["hot", "warm"]
+    # Misra-Gries undercounts by at most filled / (HEAVY_HITTERS + 1), never overcounts
+    for key in ("hot", "warm"):
+        assert counts[key] - len(values) / (HEAVY_HITTERS + 1) <= top[key] <= counts[key]
+
+
+def test_unique_column_still_reports_samples():
+    summary = sketch_of(f"id-{i}" for i in range(10000)).summary()
+    assert summary["exact"] is False
+    assert len(summary["top"]) == TOP_VALUES
+
+
+def test_profiler_normalizes_raw_values_like_cells():
+    store = SharedStringStore(["  a ", "   ", "b"])
+    raw = ColumnProfiler(3)
+    raw.add_values([StringId(0), " x ", 3], store)
+    raw.add_values([StringId(1), "", None], store)
+    raw.add_values([StringId(2), "x", 3.5], store)
+    cells = ColumnProfiler(3)
+    for row in (["a", "x", "3"], [None, None, None], ["b", "x", "3.5"]):
+        cells.add(row)
+    assert raw.to_dict() == cells.to_dict()
+    assert raw.to_dict()["columns"][1] == {"filled": 2, "distinct": 1, "exact": True, "top": [["x", 2]]}
@@ -0,0 +1,95 @@
+import datetime
+
+import openpyxl
+import pytest
+
+from excel_table_extractor.core.reader import StreamReader
+
+
+@pytest.fixture(scope="module")
+def merged_xlsx(tmp_path_factory):
+    """A vertical merge spanning rows 3-6, a gap of missing rows and a horizontal merge below it."""
+    path = tmp_path_factory.mktemp("workbooks") / "merged.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "S"
+    for r in range(1, 9):
+        ws.cell(r, 2, f"b{r}")
+        ws.cell(r, 3, r * 10 if r % 3 else None)
+    ws.cell(3, 1, "group")
+    ws.merge_cells("A3:A6")
+    ws.cell(12, 1, datetime.datetime(2024, 5, 1, 12, 30))
+    ws.cell(14, 2, "wide")
+    ws.merge_cells("B14:D15")
+    wb.save(path)
+    return str(path)
+
+
+def public_rows(path, sheet):
+    """The sheet's rows through openpyxl's public API, merge-filled the way StreamReader fills them."""
+    wb = openpyxl.load_workbook(path, data_only=True)
+    ws = wb[sheet]
+    grid = {(c.row, c.column): c.value for row in ws.iter_rows() for c in row if c.value is not None}
+    for rng in ws.merged_cells.ranges:
+        value = ws.cell(rng.min_row, rng.min_col).value
+        for r in range(rng.min_row, rng.max_row + 1):
+            for c in range(rng.min_col, rng.max_col + 1):
+                grid[(r, c)] = value
+    rows = {}
+    for (r, c), value in grid.items():
+        if value is not None:
+            rows.setdefault(r, []).append((c, value))
+    return {r: sorted(cells) for r, cells in rows.items()}
+
+
+@pytest.mark.parametrize("workbook, sheet", [("sample_xlsx", "Main"), ("sample_xlsx", "Other"), ("merged_xlsx", "S")])
+def test_sparse_and_dense_match_openpyxl(request, workbook, sheet):
+    path = request.getfixturevalue(workbook)
+    expected = public_rows(path, sheet)
+    reader = StreamReader(path)
+    sparse = {r: cells for r, cells in reader.iter_sheet(sheet, sparse=True)}
+    assert sparse == expected
+
+    dense = list(reader.iter_sheet(sheet))
+    assert [r for r, _ in dense] == list(range(1, max(expected) + 1))
+    for r, values in dense:
+        assert [(c, v) for c, v in enumerate(values, 1) if v is not None] == expected.get(r, [])
+        # Dense rows are trimmed after their last value
+        assert not values or values[-1] is not None
+    reader.close()
+
+
+@pytest.mark.parametrize("min_row, max_row", [(1, None), (4, 5), (5, 13), (7, 7), (9, 11), (15, 40)])
+def test_row_windows_match_full_read(merged_xlsx, min_row, max_row):
+    reader = StreamReader(merged_xlsx)
+    full = list(reader.iter_sheet("S", sparse=True))
+    window = list(reader.iter_sheet("S", min_row=min_row, max_row=max_row, sparse=True))
+    assert window == [(r, cells) for r, cells in full if r >= min_row and (max_row is None or r <= max_row)]
+    reader.close()
+
+
+def test_prefetch_and_string_ids_give_the_same_rows(sample_xlsx):
+    plain = StreamReader(sample_xlsx)
+    expected = list(plain.iter_sheet("Main", with_masks=True))
+    prefetched = StreamReader(sample_xlsx, prefetch=2, batch_size=3)
+    rows = list(prefetched.iter_sheet("Main", string_ids=True, with_masks=True))
+    store = prefetched.shared_strings
+    assert [(r, [store.text(v) for v in values]) for r, values, _ in rows] == [(r, v) for r, v, _ in expected]
+    assert [m for _, _, m in rows] == [m for _, _, m in expected]
+    plain.close()
+    prefetched.close()
+
+
+def test_abandoned_prefetch_stops_the_producer(sample_xlsx):
+    reader = StreamReader(sample_xlsx, prefetch=1, batch_size=1)
+    rows = reader.iter_sheet("Main")
+    assert next(rows)[0] == 1
+    rows.close()
+    # The workbook is free again for a new read
+    assert len(list(reader.iter_sheet("Other"))) == 5
+    reader.close()
+
+
+def test_unknown_sheet(sample_xlsx):
+    with pytest.raises(ValueError):
+        list(StreamReader(sample_xlsx).iter_sheet("Missing"))
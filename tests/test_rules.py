@@ -0,0 +1,80 @@
+import random
+from collections import Counter
+
+import pytest
+
+from excel_table_extractor.ai.processor import AIProcessor
+from excel_table_extractor.ai.rules import JUNK, SECTION, KeywordAutomaton, OfflineCleaner, OfflineRules
+
+
+def naive_find(keywords, text):
+    """Every (keyword, kind) occurrence, overlapping ones included."""
+    hits = []
+    for keyword, kind in keywords.items():
+        if not keyword:
+            continue
+        start = text.find(keyword)
+        while start != -1:
+            hits.append((keyword, kind))
+            start = text.find(keyword, start + 1)
+    return hits
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_automaton_matches_naive_search(seed):
+    rng = random.Random(seed)
+    alphabet = "abc系统"
+    keywords = {"".join(rng.choices(alphabet, k=rng.randint(1, 4))): rng.choice((JUNK, SECTION)) for _ in range(12)}
+    automaton = KeywordAutomaton(keywords)
+    for _ in range(50):
+        text = "".join(rng.choices(alphabet + "xy", k=rng.randint(0, 30)))
+        assert Counter(automaton.find(text)) == Counter(naive_find(keywords, text))
+
+
+def test_automaton_reports_overlapping_and_nested_keywords_in_end_order():
+    keywords = {"he": SECTION, "she": JUNK, "his": SECTION, "hers": JUNK}
+    found = KeywordAutomaton(keywords).find("ushers")
+    assert Counter(found) == Counter([("she", JUNK), ("he", SECTION), ("hers", JUNK)])
+    assert found[-1] == ("hers", JUNK)
+
+
+def test_automaton_ignores_empty_keywords():
+    assert KeywordAutomaton({"": JUNK}).find("anything") == []
+
+
+def test_cleaner_scan_matches_substring_checks():
+    rules = OfflineRules()
+    cleaner = OfflineCleaner(rules)
+    texts = ["System Info panel", "个案 列表", "备注信息", "Change Owner", "plain data", "系统信息 / 索赔单", ""]
+    for text in texts:
+        junk, section = cleaner._scan(text)
+        assert (junk is not None) == any(p in text for p in rules.junk_phrases)
+        if junk is None:
+            assert section == any(p in text for p in rules.section_phrases)
+
+
+def classify(rows):
+    columns = [f"c{i}" for i in range(len(rows[0]))]
+    # Cells and masks as AIProcessor hands them to the cleaner
+    cells, masks = AIProcessor(offline=True)._normalize_cells([dict(zip(columns, row)) for row in rows], columns)
+    return {i: (action, name) for i, action, _, name in OfflineCleaner().classify(cells, masks)}
+
+
+def test_cleaner_classifies_rows():
+    rows = [
+        ["Name", "Qty", "Price"],
+        ["Item 1", 3, 1.5],
+        [None, None, None],
+        ["Back", "Save", None],
+        ["Asset Information", None, None],
+        ["Item 2", "System Info", 4],
+        ["lonely", None, None],
+        ["Item 3", 5, 2.5],
+    ]
+    assert classify(rows) == {
+        2: ("delete", ""),
+        3: ("delete", ""),
+        4: ("split_header", "Asset Information"),
+        5: ("delete", ""),
+        6: ("delete", ""),
+    }
@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from excel_table_extractor.ai.processor import AIProcessor
+from excel_table_extractor.service import QueueFullError, WorkerService, make_server
+
+
+def wait_for(service, job, timeout=10.0):
+    end = time.monotonic() + timeout
+    while service.get(job.job_id).status not in ("done", "failed"):
+        assert time.monotonic() < end, "job did not finish"
+        time.sleep(0.01)
+    return service.get(job.job_id)
+
+
+@pytest.fixture
+def running_service():
+    service = WorkerService(workers=1, processor=AIProcessor(offline=True))
+    service.start()
+    yield service
+    service.stop()
+
+
+def test_full_queue_rejects_jobs(sample_xlsx):
+    # Not started: nothing takes jobs off the queue
+    service = WorkerService(workers=1, queue_size=2)
+    jobs = [service.submit("extract", {"input": sample_xlsx}) for _ in range(2)]
+    with pytest.raises(QueueFullError):
+        service.submit("extract", {"input": sample_xlsx})
+    metrics = service.metrics()
+    assert (metrics["submitted"], metrics["rejected"], metrics["queued"]) == (2, 1, 2)
+    # The rejected job is not kept
+    assert [service.get(j.job_id) for j in jobs] == jobs and len(service._jobs) == 2
+
+
+@pytest.mark.parametrize("kind, params, error", [
+    ("convert", {"input": "a.xlsx"}, "Unknown job type"),
+    ("extract", {}, "Missing 'input'"),
+    ("clean", {"input": "a.xlsx"}, "Missing 'output'"),
+    ("extract", {"input": "a.xlsx", "rows": "9:1"}, "Invalid row window"),
+])
+def test_invalid_jobs_are_rejected(kind, params, error):
+    with pytest.raises(ValueError, match=error):
+        WorkerService().submit(kind, params)
+
+
+def test_extract_and_clean_jobs(running_service, sample_xlsx, tmp_path):
+    extract = running_service.submit("extract", {"input": sample_xlsx, "output": str(tmp_path / "out")})
+    job = wait_for(running_service, extract)
+    assert job.status == "done", job.error
+    assert job.result["tables"] > 0 and (tmp_path / "out" / "tables.json").exists()
+
+    clean = running_service.submit("clean", {"input": sample_xlsx, "output": str(tmp_path / "report.db")})
+    job = wait_for(running_service, clean)
+    assert job.status == "done", job.error
+    assert job.result["output_tables"] > 0 and (tmp_path / "report.db").exists()
+    # The second job found the workbook's merged cells in the shared cache
+    assert running_service.metrics()["merged_cells_cache"]["hits"] >= 1
+
+
+def test_failed_job_reports_its_error(running_service, tmp_path):
+    job = wait_for(running_service, running_service.submit("extract", {"input": str(tmp_path / "missing.xlsx")}))
+    assert job.status == "failed" and "not found" in job.error
+    assert running_service.metrics()["failed"] == 1
+
+
+def request(base, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base + path, data=data, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_http_api(sample_xlsx):
+    service = WorkerService(workers=1, queue_size=1)
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert request(base, "GET", "/health") == (200, {"status": "ok"})
+        status, accepted = request(base, "POST", "/jobs", {"type": "extract", "input": sample_xlsx})
+        assert (status, accepted["status"]) == (202, "queued")
+        status, body = request(base, "POST", "/jobs", {"type": "extract", "input": sample_xlsx})
+        assert (status, body) == (503, {"error": "Job queue is full"})
+        assert request(base, "POST", "/jobs", {"type": "nope", "input": "x"})[0] == 400
+        assert request(base, "POST", "/jobs", [1])[0] == 400
+        status, job = request(base, "GET", f"/jobs/{accepted['job_id']}")
+        assert (status, job["status"]) == (200, "queued")
+        assert request(base, "GET", "/jobs/unknown")[0] == 404
+        assert request(base, "GET", "/metrics")[1]["rejected"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
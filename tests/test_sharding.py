@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import openpyxl
+import pytest
+
+from excel_table_extractor.core import sharding
+from excel_table_extractor.core.detector import TableDetector
+from excel_table_extractor.core.reader import StreamReader
+from excel_table_extractor.core.writers import table_to_dict
+from excel_table_extractor.pipeline import extract_tables
+
+
+@pytest.fixture(scope="module")
+def workbook(tmp_path_factory):
+    """Tables of different widths and heights, with merged ranges, some crossing any shard cut."""
+    path = tmp_path_factory.mktemp("sharding") / "tables.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    row = 1
+    for t, (height, width, col) in enumerate([(40, 4, 1), (3, 2, 3), (75, 6, 2), (1, 3, 1), (55, 3, 5), (30, 5, 1)]):
+        ws.cell(row, col, f"Section {t}")
+        ws.merge_cells(start_row=row, start_column=col, end_row=row, end_column=col + width - 1)
+        for c in range(width):
+            ws.cell(row + 1, col + c, f"Col {c}")
+        for r in range(height):
+            for c in range(width):
+                ws.cell(row + 2 + r, col + c, f"v{t}-{r}" if c == 0 else r * c)
+        # A label spanning several data rows of the first column
+        if height > 10:
+            ws.merge_cells(start_row=row + 5, start_column=col, end_row=row + 9, end_column=col)
+        row += height + 2 + t % 3 + 1
+    wb.save(path)
+    return str(path)
+
+
+def tables_of(path, **kwargs):
+    return [table_to_dict(t) for t in extract_tables(path, **kwargs)]
+
+
+@pytest.mark.parametrize("first,last,count", [(1, 100, 3), (7, 7, 4), (1, 5, 8), (10, 1009, 7)])
+def test_plan_shards_covers_the_range(first, last, count):
+    shards = sharding.plan_shards(first, last, count, min_rows=1)
+    assert shards[0][0] == first and shards[-1][1] == last
+    assert all(a[1] + 1 == b[0] for a, b in zip(shards, shards[1:]))
+    assert len(shards) <= count
+    sizes = [end - start + 1 for start, end in shards]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_plan_shards_respects_min_rows():
+    assert sharding.plan_shards(1, 9999, 8) == [(1, 9999)]
+    assert len(sharding.plan_shards(1, 10000, 8)) == 2
+
+
+@pytest.mark.parametrize("workers", [2, 3, 5, 8, 13])
+def test_stitched_detection_matches_single_scan(workbook, monkeypatch, workers):
+    monkeypatch.setattr(sharding, "MIN_SHARD_ROWS", 1)
+    detector = TableDetector()
+    reader = StreamReader(workbook)
+    try:
+        expected = detector.detect(reader, "Data")
+        merged = reader.merged_cells.get("Data", [])
+        last_row = sharding.sheet_row_count(reader, "Data")
+    finally:
+        reader.close()
+    with ThreadPoolExecutor(workers) as pool:
+        candidates = sharding.detect_sharded(pool, workers, workbook, "Data", merged, last_row, detector)
+    assert candidates == expected
+
+
+def test_sharded_extraction_matches_single_process(workbook, monkeypatch):
+    monkeypatch.setattr(sharding, "MIN_SHARD_ROWS", 20)
+    expected = tables_of(workbook)
+    assert len(expected) > 1
+    assert tables_of(workbook, workers=4) == expected
+
+
+def test_sharded_extraction_matches_within_row_window(workbook, monkeypatch):
+    monkeypatch.setattr(sharding, "MIN_SHARD_ROWS", 20)
+    window = (30, 190)
+    assert tables_of(workbook, row_window=window, workers=3) == tables_of(workbook, row_window=window)
@@ -0,0 +1,68 @@
+import datetime
+import json
+import os
+import sqlite3
+
+import pytest
+
+from excel_table_extractor.core.sqlite_writer import SqliteWriter
+
+
+def table(table_id, rows, columns=("name", "n")):
+    return {"table_id": table_id, "sheet": "S", "bbox": {"min_row": 1}, "columns": list(columns),
+            "rows": rows, "meta": {"k": 1}}
+
+
+def query(path, sql):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def test_tables_catalog_and_audit(tmp_path):
+    path = str(tmp_path / "out.db")
+    rows = [{"name": "a", "n": 1}, {"name": "b", "n": None}]
+    SqliteWriter(path).write(
+        [table("t0", rows), table("T0", rows), table("empty", [], columns=())],
+        [{"original_table_id": "t0", "row_index": 3, "action": "delete", "reason": "junk", "content": "x"}],
+    )
+    assert query(path, 'SELECT table_id, sql_table, row_count FROM "_tables"') == [("t0", "t0", 2), ("T0", "T0_2", 2)]
+    assert query(path, 'SELECT * FROM "T0_2"') == [("a", 1), ("b", None)]
+    assert query(path, 'SELECT action, row_index FROM "audit_log"') == [("delete", 3)]
+    assert json.loads(query(path, 'SELECT meta FROM "_tables"')[0][0]) == {"k": 1}
+
+
+def test_column_types_and_out_of_range_integers(tmp_path):
+    path = str(tmp_path / "out.db")
+    rows = [
+        {"i": 1, "f": 1, "big": 2 ** 70, "d": datetime.date(2024, 1, 2), "mixed": 1},
+        {"i": 2, "f": 1.5, "big": 3, "d": None, "mixed": "x"},
+    ]
+    SqliteWriter(path).write([table("t", rows, columns=("i", "f", "big", "d", "mixed"))], [])
+    assert [(c[1], c[2]) for c in query(path, 'PRAGMA table_info("t")')] == [
+        ("i", "INTEGER"), ("f", "REAL"), ("big", "TEXT"), ("d", "TEXT"), ("mixed", "TEXT")]
+    assert query(path, 'SELECT big, d FROM "t"') == [(str(2 ** 70), "2024-01-02"), ("3", None)]
+
+
+def test_transactions_span_tables(tmp_path, monkeypatch):
+    monkeypatch.setattr(SqliteWriter, "BATCH_SIZE", 5)
+    writer = SqliteWriter(str(tmp_path / "out.db"))
+    writer.begin()
+    writer.write_table(table("t0", [{"name": "a", "n": i} for i in range(3)]))
+    # Three rows are pending: still in the transaction opened by begin()
+    assert writer._conn.in_transaction and writer._pending == 3
+    writer.write_table(table("t1", [{"name": "a", "n": i} for i in range(3)]))
+    assert writer._pending == 0
+    writer.finish()
+    assert query(str(tmp_path / "out.db"), 'SELECT SUM(row_count) FROM "_tables"') == [(6,)]
+
+
+def test_abort_removes_database(tmp_path):
+    path = str(tmp_path / "out.db")
+
+    def tables():
+        yield table("t0", [{"name": "a", "n": 1}])
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError):
+        SqliteWriter(path).write(tables(), [])
+    assert not os.path.exists(path)
@@ -0,0 +1,33 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# The module budgets and entry point live in the startup benchmark; this runs its forbidden-import check in CI
+BENCH_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "bench_startup.py")
+spec = importlib.util.spec_from_file_location("bench_startup", BENCH_PATH)
+bench_startup = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench_startup)
+
+
+def loaded_modules(cli_args, tmp_path):
+    modules_path = str(tmp_path / "modules.json")
+    subprocess.run([sys.executable, "-c", bench_startup.ENTRY_POINT, *cli_args], env=bench_startup.child_env(modules_path),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, timeout=120)
+    with open(modules_path, encoding="utf-8") as f:
+        return {m.split(".")[0] for m in json.load(f)}
+
+
+@pytest.mark.parametrize("command", ["help", "extract", "clean"])
+def test_commands_do_not_import_forbidden_modules(command, sample_xlsx, tmp_path):
+    cli_args = {
+        "help": ["--help"],
+        "extract": ["extract", sample_xlsx, "-o", str(tmp_path / "out")],
+        "clean": ["clean", sample_xlsx, "-o", str(tmp_path / "report.xlsx")],
+    }[command]
+    modules = loaded_modules(cli_args, tmp_path)
+    assert "excel_table_extractor" in modules
+    assert sorted(m for m in bench_startup.FORBIDDEN[command] if m in modules) == []
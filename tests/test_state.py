@@ -0,0 +1,108 @@
+import json
+
+from excel_table_extractor.ai.processor import AIProcessor
+from excel_table_extractor.ai.state import RefinementState
+
+from conftest import FakeLLM, make_table_dict
+
+
+def llm_processor(**kwargs):
+    processor = AIProcessor(offline=True, **kwargs)
+    processor.client = FakeLLM()
+    return processor
+
+
+def run(processor, tables, state):
+    return [(sub, log) for _, sub, log in processor.process_tables(tables, state)]
+
+
+def tables():
+    return [make_table_dict("t0", 4, junk_at=1), make_table_dict("t1", 3), make_table_dict("t2", 6, junk_at=0)]
+
+
+def test_unchanged_tables_reuse_stored_decisions(tmp_path):
+    path = str(tmp_path / "state.json")
+    first = llm_processor()
+    state = RefinementState(path, first.decision_source).load()
+    expected = run(first, tables(), state)
+    assert state.refined == 3 and first.client.prompts
+    state.save()
+
+    second = llm_processor()
+    state = RefinementState(path, second.decision_source).load()
+    assert run(second, tables(), state) == expected
+    assert state.reused == 3 and state.refined == 0
+    assert second.client.prompts == []
+
+
+def test_changed_table_is_refined_again(tmp_path):
+    path = str(tmp_path / "state.json")
+    first = llm_processor(pack_tokens=0)
+    state = RefinementState(path, first.decision_source).load()
+    run(first, tables(), state)
+    state.save()
+
+    changed = tables()
+    changed[1] = make_table_dict("t1", 3, junk_at=2)
+    second = llm_processor(pack_tokens=0)
+    state = RefinementState(path, second.decision_source).load()
+    results = run(second, changed, state)
+    assert (state.reused, state.refined) == (2, 1)
+    assert len(second.client.prompts) == 1 and "t1-0" in second.client.prompts[0]
+    assert [e["row_index"] for e in results[1][1]] == [2]
+
+
+def test_state_of_another_decision_source_is_ignored(tmp_path):
+    path = str(tmp_path / "state.json")
+    llm = llm_processor()
+    state = RefinementState(path, llm.decision_source).load()
+    run(llm, tables(), state)
+    state.save()
+
+    offline = AIProcessor(offline=True)
+    assert offline.decision_source != llm.decision_source
+    state = RefinementState(path, offline.decision_source).load()
+    run(offline, tables(), state)
+    assert (state.reused, state.refined) == (0, 3)
+
+
+def test_tables_without_content_hash_are_not_stored(tmp_path):
+    state = RefinementState(str(tmp_path / "state.json"), "m")
+    table = make_table_dict("t0")
+    del table["meta"]["content_hash"]
+    run(llm_processor(), [table], state)
+    state.save()
+    assert RefinementState(state.path, "m").load().lookup(table) is None
+    assert json.loads((tmp_path / "state.json").read_text())["tables"] == {}
+
+
+def test_subset_runs_keep_unseen_entries(tmp_path):
+    path = str(tmp_path / "state.json")
+    processor = llm_processor()
+    state = RefinementState(path, processor.decision_source).load()
+    run(processor, tables(), state)
+    state.save()
+
+    for keep_unseen, expected in ((True, ["t0", "t1", "t2"]), (False, ["t1"])):
+        state = RefinementState(path, processor.decision_source).load()
+        run(processor, tables()[1:2], state)
+        state.save(keep_unseen=keep_unseen)
+        assert sorted(json.loads((tmp_path / "state.json").read_text())["tables"]) == expected
+
+
+def test_fallback_decisions_are_not_stored(tmp_path):
+    processor = llm_processor(pack_tokens=0)
+    processor.client.error = RuntimeError("LLM down")
+    state = RefinementState(str(tmp_path / "state.json"), processor.decision_source)
+    (subtables, log), = run(processor, [make_table_dict("t0", 4, junk_at=1)], state)
+    # The offline rules still clean the table, but the next run asks the LLM again
+    assert [e["action"] for e in log] == ["delete", "fallback"]
+    state.save()
+    assert json.loads((tmp_path / "state.json").read_text())["tables"] == {}
+
+
+def test_unreadable_state_file_is_ignored(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text("{not json", encoding="utf-8")
+    state = RefinementState(str(path), "m").load()
+    assert state.lookup(make_table_dict("t0")) is None
@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+
+from excel_table_extractor.core.writers import TableWriter
+from excel_table_extractor.pipeline import read_tables
+
+from conftest import make_table
+
+FORMATS = ["json", "csv", "binary", "sqlite", "parquet", "arrow"]
+
+
+def failing(tables):
+    yield from tables
+    raise RuntimeError("extraction failed")
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_failed_write_leaves_no_output(tmp_path, fmt):
+    if fmt in ("parquet", "arrow"):
+        pytest.importorskip("pyarrow")
+    writer = TableWriter(str(tmp_path), fmt)
+    with pytest.raises(RuntimeError):
+        writer.write(failing([make_table("t0"), make_table("t1")]))
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("compress", [None, "gzip"])
+def test_failed_compressed_write_leaves_no_output(tmp_path, compress):
+    with pytest.raises(RuntimeError):
+        TableWriter(str(tmp_path), "json", compress=compress).write(failing([make_table()]))
+    assert os.listdir(tmp_path) == []
+
+
+def test_streaming_api_writes_tables_as_they_come(tmp_path):
+    writer = TableWriter(str(tmp_path), "json")
+    writer.begin()
+    for i in range(3):
+        writer.write_table(make_table(f"t{i}", rows=i))
+    writer.finish()
+    tables = json.loads((tmp_path / "tables.json").read_text(encoding="utf-8"))
+    assert [t["table_id"] for t in tables] == ["t0", "t1", "t2"]
+    assert [len(t["rows"]) for t in tables] == [0, 1, 2]
+    assert writer.tables_written == 3
+
+
+def test_empty_run_writes_an_empty_list(tmp_path):
+    TableWriter(str(tmp_path), "json").write([])
+    assert list(read_tables(str(tmp_path / "tables.json"))) == []
+
+
+def test_abort_keeps_files_of_earlier_runs_in_other_formats(tmp_path):
+    TableWriter(str(tmp_path), "json").write([make_table()])
+    with pytest.raises(RuntimeError):
+        TableWriter(str(tmp_path), "csv").write(failing([make_table("t1")]))
+    assert os.listdir(tmp_path) == ["tables.json"]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_columnar_types_and_bigint_fallback(tmp_path, fmt):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as ipc
+
+    t = make_table(columns=("name", "n", "big", "mixed"))
+    for i, row in enumerate(t.rows):
+        row["big"] = 2 ** 70 + i if i else 1
+        row["mixed"] = 1.5 if i else "x"
+    TableWriter(str(tmp_path), fmt).write([t])
+
+    path = str(tmp_path / f"t0.{fmt}")
+    table = pq.read_table(path) if fmt == "parquet" else ipc.open_file(path).read_all()
+    assert [f.type for f in table.schema] == [pa.string(), pa.int64(), pa.string(), pa.string()]
+    assert table.column("n").to_pylist() == [0, 1, 2]
+    assert table.column("big").to_pylist() == ["1", str(2 ** 70 + 1), str(2 ** 70 + 2)]
+    assert table.column("mixed").to_pylist() == ["x", "1.5", "1.5"]
+    assert table.schema.metadata[b"table_id"] == b"t0"